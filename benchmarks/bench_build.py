@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""
+Builds a large library with each available compiler, against the stand-in
+LibraryLink runtime of the tests, and reports the build time, the size of the
+library and the time of a call through the generated wrappers.
+
+Usage: python benchmarks/bench_build.py [NUMBER_OF_FUNCTIONS] [SHARDS] [CALLS]
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from path import Path
+from mathbind.library import LibraryObject
+
+RUNTIME = Path(__file__).abspath().parent.parent.joinpath('test', 'runtime')
+
+CONFIGURATIONS = [
+    ('gcc', {}),
+    ('gcc', {'features': ['lto']}),
+    ('clang', {'lto': None}),
+    ('clang', {'lto': 'thin'}),
+]
+
+SOURCE = 'double f{0}(double x, int n) {{ return x * n + {0}; }}\n'
+
+DRIVER = '''#include <stdio.h>
+#include <time.h>
+#include "WolframLibrary.h"
+WolframLibraryData runtime_library_data(void);
+{declarations}
+static int (*functions[])(WolframLibraryData, mint, MArgument *, MArgument) = {{{names}}};
+int main(void) {{
+    WolframLibraryData libData = runtime_library_data();
+    mreal x = 0.5, result = 0.;
+    mint n = 3;
+    MArgument args[2], res;
+    args[0].real = &x;
+    args[1].integer = &n;
+    res.real = &result;
+    struct timespec start, end;
+    double total = 0.;
+    clock_gettime(CLOCK_MONOTONIC, &start);
+    for(long i = 0; i < {calls}; ++i) {{
+        functions[i % {count}](libData, 2, args, res);
+        total += result;
+    }}
+    clock_gettime(CLOCK_MONOTONIC, &end);
+    double elapsed = (end.tv_sec - start.tv_sec) * 1e9 + (end.tv_nsec - start.tv_nsec);
+    printf("%f %f\\n", elapsed / {calls}, total);
+    return 0;
+}}
+'''
+
+
+def build(path, compiler, options, count, shards):
+    """
+    Builds the library in path, returning the seconds it took.
+    """
+    with open(path.joinpath('source.c'), 'w') as fp:
+        fp.write(''.join(SOURCE.format(i) for i in range(count)))
+    lib = LibraryObject({'name': 'bench', 'path': path, 'flags': '-O2',
+                         'functions': ['double f%d(double x, int n);' % i for i in range(count)],
+                         'files': ['source.c', RUNTIME.joinpath('runtime.c')],
+                         'include_paths': [RUNTIME]})
+    start = time.perf_counter()
+    lib.build_c_library('lib{name}.so', compiler, shards, **options)
+    return time.perf_counter() - start
+
+
+def call_time(path, compiler, count, calls):
+    """
+    Returns the nanoseconds spent in each call of a driver going through the
+    wrappers of the library in path.
+    """
+    declarations = ''.join('int math_f%dGen(WolframLibraryData, mint, MArgument *, MArgument);\n' % i
+                           for i in range(count))
+    names = ', '.join('math_f%dGen' % i for i in range(count))
+    with open(path.joinpath('driver.c'), 'w') as fp:
+        fp.write(DRIVER.format(declarations=declarations, names=names, count=count, calls=calls))
+    subprocess.check_call([compiler, '-O2', '-I', RUNTIME, '-o', path.joinpath('driver'),
+                           path.joinpath('driver.c'), '-L', path, '-lbench', '-Wl,-rpath,' + path])
+    output = subprocess.check_output([path.joinpath('driver')])
+    return float(output.split()[0])
+
+
+def main(count=2000, shards=8, calls=10000000):
+    print('functions: %d, shards: %d, cores: %d' % (count, shards, os.cpu_count() or 1))
+    print('%-20s %10s %10s %12s' % ('compiler', 'build (s)', 'size (KiB)', 'call (ns)'))
+    for compiler, options in CONFIGURATIONS:
+        label = compiler + ''.join(' %s=%s' % item for item in options.items())
+        if shutil.which(compiler) is None:
+            print('%-20s %10s' % (label, 'missing'))
+            continue
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp)
+            build_time = build(path, compiler, options, count, shards)
+            size = path.joinpath('libbench.so').getsize()
+            ns = call_time(path, compiler, count, calls)
+        print('%-20s %10.2f %10.0f %12.2f' % (label, build_time, size / 1024, ns))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
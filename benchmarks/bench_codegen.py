@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+
+"""
+Measures the time spent generating the C and Mathematica code of a large
+library.
+
+Usage: python benchmarks/bench_codegen.py [NUMBER_OF_FUNCTIONS] [REPEAT]
+"""
+
+import sys
+import timeit
+from bench_memory import build_library
+
+
+def main(count=20000, repeat=5):
+    lib = build_library(count)
+    c_time = min(timeit.repeat(lib.to_cstr, number=1, repeat=repeat))
+    math_time = min(timeit.repeat(lambda: lib.to_mathstr('libbench.so'), number=1, repeat=repeat))
+    print('functions:        %d' % count)
+    print('to_cstr:          %.3f s (%.1f us per function)' % (c_time, 1e6 * c_time / count))
+    print('to_mathstr:       %.3f s (%.1f us per function)' % (math_time, 1e6 * math_time / count))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+"""
+Measures the time spent loading a large library definition file, parsed from
+scratch and from the on-disk cache.
+
+Usage: python benchmarks/bench_load.py [NUMBER_OF_FUNCTIONS] [REPEAT]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import timeit
+from path import Path
+from bench_memory import PROTOTYPES
+from mathbind.library import LibraryObject
+
+
+def main(count=20000, repeat=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['MATHBIND_CACHE_DIR'] = tmp
+        def_file = Path(tmp).joinpath('bench.json')
+        with open(def_file, 'w') as fp:
+            json.dump({'functions': [PROTOTYPES[i % len(PROTOTYPES)].format(i) for i in range(count)]}, fp)
+
+        parse_time = min(timeit.repeat(lambda: LibraryObject.from_file(def_file, cached=False),
+                                       number=1, repeat=repeat))
+        LibraryObject.from_file(def_file)
+        cached_time = min(timeit.repeat(lambda: LibraryObject.from_file(def_file),
+                                        number=1, repeat=repeat))
+    print('functions:        %d' % count)
+    print('parsed:           %.3f s' % parse_time)
+    print('cached:           %.3f s' % cached_time)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+"""
+Measures the memory used by the parsed representation of a large library.
+
+Usage: python benchmarks/bench_memory.py [NUMBER_OF_FUNCTIONS]
+"""
+
+import sys
+import tracemalloc
+from mathbind.library import LibraryObject
+
+PROTOTYPES = [
+    'double f{0}(double x, int n, const double * y);',
+    'void g{0}(int n, const double data[n], double out[n], long * count);',
+    'int h{0}(float a, float b, unsigned int flags, double values[3]);',
+]
+
+
+def build_library(count):
+    functions = [PROTOTYPES[i % len(PROTOTYPES)].format(i) for i in range(count)]
+    return LibraryObject({'name': 'bench', 'path': '.', 'functions': functions})
+
+
+def main(count=100000):
+    tracemalloc.start()
+    lib = build_library(count)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    arguments = sum(len(func.args) + 1 for func in lib.functions)
+    distinct = len({id(t) for func in lib.functions for t in func.args + [func.return_type]})
+    print('functions:          %d' % count)
+    print('type references:    %d' % arguments)
+    print('distinct types:     %d' % distinct)
+    print('retained memory:    %.1f MiB' % (current / 2 ** 20))
+    print('peak memory:        %.1f MiB' % (peak / 2 ** 20))
+    print('bytes per function: %.0f' % (current / count))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
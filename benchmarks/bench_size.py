@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+"""
+Measures the size of the generated wrappers of a large library: the lines of
+the generated C code and the size of the .text section of the library built
+from it. The bound functions are left undefined, so only the wrappers are
+compiled. Non-zero SHARE_WRAPPERS and MULTIPLEX set the options of the same
+name of the library. The LibraryFunctionLoad calls of the package and the
+symbols exported by the library are counted too.
+
+Usage: python benchmarks/bench_size.py [NUMBER_OF_FUNCTIONS] [SHARE_WRAPPERS] [MULTIPLEX]
+"""
+
+import subprocess
+import sys
+import tempfile
+import time
+from path import Path
+from mathbind.library import LibraryObject
+
+RUNTIME = Path(__file__).abspath().parent.parent.joinpath('test', 'runtime')
+
+PROTOTYPES = [
+    'void g{0}(int n, const double data[n], double out[n], long * count);',
+    'int h{0}(float a, float b, unsigned int flags, double values[3]);',
+    'void s{0}(int n, float x[n], const int idx[n], out short flags[n]);',
+    'void z{0}(int n, const double complex z[n], float complex w[n]);',
+    'int [n] r{0}(int n, const int x[n]);',
+]
+
+
+def text_size(library):
+    """
+    Returns the size in bytes of the .text section of the library.
+    """
+    output = subprocess.check_output(['size', '-A', library], universal_newlines=True)
+    for line in output.splitlines():
+        if line.startswith('.text '):
+            return int(line.split()[1])
+    raise ValueError('No .text section in %s' % library)
+
+
+def exported_symbols(library):
+    """
+    Returns the number of symbols defined in the dynamic symbol table of the
+    library.
+    """
+    output = subprocess.check_output(['nm', '-D', '--defined-only', library], universal_newlines=True)
+    return len(output.splitlines())
+
+
+def main(count=2000, share_wrappers=0, multiplex=0):
+    functions = [PROTOTYPES[i % len(PROTOTYPES)].format(i) for i in range(count)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp)
+        lib = LibraryObject({'name': 'bench', 'path': path, 'flags': '-O2',
+                             'functions': functions, 'include_paths': [RUNTIME],
+                             'share_wrappers': bool(share_wrappers), 'multiplex': bool(multiplex)})
+        code = lib.to_cstr()
+        start = time.perf_counter()
+        lib.build_c_library('lib{name}.so')
+        build_time = time.perf_counter() - start
+        text = text_size(path.joinpath('libbench.so'))
+        exported = exported_symbols(path.joinpath('libbench.so'))
+        loads = lib.to_mathstr('libbench.so').count('LibraryFunctionLoad[')
+    print('functions:          %d' % count)
+    print('generated lines:    %d' % code.count('\n'))
+    print('generated bytes:    %d' % len(code))
+    print('.text size:         %.1f KiB' % (text / 1024))
+    print('.text per function: %.0f bytes' % (text / count))
+    print('build time:         %.2f s' % build_time)
+    print('library loads:      %d' % loads)
+    print('exported symbols:   %d' % exported)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
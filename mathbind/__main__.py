@@ -8,57 +8,116 @@ import mathbind
 from mathbind.library import LibraryObject
 
 
-@opster.command(usage='[-d FILE] [-o FILE]')
+def split_list(value):
+    """
+    Returns the items of an option with a ;-separated list.
+    """
+    return value.split(';') if value else []
+
+
+def load_library(def_file, include='', exclude='', share_wrappers=False, multiplex=False):
+    """
+    Returns the library defined in the file, through the cache, or read from
+    the standard input when no file is given, with only the functions
+    selected by the include and exclude options.
+    """
+    include, exclude = split_list(include), split_list(exclude)
+    if def_file:
+        lib = LibraryObject.from_file(def_file, include=include, exclude=exclude)
+    else:
+        lib_def = json.load(sys.stdin)
+        lib_def['include'] = lib_def.get('include', []) + include
+        lib_def['exclude'] = lib_def.get('exclude', []) + exclude
+        lib = LibraryObject(lib_def)
+    if share_wrappers:
+        lib.share_wrappers = True
+    if multiplex:
+        lib.multiplex = True
+    return lib
+
+
+@opster.command(usage='[-d FILE] [-o FILE] [-i pattern1;pattern2] [-x pattern1;pattern2] [-S] [-M]')
 def generate_c(output=('o','','Output file, defaults to stdout'),
-                 def_file=('d', '', 'JSON file with the definition of the library structure')):
+                 def_file=('d', '', 'JSON file with the definition of the library structure'),
+                 include=('i', '', 'Functions to generate, as name globs or tag:name'),
+                 exclude=('x', '', 'Functions to leave out, as name globs or tag:name'),
+                 share_wrappers=('S', False, 'Share the wrappers of the functions with the same prototype'),
+                 multiplex=('M', False, 'Call the functions through one dispatcher per signature')):
     """
     A Python tool to auto-generate the boilerplate code to connect Mathematica to arbitrary external libraries.
     """
     fp_out = open(output, 'w') if output else sys.stdout
-    fp_in = open(def_file) if def_file else sys.stdin
-
-    lib_def = json.load(fp_in)
-    lib = LibraryObject(lib_def)
+    lib = load_library(def_file, include, exclude, share_wrappers, multiplex)
 
     fp_out.write(lib.to_cstr())
     fp_out.close()
-    fp_in.close()
 
-@opster.command(usage='[-m MATH_EXECUTABLE] [-f FLAGS] def_file [-L PATH1;PATH2] [-l lib1;lib2] [-I inc1;inc2]')
+@opster.command(usage='[-m MATH_EXECUTABLE] [-f FLAGS] def_file [-L PATH1;PATH2] [-l lib1;lib2] [-I inc1;inc2] [-c COMPILER] [-s SHARDS] [-F feature1;feature2] [-i pattern1;pattern2] [-x pattern1;pattern2] [-S] [-M] [-V] [-G]')
 def build_c(def_file,
             flags=('f', '', 'Compiler flags'),
             lib_paths=('L', '', 'Library paths'),
             libraries=('l', '', 'Libraries to link'),
-            include_paths=('I', '', 'Include paths')):
+            include_paths=('I', '', 'Include paths'),
+            compiler=('c', '', 'Compiler, defaults to gcc (gfortran for Fortran libraries)'),
+            shards=('s', 1, 'Number of C files the wrappers are split in'),
+            features=('F', '', 'Compiler features to enable when supported, as openmp;native'),
+            include=('i', '', 'Functions to build, as name globs or tag:name'),
+            exclude=('x', '', 'Functions to leave out, as name globs or tag:name'),
+            share_wrappers=('S', False, 'Share the wrappers of the functions with the same prototype'),
+            multiplex=('M', False, 'Call the functions through one dispatcher per signature'),
+            version_script=('V', False, 'Link with a version script exporting only the library functions'),
+            gc_sections=('G', False, 'Leave the unreferenced code out of the library')):
     """
     Generates and builds the boilerplate code to connect Mathematica to arbitrary external libraries.
     """
-    lib_paths = lib_paths.split(';') if lib_paths else ''
-    libraries = libraries.split(';') if libraries else ''
-    include_paths = include_paths.split(';') if include_paths else ''
-    lib = LibraryObject.from_file(def_file, include_paths, libraries, lib_paths, flags)
+    lib = LibraryObject.from_file(def_file, split_list(include_paths), split_list(libraries),
+                                  split_list(lib_paths), flags, split_list(features),
+                                  split_list(include), split_list(exclude))
+    if share_wrappers:
+        lib.share_wrappers = True
+    if multiplex:
+        lib.multiplex = True
 
-    lib.build_c_library('lib{name}.so')
+    lib.build_c_library('lib{name}.so', compiler or None, shards,
+                        version_script=version_script, gc_sections=gc_sections)
 
 
 @opster.command(usage='[-d FILE] [-o FILE]')
-def generate_math(libname,
-                  output=('o','','Output file, defaults to stdout'),
-                  def_file=('d', '', 'JSON file with the definition of the library structure')):
+def generate_fortran(output=('o','','Output file, defaults to stdout'),
+                     def_file=('d', '', 'JSON file with the definition of the library structure')):
     """
-    A Python tool to auto-generate the boilerplate code to connect Mathematica to arbitrary external libraries. This command generates the Mathematica code.
+    A Python tool to auto-generate the boilerplate code to connect Mathematica to arbitrary external libraries. This command generates the bind(C) glue of Fortran libraries.
     """
     fp_out = open(output, 'w') if output else sys.stdout
     fp_in = open(def_file) if def_file else sys.stdin
 
     lib_def = json.load(fp_in)
+    lib_def['language'] = 'fortran'
     lib = LibraryObject(lib_def)
 
-    fp_out.write(lib.to_mathstr(libname))
+    fp_out.write(lib.to_f90str())
     fp_out.close()
     fp_in.close()
 
 
+@opster.command(usage='[-d FILE] [-o FILE] [-i pattern1;pattern2] [-x pattern1;pattern2] [-S] [-M]')
+def generate_math(libname,
+                  output=('o','','Output file, defaults to stdout'),
+                  def_file=('d', '', 'JSON file with the definition of the library structure'),
+                  include=('i', '', 'Functions to generate, as name globs or tag:name'),
+                  exclude=('x', '', 'Functions to leave out, as name globs or tag:name'),
+                  share_wrappers=('S', False, 'Share the wrappers of the functions with the same prototype'),
+                  multiplex=('M', False, 'Call the functions through one dispatcher per signature')):
+    """
+    A Python tool to auto-generate the boilerplate code to connect Mathematica to arbitrary external libraries. This command generates the Mathematica code.
+    """
+    fp_out = open(output, 'w') if output else sys.stdout
+    lib = load_library(def_file, include, exclude, share_wrappers, multiplex)
+
+    fp_out.write(lib.to_mathstr(libname))
+    fp_out.close()
+
+
 def main(argv=None):
     if argv is not None:
         sys.argv = ['mathbind'] + argv
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+"""
+Module with the on-disk cache of the results that are slow to compute and
+don't change between runs. The entries are pickled under
+$MATHBIND_CACHE_DIR (by default $XDG_CACHE_HOME/mathbind or ~/.cache/mathbind),
+grouped by kind and named by a hash of everything they depend on.
+"""
+
+import functools
+import hashlib
+import os
+import pickle
+import tempfile
+from path import Path
+
+CACHE_DIR_VARIABLE = 'MATHBIND_CACHE_DIR'
+
+
+def cache_dir():
+    """
+    Returns the directory of the cache.
+    """
+    directory = os.environ.get(CACHE_DIR_VARIABLE)
+    if not directory:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        directory = os.path.join(base, 'mathbind')
+    return Path(directory)
+
+
+@functools.lru_cache(maxsize=None)
+def package_stamp():
+    """
+    Returns the name, size and modification time of each module of mathbind,
+    so the entries built by a changed version of the code aren't reused.
+    """
+    package = Path(__file__).abspath().parent
+    return tuple(sorted((str(package.relpathto(f)), f.stat().st_size, f.stat().st_mtime_ns)
+                        for f in package.walkfiles('*.py')))
+
+
+def cache_key(*parts):
+    """
+    Returns the name of the entry depending on the given parts, which are
+    bytes or anything with a stable repr.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = repr(part).encode()
+        digest.update(str(len(part)).encode() + b':' + part)
+    return digest.hexdigest()
+
+
+def load(kind, key):
+    """
+    Returns the value stored in the entry, or None when it's missing or
+    can't be read.
+    """
+    try:
+        with open(cache_dir().joinpath(kind, key), 'rb') as fp:
+            return pickle.load(fp)
+    except Exception:
+        # a missing, stale or truncated entry is a cache miss, never an error
+        return None
+
+
+def store(kind, key, value):
+    """
+    Stores the value in the entry, replacing it atomically. The cache is only
+    an optimization, so failing to write it is ignored.
+    """
+    directory = cache_dir().joinpath(kind)
+    try:
+        directory.makedirs_p()
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.' + key)
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                pickle.dump(value, fp, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, directory.joinpath(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except (OSError, pickle.PicklingError):
+        pass
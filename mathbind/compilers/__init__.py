@@ -1,2 +1,4 @@
 from mathbind.compilers.compiler import Compiler
-from mathbind.compilers.gcc import GccCompiler
\ No newline at end of file
+from mathbind.compilers.gcc import GccCompiler
+from mathbind.compilers.gfortran import GfortranCompiler
+from mathbind.compilers.clang import ClangCompiler
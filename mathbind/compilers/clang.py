@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+import os
+from mathbind.compilers.gcc import GccCompiler, PROBE_SOURCE
+
+
+class ClangCompiler(GccCompiler):
+    """
+    Crude interface to the clang compiler. With link time optimization the
+    sources are compiled to LLVM bitcode and optimized when linked: ThinLTO
+    ('thin', the default) runs the code generation of each translation unit
+    in parallel over jobs threads (all the cores when None), 'full' merges
+    them in a single module and None disables it. Link time optimization
+    needs a linker plugin, so it's also disabled when the toolchain can't
+    link with it.
+    """
+    name = 'clang'
+
+    LTO_MODES = ('thin', 'full', None)
+    PROBES = dict(GccCompiler.PROBES, thin_lto=('-flto=thin', PROBE_SOURCE))
+
+    def __init__(self, flags='', include_paths=None, libs=None, lib_paths=None, command='clang',
+                 features=(), lto='thin', jobs=None, visibility=None, gc_sections=False,
+                 version_script=None):
+        if lto not in self.LTO_MODES:
+            raise ValueError('Unknown LTO mode %r' % lto)
+        super().__init__(flags, include_paths, libs, lib_paths, command, features, visibility,
+                         gc_sections, version_script)
+        self.lto = lto
+        self.jobs = jobs
+
+    def options(self):
+        options = super().options()
+        if self.lto == 'full' and self.supports('lto'):
+            lto = '-flto=full'
+        elif self.lto == 'thin' and self.supports('thin_lto'):
+            lto = '-flto=thin -flto-jobs={}'.format(self.jobs or os.cpu_count() or 1)
+        else:
+            return options
+        return (options + ' ' + lto).strip()
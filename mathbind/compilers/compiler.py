@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
 
+import shutil
+import subprocess
+from mathbind import cache
 from mathbind.generic import iterate_subtypes
 
 
 class Compiler:
     """
-    A base class for all compilers.
+    A base class for all compilers. The capabilities of a compiler are found
+    by the test builds in PROBES, which maps each capability to the flags and
+    the source enabling it. They run once per compiler binary and version, the
+    results being kept in the on-disk cache.
     """
+    PROBES = {}
+
     @classmethod
     def by_name(cls, name):
         """
@@ -16,4 +24,47 @@ class Compiler:
             if t.name == name:
                 return t
         else:
-            raise ValueError("Compiler %r not found" % name)
\ No newline at end of file
+            raise ValueError("Compiler %r not found" % name)
+
+    def version(self):
+        """
+        Returns the first line printed by the compiler for --version, empty
+        if it can't be run.
+        """
+        try:
+            result = subprocess.run([self.command, '--version'], stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, universal_newlines=True)
+        except OSError:
+            return ''
+        return result.stdout.partition('\n')[0].strip()
+
+    def probe(self, flags, source):
+        """
+        Returns whether a library built from the C source with the flags
+        compiles and links.
+        """
+        raise NotImplementedError
+
+    def capabilities(self):
+        """
+        Returns the set of the capabilities in PROBES the compiler supports.
+        """
+        found = getattr(self, '_capabilities', None)
+        if found is not None:
+            return found
+
+        key = cache.cache_key(self.name, shutil.which(self.command), self.version(),
+                              sorted(self.PROBES.items()))
+        found = cache.load('capabilities', key)
+        if found is None:
+            found = frozenset(name for name, (flags, source) in self.PROBES.items()
+                              if self.probe(flags, source))
+            cache.store('capabilities', key, found)
+        self._capabilities = found
+        return found
+
+    def supports(self, capability):
+        """
+        Returns whether the compiler supports the capability.
+        """
+        return capability in self.capabilities()
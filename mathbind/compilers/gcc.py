@@ -1,33 +1,85 @@
 #!/usr/bin/env python
 
 import os
+import subprocess
+import tempfile
 from mathbind.compilers.compiler import Compiler
 
+PROBE_SOURCE = 'int probe(int x) { return x + 1; }\n'
+
 
 class GccCompiler(Compiler):
     """
-    Crude interface to the gfortran compiler
+    Crude interface to the gcc compiler. The features are capabilities
+    enabled when the compiler supports them and skipped otherwise.
+    The exported symbols are trimmed by the visibility of the symbols not
+    marked otherwise ('hidden' exports only those marked DLLEXPORT, None
+    leaves the default of the compiler) and by a linker version script.
+    With gc_sections, the functions and data never referenced from the
+    exported symbols are left out of the library.
     """
     name = 'gcc'
 
-    def __init__(self, flags='', include_paths=None, libs=None, lib_paths=None, command='gcc'):
+    PROBES = {
+        'openmp': ('-fopenmp', '#include <omp.h>\nint probe(void) { return omp_get_max_threads(); }\n'),
+        'lto': ('-flto', PROBE_SOURCE),
+        'native': ('-march=native', PROBE_SOURCE),
+    }
+
+    def __init__(self, flags='', include_paths=None, libs=None, lib_paths=None, command='gcc',
+                 features=(), visibility=None, gc_sections=False, version_script=None):
+        for feature in features:
+            if feature not in self.PROBES:
+                raise ValueError('Unknown feature %r' % feature)
         self.command = command
         self.flags = flags
         self.include_paths = include_paths or []
         self.libs = libs or []
         self.lib_paths = lib_paths or []
+        self.features = tuple(features)
+        self.visibility = visibility
+        self.gc_sections = gc_sections
+        self.version_script = version_script
+
+    def options(self):
+        """
+        Returns the options the compiler adds after the user flags.
+        """
+        options = [self.PROBES[feature][0] for feature in self.features
+                   if self.supports(feature)]
+        if self.visibility:
+            options.append('-fvisibility=' + self.visibility)
+        if self.gc_sections:
+            options.append('-ffunction-sections -fdata-sections -Wl,--gc-sections')
+        if self.version_script:
+            options.append('-Wl,--version-script="' + self.version_script + '"')
+        return ' '.join(options)
+
+    def probe(self, flags, source):
+        with tempfile.TemporaryDirectory() as tmp:
+            source_path = os.path.join(tmp, 'probe.c')
+            with open(source_path, 'w') as fp:
+                fp.write(source)
+            command = ([self.command, '-fPIC', '-shared', '-o', os.path.join(tmp, 'probe.so'), source_path]
+                       + flags.split())
+            try:
+                result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            except OSError:
+                return False
+            return result.returncode == 0
 
     def compile_shared_library(self, files, output):
         include = ' '.join('-I "' + inc + '"' for inc in self.include_paths)
         lib = ' '.join('-l' + lib for lib in self.libs)
         lib_path = ' '.join('-L "' + lib + '"' for lib in self.lib_paths)
-        flags = ' '.join(self.flags)
+        flags = self.flags if isinstance(self.flags, str) else ' '.join(self.flags)
+        options = self.options()
 
         output = '-o "' + output + '" '
         files = ' '.join('"{}"'.format(f) for f in files)
         command = self.command
 
-        extra = ' '.join(part for part in [include, lib, lib_path, flags]
+        extra = ' '.join(part for part in [include, lib, lib_path, flags, options]
                          if part)
         if extra: extra = ' ' + extra
 
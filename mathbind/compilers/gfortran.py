@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+
+from mathbind.compilers.gcc import GccCompiler
+
+
+class GfortranCompiler(GccCompiler):
+    """
+    Crude interface to the gfortran compiler, which builds the Fortran sources
+    along with the C ones and links the Fortran runtime.
+    """
+    name = 'gfortran'
+
+    def __init__(self, flags='', include_paths=None, libs=None, lib_paths=None, command='gfortran',
+                 features=(), visibility=None, gc_sections=False, version_script=None):
+        super().__init__(flags, include_paths, libs, lib_paths, command, features, visibility,
+                         gc_sections, version_script)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+"""
+Module with the bind(C) glue that lets the C wrappers call plain Fortran
+routines.
+"""
+
+import re
+
+from mathbind.types import (BasicValueType, VoidType, PointerType, ArrayType,
+                            NumericArrayType, MappedArrayType, TensorType)
+from mathbind.template import Template
+
+
+class FortranBinding:
+    """
+    Represents the bind(C) Fortran routine exporting a Fortran function or
+    subroutine under the C name of the FunctionObject, so the C wrapper calls
+    it as any C function. The routine is called through an explicit interface
+    built from the prototype: values are received by value and passed on by
+    reference, and arrays are passed without copies. Tensors are row-major in
+    Mathematica, so the Fortran routine sees their dimensions reversed: a
+    'double a[m][n]' argument is declared as a(n, m).
+    Attributes:
+    - function (FunctionObject): function to bind, named as the Fortran routine.
+    """
+    __slots__ = ('function',)
+
+    KINDS = {
+        'float': 'real(c_float)',
+        'double': 'real(c_double)',
+        'long double': 'real(c_long_double)',
+        'float complex': 'complex(c_float_complex)',
+        'double complex': 'complex(c_double_complex)',
+        'long double complex': 'complex(c_long_double_complex)',
+        'char': 'integer(c_signed_char)',
+        'short': 'integer(c_short)',
+        'int': 'integer(c_int)',
+        'long': 'integer(c_long)',
+        'long long': 'integer(c_long_long)',
+        'int8_t': 'integer(c_int8_t)',
+        'uint8_t': 'integer(c_int8_t)',
+        'int16_t': 'integer(c_int16_t)',
+        'uint16_t': 'integer(c_int16_t)',
+        'int32_t': 'integer(c_int32_t)',
+        'uint32_t': 'integer(c_int32_t)',
+        'int64_t': 'integer(c_int64_t)',
+        'uint64_t': 'integer(c_int64_t)',
+    }
+
+    FUNCTION = Template(
+        'function {func_name}_bind({args}) bind(C, name=\'{func_name}\') result(return_value)\n'
+        '{tab}use iso_c_binding\n'
+        '{tab}implicit none\n'
+        '{declarations}'
+        '{tab}{kind} :: return_value\n'
+        '{tab}interface\n'
+        '{tab}{tab}function {func_name}({args})\n'
+        '{tab}{tab}{tab}import\n'
+        '{interface}'
+        '{tab}{tab}{tab}{kind} :: {func_name}\n'
+        '{tab}{tab}end function {func_name}\n'
+        '{tab}end interface\n'
+        '{tab}return_value = {func_name}({args})\n'
+        'end function {func_name}_bind\n'
+    )
+    SUBROUTINE = Template(
+        'subroutine {func_name}_bind({args}) bind(C, name=\'{func_name}\')\n'
+        '{tab}use iso_c_binding\n'
+        '{tab}implicit none\n'
+        '{declarations}'
+        '{tab}interface\n'
+        '{tab}{tab}subroutine {func_name}({args})\n'
+        '{tab}{tab}{tab}import\n'
+        '{interface}'
+        '{tab}{tab}end subroutine {func_name}\n'
+        '{tab}end interface\n'
+        '{tab}call {func_name}({args})\n'
+        'end subroutine {func_name}_bind\n'
+    )
+    DECLARATION = Template('{tab}{kind}{attributes} :: {argname}{shape}\n')
+    # free form lines are limited to 132 characters, and names to 63
+    MAX_LINE_WIDTH = 132
+    MAX_NAME_LENGTH = 63
+
+    def __init__(self, function):
+        self.function = function
+        if len(function.func_name + '_bind') > self.MAX_NAME_LENGTH:
+            raise ValueError('The Fortran name %s_bind is longer than %d characters'
+                             % (function.func_name, self.MAX_NAME_LENGTH))
+        if not isinstance(function.return_type, (VoidType, BasicValueType)):
+            raise ValueError('Fortran routines can only return values')
+        for argname, arg in zip(function.argnames, function.args):
+            if not isinstance(arg, (BasicValueType, PointerType, ArrayType, NumericArrayType,
+                                    MappedArrayType, TensorType)):
+                raise ValueError('Argument %r can not be passed to Fortran' % argname)
+            # fails for the element types and shapes Fortran can't take
+            self._declaration(argname, arg, '')
+
+    def __eq__(self, other):
+        return self.function == other.function
+
+    def __repr__(self):
+        return 'FortranBinding(function=%r)' % self.function
+
+    @classmethod
+    def kind(cls, c_name):
+        """
+        Returns the Fortran type interoperable with the C type. Fortran has no
+        unsigned integers, so they are received as the signed ones of the
+        same size.
+        """
+        words = [word for word in c_name.replace('_Complex', 'complex').split()
+                 if word not in ('signed', 'unsigned')]
+        if words != ['int']:
+            words = [word for word in words if word != 'int']
+        try:
+            return cls.KINDS[' '.join(words) or 'int']
+        except KeyError:
+            raise ValueError('No Fortran type for %r' % c_name)
+
+    def _shape(self, arg):
+        """
+        Returns the Fortran shape of an array argument.
+        """
+        if not isinstance(arg, TensorType):
+            return '(*)'
+        dims = [str(size) for size in reversed(arg.dims)]
+        if any(size == 'None' for size in dims[:-1]):
+            raise ValueError('Only the first dimension of a tensor passed to Fortran can be free')
+        for size in arg.dims:
+            if isinstance(size, str) and size not in self.function.argnames:
+                raise ValueError('The dimension %r is not an argument' % size)
+        if dims[-1] == 'None':
+            dims[-1] = '*'
+        return '(' + ', '.join(dims) + ')'
+
+    def _declaration(self, argname, arg, tab, by_value=True):
+        if isinstance(arg, BasicValueType):
+            kind, attributes, shape = self.kind(arg.c_name), ', value' if by_value else '', ''
+        elif isinstance(arg, NumericArrayType):
+            kind, attributes, shape = self.kind(arg.c_name), '', self._shape(arg)
+        elif isinstance(arg, PointerType):
+            kind, attributes, shape = self.kind(arg.basetype.c_name), '', ''
+        else:
+            kind, attributes, shape = self.kind(arg.basetype.c_name), '', self._shape(arg)
+        if getattr(arg, 'const', False):
+            attributes += ', intent(in)'
+        return self.DECLARATION.render(tab=tab, kind=kind, attributes=attributes,
+                                       argname=argname, shape=shape)
+
+    def _wrap(self, line, tab):
+        """
+        Returns the statement split in continuation lines at its spaces, so
+        no line is longer than MAX_LINE_WIDTH.
+        """
+        if len(line) <= self.MAX_LINE_WIDTH:
+            return line
+        # the bind clause is kept on a single line
+        words = re.split(r'(?<!bind\(C,) ', line.lstrip())
+        indent = line[:len(line) - len(line.lstrip())]
+        lines = [indent + words[0]]
+        for word in words[1:]:
+            # leaves room for the ' &' ending the line
+            if len(lines[-1]) + len(word) + 3 > self.MAX_LINE_WIDTH:
+                lines.append(indent + tab + word)
+            else:
+                lines[-1] += ' ' + word
+        return ' &\n'.join(lines)
+
+    def to_f90str(self, tab='    '):
+        """
+        Returns the Fortran code of the bind(C) routine, with the statements
+        too long for a line continued on the next ones.
+        """
+        function = self.function
+        args = ', '.join(function.argnames)
+        # the values come first, as they may size the arrays
+        arguments = sorted(zip(function.argnames, function.args),
+                           key=lambda item: not isinstance(item[1], BasicValueType))
+        declarations = ''.join(self._declaration(argname, arg, tab) for argname, arg in arguments)
+        interface = ''.join(self._declaration(argname, arg, tab * 3, by_value=False)
+                            for argname, arg in arguments)
+        if isinstance(function.return_type, VoidType):
+            code = self.SUBROUTINE.render(tab=tab, func_name=function.func_name, args=args,
+                                          declarations=declarations, interface=interface)
+        else:
+            code = self.FUNCTION.render(tab=tab, func_name=function.func_name, args=args,
+                                        declarations=declarations, interface=interface,
+                                        kind=self.kind(function.return_type.c_name))
+        return ''.join(self._wrap(line, tab) + '\n' for line in code.splitlines())
@@ -1,94 +1,736 @@
 #!/usr/bin/env python3
 
+import fnmatch
 import json
 from path import Path
 import os
-from mathbind.types import BasicType, VoidType
+from mathbind.types import (BasicType, BasicValueType, VoidType, PointerType, ArrayType,
+                            NumericArrayType, HandleType, MappedArrayType, TensorType)
+from mathbind import cache
 from mathbind.compilers.compiler import Compiler
+from mathbind.fortran import FortranBinding
+from mathbind.managed import ManagedObject
+from mathbind.template import Template
 
 
 class FunctionObject:
     """
     Represents a function object.
+    Attributes:
+    - pack_outputs (bool): gather the non-const pointer arguments (and the
+    return value) into a single packed tensor filled by the wrapper instead of
+    passing a one-element tensor for each of them.
+    - asynchronous (bool): run the function on a worker thread as a
+    LibraryLink asynchronous task, raising a "Result" event with the return
+    value when it finishes instead of blocking the kernel.
+    - memoize (bool or int): cache the results of a pure function, keyed on its
+    scalar arguments. An int sets the number of cached results (True uses
+    MEMO_CAPACITY). The cache is split in sets of MEMO_WAYS entries, evicting
+    the least recently used entry of the set, and its hits and misses are
+    returned by an extra math_<func>_memo_stats library function.
+    - chunked (bool or int): make the Mathematica wrapper split the input arrays
+    of an elementwise function in chunks of that many elements (True uses
+    CHUNK_SIZE), converting and passing one chunk at a time. The returned arrays
+    are filled chunk by chunk into buffers allocated once, and returned values
+    are gathered in a list with one value per chunk. The C wrapper is the same
+    as without chunks, so each call still allocates the output tensors of its
+    chunk, only as long as the chunk, before they are copied into the buffers.
     """
+    __slots__ = ('func_name', 'return_type', 'argnames', 'args', 'pack_outputs',
+                 'asynchronous', 'memoize', 'chunked')
 
-    def __init__(self, func_name, return_type, argnames, args):
+    options = ('pack_outputs', 'asynchronous', 'memoize', 'chunked')
+
+    MEMO_CAPACITY = 1024
+    MEMO_WAYS = 4
+    CHUNK_SIZE = 1 << 20
+    CHUNK_ZEROS = {'Real': '0.', 'Complex': 'Complex[0., 0.]'}
+
+    HEADER = Template(
+        '{export}int math_{func_name}{suffix}(WolframLibraryData libData{suffix}, '
+        'mint Argc{suffix}, MArgument *Args{suffix}, MArgument Res{suffix}) {{\n'
+    )
+    FOOTER = Template('{tab}return LIBRARY_NO_ERROR;\n}}')
+    ERROR = Template('{tab}int error{suffix} = LIBRARY_NO_ERROR;\n')
+    ERROR_FOOTER = Template('{tab}return error{suffix};\n}}')
+    ROUTINE = Template(
+        'typedef {return_type} (*{routine}_function)({args});\n'
+        'static int {routine}({routine}_function function{suffix}, WolframLibraryData libData{suffix}, '
+        'mint Argc{suffix}, MArgument *Args{suffix}, MArgument Res{suffix}) {{\n'
+    )
+    DISPATCH = Template(
+        '{tab}return {routine}({func_name}, libData{suffix}, Argc{suffix}, Args{suffix}, Res{suffix});\n'
+        '}}'
+    )
+    DERIVED = Template(
+        '{tab}{c_name} {argname} = ({c_name}) {length};\n'
+        '{tab}if((mint) {argname} != {length}) {{\n'
+        '{tab}    error{suffix} = LIBRARY_DIMENSION_ERROR;\n'
+        '{tab}    goto {cleanup};\n'
+        '{tab}}}\n'
+    )
+    DERIVED_CHECK = Template(
+        '{tab}if({length} != (mint) {argname}) {{\n'
+        '{tab}    error{suffix} = LIBRARY_DIMENSION_ERROR;\n'
+        '{tab}    goto {cleanup};\n'
+        '{tab}}}\n'
+    )
+    PACKED_DECLARE = Template('{tab}{c_name} {argname} = 0;\n')
+    PACKED_RETURN = Template('{tab}{c_name} return_value{suffix} = {func_call};\n')
+    PACKED = Template(
+        '{tab}/* Packing the outputs */\n'
+        '{tab}MTensor packed_mtensor{suffix};\n'
+        '{tab}mint packed_dims{suffix}[1] = {{{count}}};\n'
+        '{tab}error{suffix} = libData{suffix}->MTensor_new(MType_{math_name}, 1, packed_dims{suffix}, &packed_mtensor{suffix});\n'
+        '{tab}if(error{suffix}) goto {cleanup};\n'
+        '{tab}{c_math_name} * packed_data{suffix} = libData{suffix}->MTensor_get{math_name}Data(packed_mtensor{suffix});\n'
+        '{values}'
+        '{tab}MArgument_setMTensor(Res{suffix}, packed_mtensor{suffix});\n'
+    )
+    PACKED_VALUE = Template('{tab}packed_data{suffix}[{index}] = {value};\n')
+    TASK = Template(
+        'typedef struct {{\n'
+        '{tab}WolframLibraryData libData;\n'
+        '{fields}'
+        '}} task_{func_name}{suffix};\n'
+        'static void math_{func_name}_task{suffix}(mint id{suffix}, void * data{suffix}) {{\n'
+        '{tab}task_{func_name}{suffix} args{suffix} = * (task_{func_name}{suffix} *) data{suffix};\n'
+        '{tab}free(data{suffix});\n'
+        '{call}'
+        '{tab}DataStore store{suffix} = args{suffix}.libData->ioLibraryFunctions->createDataStore();\n'
+        '{store}'
+        '{tab}args{suffix}.libData->ioLibraryFunctions->raiseAsyncEvent(id{suffix}, "Result", store{suffix});\n'
+        '}}\n'
+    )
+    TASK_FIELD = Template('{tab}{c_name} {argname};\n')
+    TASK_CALL = Template('{tab}{func_call};\n')
+    TASK_RETURN = Template('{tab}{c_name} return_value{suffix} = {func_call};\n')
+    TASK_STORE = Template(
+        '{tab}args{suffix}.libData->ioLibraryFunctions->DataStore_add{math_name}(store{suffix}, return_value{suffix});\n'
+    )
+    TASK_START = Template(
+        '{tab}task_{func_name}{suffix} * task{suffix} = malloc(sizeof(task_{func_name}{suffix}));\n'
+        '{tab}if(task{suffix} == NULL) return LIBRARY_MEMORY_ERROR;\n'
+        '{tab}task{suffix}->libData = libData{suffix};\n'
+        '{assign}'
+        '{tab}mint task_id{suffix} = libData{suffix}->ioLibraryFunctions->createAsynchronousTaskWithThread('
+        'math_{func_name}_task{suffix}, task{suffix});\n'
+        '{tab}MArgument_setInteger(Res{suffix}, task_id{suffix});\n'
+    )
+    TASK_ASSIGN = Template('{tab}task{suffix}->{argname} = {argname};\n')
+    MEMO = Template(
+        'typedef struct {{\n'
+        '{fields}'
+        '}} memo_key_{func_name}{suffix};\n'
+        'typedef struct {{\n'
+        '{tab}memo_key_{func_name}{suffix} key;\n'
+        '{tab}{c_name} value;\n'
+        '{tab}mint stamp;\n'
+        '}} memo_entry_{func_name}{suffix};\n'
+        'static memo_entry_{func_name}{suffix} memo_{func_name}{suffix}[{capacity}];\n'
+        'static mint memo_clock_{func_name}{suffix} = 0;\n'
+        'static mint memo_hits_{func_name}{suffix} = 0;\n'
+        'static mint memo_misses_{func_name}{suffix} = 0;\n'
+        'DLLEXPORT int math_{func_name}_memo_stats{suffix}(WolframLibraryData libData{suffix}, '
+        'mint Argc{suffix}, MArgument *Args{suffix}, MArgument Res{suffix}) {{\n'
+        '{tab}MTensor stats{suffix};\n'
+        '{tab}mint dims{suffix}[1] = {{3}};\n'
+        '{tab}int error{suffix} = libData{suffix}->MTensor_new(MType_Integer, 1, dims{suffix}, &stats{suffix});\n'
+        '{tab}if(error{suffix}) return error{suffix};\n'
+        '{tab}mint * data{suffix} = libData{suffix}->MTensor_getIntegerData(stats{suffix});\n'
+        '{tab}data{suffix}[0] = memo_hits_{func_name}{suffix};\n'
+        '{tab}data{suffix}[1] = memo_misses_{func_name}{suffix};\n'
+        '{tab}data{suffix}[2] = {capacity};\n'
+        '{tab}MArgument_setMTensor(Res{suffix}, stats{suffix});\n'
+        '{tab}return LIBRARY_NO_ERROR;\n'
+        '}}\n'
+    )
+    MEMO_FIELD = Template('{tab}{c_name} {argname};\n')
+    MEMO_ASSIGN = Template('{tab}key{suffix}.{argname} = {argname};\n')
+    MEMO_LOOKUP = Template(
+        '{tab}memo_key_{func_name}{suffix} key{suffix};\n'
+        '{tab}memset(&key{suffix}, 0, sizeof(key{suffix}));\n'
+        '{assign}'
+        '{tab}unsigned long long hash{suffix} = 14695981039346656037ULL;\n'
+        '{tab}for(size_t i{suffix} = 0; i{suffix} < sizeof(key{suffix}); ++i{suffix})\n'
+        '{tab}    hash{suffix} = (hash{suffix} ^ ((unsigned char *) &key{suffix})[i{suffix}]) * 1099511628211ULL;\n'
+        '{tab}memo_entry_{func_name}{suffix} * set{suffix} = memo_{func_name}{suffix} + (hash{suffix} % {sets}) * {ways};\n'
+        '{tab}memo_entry_{func_name}{suffix} * entry{suffix} = NULL;\n'
+        '{tab}memo_entry_{func_name}{suffix} * oldest{suffix} = set{suffix};\n'
+        '{tab}for(mint i{suffix} = 0; i{suffix} < {ways}; ++i{suffix}) {{\n'
+        '{tab}    if(set{suffix}[i{suffix}].stamp && memcmp(&set{suffix}[i{suffix}].key, &key{suffix}, sizeof(key{suffix})) == 0)\n'
+        '{tab}        entry{suffix} = set{suffix} + i{suffix};\n'
+        '{tab}    else if(set{suffix}[i{suffix}].stamp < oldest{suffix}->stamp)\n'
+        '{tab}        oldest{suffix} = set{suffix} + i{suffix};\n'
+        '{tab}}}\n'
+        '{tab}if(entry{suffix} != NULL) {{\n'
+        '{tab}    ++memo_hits_{func_name}{suffix};\n'
+        '{tab}}}\n'
+        '{tab}else {{\n'
+        '{tab}    ++memo_misses_{func_name}{suffix};\n'
+        '{tab}    entry{suffix} = oldest{suffix};\n'
+        '{tab}    entry{suffix}->key = key{suffix};\n'
+        '{tab}    entry{suffix}->value = {func_call};\n'
+        '{tab}}}\n'
+        '{tab}entry{suffix}->stamp = ++memo_clock_{func_name}{suffix};\n'
+    )
+    MATH_MEMO_STATS = Template(
+        '{func_math_name}MemoStats{suffix} = LibraryFunctionLoad["{libname}", "math_{func_name}_memo_stats{suffix}", '
+        '{{}}, {{Integer, 1}}];\n'
+        '{func_math_name}MemoStats[] := AssociationThread[{{"Hits", "Misses", "Capacity"}}, '
+        '{func_math_name}MemoStats{suffix}[]]\n'
+    )
+    MATH_LOAD = Template(
+        '{func_math_name}{suffix} = LibraryFunctionLoad["{libname}", "math_{func_name}{suffix}", '
+        '{{{arg_code}}}, {ret_code}];\n'
+    )
+    MATH_DISPATCHED = Template('{func_math_name}{suffix} = {dispatcher}[{index}, ##] &;\n')
+    MATH_FUNC = Template(
+        '{func_name}[{args_prototype}] := Module[{{{mod_var_names}}},\n'
+        '{arg_code}'
+        '{tab}return{suffix} = {func_name}{suffix}[{arg_names}];\n'
+        '{tab}{result}\n'
+        ']\n'
+    )
+    MATH_ROUTINE = Template(
+        '{routine}[function{suffix}_{args_prototype}] := Module[{{{mod_var_names}}},\n'
+        '{arg_code}'
+        '{tab}return{suffix} = function{suffix}[{arg_names}];\n'
+        '{tab}{result}\n'
+        ']\n'
+    )
+    MATH_DISPATCH = Template('{func_name}[{args_prototype}] := {routine}[{func_name}{suffix}{args}]\n')
+    MATH_CONSTRUCTOR = Template(
+        '{func_name}[{args_prototype}] := Module[{{{mod_var_names}}},\n'
+        '{arg_code}'
+        '{tab}return{suffix} = CreateManagedLibraryExpression["{object_name}", {object_name}];\n'
+        '{tab}{func_name}{suffix}[{arg_names}];\n'
+        '{tab}{result}\n'
+        ']\n'
+    )
+    MATH_CHUNKED = Template(
+        '{func_name}[{args_prototype}] := Module[{{{mod_var_names}}},\n'
+        '{arg_code}'
+        '{tab}length{suffix} = Length[{first}];\n'
+        '{buffers}'
+        '{tab}Do[\n'
+        '{tab}{tab}end{suffix} = Min[start{suffix} + {chunk_size} - 1, length{suffix}];\n'
+        '{chunk_code}'
+        '{tab}{tab}return{suffix} = {func_name}{suffix}[{arg_names}];\n'
+        '{fill}'
+        '{tab}, {{start{suffix}, 1, length{suffix}, {chunk_size}}}];\n'
+        '{tab}{result}\n'
+        ']\n'
+    )
+    CHUNK_BUFFER = Template('{tab}{name}Chunks{suffix} = ConstantArray[{zero}, length{suffix}];\n')
+    CHUNK_VALUES = Template(
+        '{tab}{name}Chunks{suffix} = ConstantArray[0, Ceiling[length{suffix} / {chunk_size}]];\n'
+    )
+    CHUNK_FILL = Template('{tab}{name}Chunks{suffix}[[start{suffix} ;; end{suffix}]] = {name}{suffix};\n')
+    CHUNK_FILL_VALUE = Template(
+        '{tab}{name}Chunks{suffix}[[Quotient[start{suffix} - 1, {chunk_size}] + 1]] = {name}{suffix};\n'
+    )
+    MATH_ASYNC = Template(
+        '{func_name}[{args_prototype}] := Module[{{{mod_var_names}}},\n'
+        '{arg_code}'
+        '{tab}Internal`CreateAsynchronousTask[{func_name}{suffix}, {{{arg_names}}}, handler @@ #3 &]\n'
+        ']\n'
+    )
+
+    def __init__(self, func_name, return_type, argnames, args, pack_outputs=False,
+                 asynchronous=False, memoize=False, chunked=False):
         self.func_name = func_name
         self.return_type = return_type
         self.argnames = argnames
         self.args = args
+        self.pack_outputs = pack_outputs
+        self.asynchronous = asynchronous
+        self.memoize = memoize
+        self.chunked = chunked
+
+        outputs = [arg for arg in args if not arg.is_input]
+        if len(outputs) > 1:
+            raise ValueError('Only one output array is supported per function')
+        if outputs and not isinstance(return_type, VoidType):
+            raise ValueError('A function with an output array must return void')
+        if isinstance(return_type, ArrayType) and (return_type.out or
+                                                   return_type.policy == 'infinite'):
+            raise ValueError('A returned array must have a bound size')
+        if self.packed_outputs() and (outputs or isinstance(return_type, (ArrayType, HandleType))):
+            raise ValueError('Packed outputs can not be combined with returned arrays')
+        if any(t.math_name == 'Complex' for t in self._packed_types()):
+            raise ValueError('Complex values can not be packed')
+        if asynchronous:
+            if pack_outputs:
+                raise ValueError('Asynchronous functions can not pack their outputs')
+            if not all(isinstance(arg, BasicValueType) for arg in args):
+                raise ValueError('Asynchronous functions only take values by copy')
+            if not (isinstance(return_type, VoidType) or
+                    isinstance(return_type, BasicValueType) and return_type.math_name != 'Complex'):
+                raise ValueError('Asynchronous functions only return Integer, Real or Boolean values')
+        if memoize:
+            if asynchronous or pack_outputs:
+                raise ValueError('Memoized functions can not be asynchronous or pack their outputs')
+            if not all(isinstance(arg, BasicValueType) for arg in args):
+                raise ValueError('Memoized functions only take scalar arguments')
+            if not isinstance(return_type, BasicValueType):
+                raise ValueError('Memoized functions must return a value')
+        if chunked:
+            if asynchronous or memoize or pack_outputs:
+                raise ValueError('Chunked functions can not be asynchronous, memoized or pack their outputs')
+            if not self.chunked_arrays():
+                raise ValueError('Chunked functions must take an array with a variable length')
+            derived = self.derived_sizes()
+            for argname, arg in zip(argnames, args):
+                if not (isinstance(arg, BasicValueType) or
+                        isinstance(arg, ArrayType) and arg.policy != 'fixed' and
+                        (arg.is_input or arg.size in derived)):
+                    raise ValueError('Chunked functions only take values and arrays split in chunks')
+            if not (isinstance(return_type, (VoidType, BasicValueType)) or
+                    isinstance(return_type, ArrayType) and return_type.size in derived):
+                raise ValueError('Chunked functions only return values or arrays as long as a chunk')
 
     def __eq__(self, other):
         return (
             self.func_name == other.func_name and
             self.return_type == other.return_type and
             self.argnames == other.argnames and
-            self.args == other.args)
+            self.args == other.args and
+            self.pack_outputs == other.pack_outputs and
+            self.asynchronous == other.asynchronous and
+            self.memoize == other.memoize and
+            self.chunked == other.chunked)
 
     def __repr__(self):
-        r = 'FunctionObject(func_name={self.func_name}, return_type={self.return_type}, argnames={self.argnames}, args={self.args}'
+        r = ('FunctionObject(func_name={self.func_name}, return_type={self.return_type}, argnames={self.argnames}, args={self.args}, '
+             'pack_outputs={self.pack_outputs}, asynchronous={self.asynchronous}, memoize={self.memoize}, '
+             'chunked={self.chunked})')
         return r.format(self=self)
 
     def copy(self):
-        return FunctionObject(self.func_name, self.return_type, self.argnames, self.args)
+        return FunctionObject(self.func_name, self.return_type, self.argnames, self.args,
+                              self.pack_outputs, self.asynchronous, self.memoize, self.chunked)
+
+    def normalized(self):
+        """
+        Returns a copy of the function with the arguments named a0, a1, etc,
+        and the sizes tied to them renamed to match, so the functions that only
+        differ in the names of their arguments are equal once normalized.
+        """
+        names = {argname: 'a%d' % i for i, argname in enumerate(self.argnames)}
+
+        def rename(t):
+            if isinstance(t, TensorType):
+                return TensorType(t.basetype, [names.get(size, size) for size in t.dims], t.const)
+            if isinstance(t, ArrayType):
+                return ArrayType(t.basetype, t.policy, names.get(t.size, t.size), t.const, t.out,
+                                 t.ownership)
+            if isinstance(t, (NumericArrayType, MappedArrayType)):
+                element, policy, size, const = t._args()
+                return type(t)(element, policy, names.get(size, size), const)
+            return t
+
+        return FunctionObject(self.func_name, rename(self.return_type),
+                              [names[argname] for argname in self.argnames],
+                              [rename(arg) for arg in self.args], self.pack_outputs,
+                              self.asynchronous, self.memoize, self.chunked)
+
+    def packed_outputs(self):
+        """
+        Returns a list of (argname, arg) with the pointer arguments gathered in
+        the packed result, empty unless pack_outputs is set.
+        """
+        if not self.pack_outputs:
+            return []
+        return [(argname, arg) for argname, arg in zip(self.argnames, self.args)
+                if isinstance(arg, PointerType) and not arg.const]
+
+    def _packed_types(self):
+        """
+        Returns the list of value types gathered in the packed result.
+        """
+        if not self.pack_outputs:
+            return []
+        types = [arg.basetype for _, arg in self.packed_outputs()] + [self.return_type]
+        return [t for t in types if isinstance(t, BasicValueType)]
+
+    def _packed_basetype(self):
+        """
+        Returns the element type of the packed result: real if any of the
+        packed values is real, integer otherwise.
+        """
+        if any(t.math_name == 'Real' for t in self._packed_types()):
+            return BasicValueType('double')
+        return BasicValueType('long long')
+
+    def derived_sizes(self):
+        """
+        Returns a dict mapping the names of the integer arguments that hold the
+        size of a variable-length input array to (array name, array type). Those
+        are filled from the length of the first such array instead of being
+        passed, and checked against the length of the others.
+        """
+        derived = {}
+        for size, argname, arg, _ in self._sized_inputs():
+            derived.setdefault(size, (argname, arg))
+        return derived
+
+    def _sized_inputs(self):
+        """
+        Returns a list of (size, array name, array type, dimension) with the
+        input arrays and tensors whose length or dimension is an integer
+        argument, in the order of the arguments. The dimension is the index of
+        the one tied to size in a tensor, or None for an array.
+        """
+        types = dict(zip(self.argnames, self.args))
+        sized = []
+        for argname, arg in zip(self.argnames, self.args):
+            if isinstance(arg, TensorType):
+                sizes = [(size, dim) for dim, size in enumerate(arg.dims) if isinstance(size, str)]
+            elif (isinstance(arg, (ArrayType, NumericArrayType, MappedArrayType)) and arg.is_input
+                    and arg.policy == 'variable'):
+                sizes = [(arg.size, None)]
+            else:
+                sizes = []
+            sized += [(size, argname, arg, dim) for size, dim in sizes
+                      if isinstance(types.get(size), BasicValueType) and types[size].math_name == 'Integer']
+        return sized
+
+    def includes(self):
+        """
+        Returns a list with the headers needed by the types of the function,
+        without repetitions.
+        """
+        includes = []
+        for arg in [self.return_type] + list(self.args):
+            includes += [inc for inc in arg.includes if inc not in includes]
+        if self.asynchronous:
+            includes += ['"WolframIOLibraryFunctions.h"']
+        if self.memoize:
+            includes += ['<string.h>']
+        return includes
+
+    def helpers(self):
+        """
+        Returns a list with the C helpers called by the code of the types of
+        the function, without repetitions.
+        """
+        helpers = []
+        for helper in self.return_type.return_helpers + sum((arg.helpers for arg in self.args), ()):
+            if helper not in helpers:
+                helpers.append(helper)
+        return helpers
+
+    @property
+    def memo_capacity(self):
+        """
+        Number of results cached by a memoized function, a multiple of MEMO_WAYS.
+        """
+        capacity = self.MEMO_CAPACITY if self.memoize is True else int(self.memoize)
+        return -(-capacity // self.MEMO_WAYS) * self.MEMO_WAYS
+
+    @property
+    def chunk_size(self):
+        """
+        Number of elements passed in each call of a chunked function.
+        """
+        return self.CHUNK_SIZE if self.chunked is True else int(self.chunked)
+
+    def chunked_arrays(self):
+        """
+        Returns a list of (argname, arg) with the input arrays split in chunks,
+        the ones without a fixed size.
+        """
+        return [(argname, arg) for argname, arg in zip(self.argnames, self.args)
+                if isinstance(arg, ArrayType) and arg.is_input and arg.policy != 'fixed']
+
+    def inputs(self):
+        """
+        Returns a list of (argname, arg) with the arguments passed from Mathematica.
+        """
+        skipped = set(self.derived_sizes()) | {argname for argname, _ in self.packed_outputs()}
+        return [(argname, arg) for argname, arg in zip(self.argnames, self.args)
+                if arg.is_input and argname not in skipped]
+
+    @property
+    def result_type(self):
+        """
+        Type of the result sent back to Mathematica: the packed outputs or the
+        output array, if there's one, or else the return type.
+        """
+        packed = self.packed_outputs()
+        if packed:
+            count = len(packed) + (not isinstance(self.return_type, VoidType))
+            return ArrayType(self._packed_basetype(), 'fixed', count, out=True)
+        for arg in self.args:
+            if not arg.is_input:
+                return arg
+        return self.return_type
 
-    def func_str(self, tab='', suffix=None):
+    def func_str(self, tab='', suffix=None, export=True):
         """
         Returns the C code for Mathematica to interact with the function.
         Args:
         - tab (str): string to add at the beginning of each line.
         - suffix: suffix to add after the variable
+        - export (bool): export the wrapper from the library, instead of only
+        reaching it through a dispatcher.
         """
         if suffix is None:
-            suffix = self.default_suffix
-        header = ('DLLEXPORT int math_{self.func_name}{suffix}(WolframLibraryData libData{suffix}, '
-                  'mint Argc{suffix}, MArgument *Args{suffix}, MArgument Res{suffix}) {{\n')
-        header = header.format(self=self, suffix=suffix)
+            suffix = BasicType.default_suffix
+        header = self.HEADER.render(export='DLLEXPORT ' if export else '',
+                                    func_name=self.func_name, suffix=suffix)
+        if self.asynchronous:
+            return self._async_cstr(header, tab, suffix)
+        if self.memoize:
+            return self._memo_cstr(header, tab, suffix)
+        return header + self._body_cstr(self.func_name, tab, suffix)
 
+    def _body_cstr(self, callee, tab, suffix):
+        """
+        Returns the body of the wrapper, retrieving the arguments, calling
+        callee with them and sending back the results. Every error after an
+        argument is retrieved jumps to the cleanup releasing it, which runs
+        the cleanups of the arguments retrieved before it, in reverse order,
+        and returns the error. The successful calls end with the same code.
+        """
         args_text = ''
-        after_code = ''
+        mapped_text = ''
+        derived_text = ''
+        outputs_text = ''
         args_param = []
-        for i, (argname, arg) in enumerate(zip(self.argnames, self.args)):
-            args_text += arg.retrieve_cstr(argname, i, tab, suffix)
+        index = 0
+        derived = self.derived_sizes()
+        packed = dict(self.packed_outputs())
+        inputs, mapped, outputs = [], [], []
+        for argname, arg in zip(self.argnames, self.args):
+            if argname in packed:
+                inputs.append((argname, arg, None))
+            elif argname not in derived and not arg.is_input:
+                outputs.append((argname, arg, None))
+            elif argname not in derived:
+                # the files are mapped after the other inputs are retrieved
+                (mapped if isinstance(arg, MappedArrayType) else inputs).append((argname, arg, index))
+                index += arg.arg_count
             args_param += [arg.pass_cstr(argname)]
-            after_code += arg.after_cstr(argname, tab, suffix)
-        func_call = '{self.func_name}({args_param})'.format(self=self, args_param=', '.join(args_param))
+        func_call = callee + '(' + ', '.join(args_param) + ')'
+
+        # the labels and after code of the arguments to release, in the order
+        # they are retrieved, so the errors jump to the last one
+        cleanups = []
+        cleanup = BasicType.cleanup_label(suffix=suffix)
+
+        def retrieve(argname, arg, index):
+            nonlocal cleanup
+            text = arg.retrieve_cstr(argname, index, tab, suffix, cleanup)
+            after = arg.after_cstr(argname, tab, suffix)
+            if after:
+                cleanup = BasicType.cleanup_label(argname, suffix)
+                cleanups.append((cleanup, after))
+            return text
+
+        for argname, arg, index in inputs:
+            if argname in packed:
+                args_text += self.PACKED_DECLARE.render(tab=tab, c_name=arg.basetype.c_name,
+                                                        argname=argname)
+            else:
+                args_text += retrieve(argname, arg, index)
+        for argname, arg, index in mapped:
+            mapped_text += retrieve(argname, arg, index)
+        for argname, arg in zip(self.argnames, self.args):
+            if argname in derived:
+                # filled in after the array holding it is retrieved, and the
+                # other arrays of that size must be as long
+                lengths = [array.length_cstr(array_name, suffix) if dim is None else
+                           array.dim_cstr(array_name, size, suffix, dim)
+                           for size, array_name, array, dim in self._sized_inputs() if size == argname]
+                derived_text += self.DERIVED.render(tab=tab, c_name=arg.c_name, argname=argname,
+                                                    length=lengths[0], suffix=suffix, cleanup=cleanup)
+                derived_text += ''.join(self.DERIVED_CHECK.render(tab=tab, argname=argname, length=length,
+                                                                  suffix=suffix, cleanup=cleanup)
+                                        for length in lengths[1:])
+        for argname, arg, index in outputs:
+            # allocated after the inputs, which may hold its size
+            outputs_text += retrieve(argname, arg, index)
+
+        if packed:
+            return_text = self._packed_cstr(func_call, tab, suffix, cleanup)
+        else:
+            return_text = self.return_type.return_cstr(func_call, tab, suffix, cleanup)
+
+        body = args_text + mapped_text + derived_text + outputs_text + return_text
+        labels = [label for label, _ in cleanups] + [BasicType.cleanup_label(suffix=suffix)]
+        used = [label for label in labels if 'goto ' + label + ';' in body]
+        if not used:
+            return body + ''.join(after for _, after in cleanups) + self.FOOTER.render(tab=tab)
+        for label, after in reversed(cleanups):
+            if label in used:
+                body += label + ':\n'
+            body += after
+        if labels[-1] in used:
+            body += labels[-1] + ':\n'
+        return (self.ERROR.render(tab=tab, suffix=suffix) + body +
+                self.ERROR_FOOTER.render(tab=tab, suffix=suffix))
+
+    def routine_cstr(self, routine, tab='', suffix=None):
+        """
+        Returns the C code of a static routine doing the work of the wrapper
+        for any function with the same prototype, the function to call being
+        its first argument. Asynchronous and memoized functions keep state of
+        their own, so they have no routine and None is returned.
+        Args:
+        - routine (str): name of the routine.
+        - tab (str): string to add at the beginning of each line.
+        - suffix: suffix to add after the variable
+        """
+        if self.asynchronous or self.memoize:
+            return None
+        if suffix is None:
+            suffix = BasicType.default_suffix
+        header = self.ROUTINE.render(return_type=self.return_type.prototype_return_cstr(),
+                                     routine=routine, args=self._prototype_args(), suffix=suffix)
+        return header + self._body_cstr('function' + suffix, tab, suffix) + '\n'
 
-        return_text = self.return_type.return_cstr(func_call, tab, suffix)
-        footer = '{tab}return LIBRARY_NO_ERROR;\n}}'.format(tab=tab)
+    def dispatch_cstr(self, routine, tab='', suffix=None, export=True):
+        """
+        Returns the C code of the wrapper handing the call over to the shared
+        routine, along with the function.
+        """
+        if suffix is None:
+            suffix = BasicType.default_suffix
+        header = self.HEADER.render(export='DLLEXPORT ' if export else '',
+                                    func_name=self.func_name, suffix=suffix)
+        return header + self.DISPATCH.render(tab=tab, routine=routine, func_name=self.func_name,
+                                             suffix=suffix)
 
-        return (header + args_text + return_text + after_code + footer)
+    def _async_cstr(self, header, tab, suffix):
+        """
+        Returns the C code of the task running the function on a worker thread
+        and of the library function that copies the arguments and starts it.
+        """
+        arguments = list(zip(self.argnames, self.args))
+        fields = ''.join(self.TASK_FIELD.render(tab=tab, c_name=arg.c_name, argname=argname)
+                         for argname, arg in arguments)
+        func_call = (self.func_name + '(' +
+                     ', '.join('args' + suffix + '.' + argname for argname, _ in arguments) + ')')
+        if isinstance(self.return_type, VoidType):
+            call = self.TASK_CALL.render(tab=tab, func_call=func_call)
+            store = ''
+        else:
+            call = self.TASK_RETURN.render(tab=tab, c_name=self.return_type.c_name,
+                                           suffix=suffix, func_call=func_call)
+            store = self.TASK_STORE.render(tab=tab, suffix=suffix,
+                                           math_name=self.return_type.math_name)
+        task = self.TASK.render(tab=tab, func_name=self.func_name, suffix=suffix,
+                                fields=fields, call=call, store=store)
+
+        args_text = ''.join(arg.retrieve_cstr(argname, index, tab, suffix)
+                            for index, (argname, arg) in enumerate(arguments))
+        assign = ''.join(self.TASK_ASSIGN.render(tab=tab, suffix=suffix, argname=argname)
+                         for argname, _ in arguments)
+        start = self.TASK_START.render(tab=tab, func_name=self.func_name, suffix=suffix,
+                                       assign=assign)
+        return task + header + args_text + start + self.FOOTER.render(tab=tab)
+
+    def _memo_cstr(self, header, tab, suffix):
+        """
+        Returns the C code of the result cache, of the library function returning
+        its statistics and of the function looking the arguments up in it before
+        calling the C function.
+        """
+        arguments = list(zip(self.argnames, self.args))
+        capacity = self.memo_capacity
+        fields = ''.join(self.MEMO_FIELD.render(tab=tab, c_name=arg.c_name, argname=argname)
+                         for argname, arg in arguments)
+        if not arguments:
+            # C doesn't allow empty structs
+            fields = self.MEMO_FIELD.render(tab=tab, c_name='char', argname='empty')
+        memo = self.MEMO.render(tab=tab, func_name=self.func_name, suffix=suffix, fields=fields,
+                                c_name=self.return_type.c_name, capacity=capacity)
+
+        args_text = ''.join(arg.retrieve_cstr(argname, index, tab, suffix)
+                            for index, (argname, arg) in enumerate(arguments))
+        assign = ''.join(self.MEMO_ASSIGN.render(tab=tab, suffix=suffix, argname=argname)
+                         for argname, _ in arguments)
+        func_call = self.func_name + '(' + ', '.join(arg.pass_cstr(argname)
+                                                     for argname, arg in arguments) + ')'
+        lookup = self.MEMO_LOOKUP.render(tab=tab, func_name=self.func_name, suffix=suffix,
+                                         assign=assign, func_call=func_call, ways=self.MEMO_WAYS,
+                                         sets=capacity // self.MEMO_WAYS)
+        return_text = self.return_type.return_cstr('entry' + suffix + '->value', tab, suffix)
+        return memo + header + args_text + lookup + return_text + self.FOOTER.render(tab=tab)
+
+    def _packed_cstr(self, func_call, tab, suffix, cleanup):
+        """
+        Returns the C code that calls the function and sends the return value
+        and the pointer outputs back in a single packed tensor, jumping to the
+        cleanup if the tensor can't be allocated.
+        """
+        values = []
+        if isinstance(self.return_type, VoidType):
+            call_text = self.return_type.return_cstr(func_call, tab, suffix)
+        else:
+            call_text = self.PACKED_RETURN.render(tab=tab, c_name=self.return_type.c_name,
+                                                  suffix=suffix, func_call=func_call)
+            values += ['return_value' + suffix]
+        values += [argname for argname, _ in self.packed_outputs()]
+
+        basetype = self._packed_basetype()
+        values_text = ''.join(self.PACKED_VALUE.render(tab=tab, suffix=suffix, index=i, value=value)
+                              for i, value in enumerate(values))
+        return call_text + self.PACKED.render(
+            tab=tab, suffix=suffix, cleanup=cleanup, count=len(values), values=values_text,
+            math_name=basetype.math_name, c_math_name=basetype.c_math_name)
 
     @classmethod
-    def from_dict(self, d):
+    def from_dict(self, d, defaults=None):
         """
         Returns a new FunctionObject from the dictionary.
 
         :param d: dictionary with the function definitions. Must have the form
         {
             "name": "FUNCTION_NAME",
+            "return": "return_type",
+            "ownership": "copy" or "adopt" (only for array return types),
             "args": [
                 {"name": "arg1_name", type: "arg1_type"}
                 ...
                 ]
         }
+        or {"prototype": "int func1(double foo);"} instead of name, return and
+        args. It may also set any of the FunctionObject.options, and list
+        the tags used to select it in a library as "tags".
+        :param defaults: dictionary with the default options.
         :return: FunctionObject
         """
-        func_name = d['name']
-        return_type = BasicType.from_str(d['return'])
+        options = dict(defaults or {})
+        options.update((key, d[key]) for key in self.options if key in d)
 
-        arg_names = [arg['name'] for arg in d['args']]
-        arg_types = [BasicType.from_str(arg['type']) for arg in d['args']]
+        if 'prototype' in d:
+            parsed = FunctionObject.from_str(d['prototype'])
+            func_name, return_type = parsed.func_name, parsed.return_type
+            arg_names, arg_types = parsed.argnames, parsed.args
+        else:
+            func_name = d['name']
+            return_type = BasicType.from_str(d['return'])
+            arg_names = [arg['name'] for arg in d['args']]
+            arg_types = [BasicType.from_str(arg['type']) for arg in d['args']]
 
-        return FunctionObject(func_name, return_type, arg_names, arg_types)
+        if 'ownership' in d:
+            if not isinstance(return_type, ArrayType):
+                raise ValueError('Only returned arrays have an ownership')
+            return_type = return_type.with_ownership(d['ownership'])
+
+        return FunctionObject(func_name, return_type, arg_names, arg_types, **options)
 
     @classmethod
-    def from_str(self, s):
+    def from_str(self, s, defaults=None):
         """
         Returns a new FunctionObject from the string.
 
         :param s: prototype declaration. Example:
         - int func1(double foo);'
+        :param defaults: dictionary with the default options.
         :return: FunctionObject
         """
         if s.count('(') != 1 or s.count(')') != 1:
@@ -99,6 +741,8 @@ class FunctionObject:
 
         *type_words, func_name = s[: par1].split()
         args = s[par1 + 1: par2].split(',')
+        if len(args) == 1 and args[0].strip() in ('', 'void'):
+            args = []
 
         if s[par2 + 1:].replace(';', '').strip():
             raise ValueError('Displaced comma')
@@ -109,10 +753,32 @@ class FunctionObject:
         args_types = [BasicType.from_prototype_cstr(arg) for arg in args]
         d['args'] = [{'name': arg[1], 'type': arg[0].typename} for arg in args_types]
 
-        return FunctionObject.from_dict(d)
+        return FunctionObject.from_dict(d, defaults)
+
+    @classmethod
+    def name_of(cls, obj):
+        """
+        Returns the name of the function defined by obj, as accepted by
+        FunctionObject.from_obj(), without parsing it.
+        """
+        if isinstance(obj, FunctionObject):
+            return obj.func_name
+        if isinstance(obj, dict):
+            if 'prototype' not in obj:
+                return obj['name']
+            obj = obj['prototype']
+        words = obj.partition('(')[0].split()
+        return words[-1] if words else ''
+
+    @classmethod
+    def tags_of(cls, obj):
+        """
+        Returns the tags of the function defined by obj.
+        """
+        return obj.get('tags', []) if isinstance(obj, dict) else []
 
     @classmethod
-    def from_obj(self, obj):
+    def from_obj(self, obj, defaults=None):
         """
         Tries to call FunctionObject.from_dict() and if it raises an error
         calls FunctionObject.from_str().
@@ -121,70 +787,265 @@ class FunctionObject:
             return obj.copy()
 
         try:
-            return FunctionObject.from_dict(obj)
+            return FunctionObject.from_dict(obj, defaults)
         except (KeyError, TypeError):
-            return FunctionObject.from_str(obj)
+            return FunctionObject.from_str(obj, defaults)
 
     def prototype_cstr(self):
         """
         Returns a prototype of the function.
         """
-        args = []
-        for argname, arg in zip(self.argnames, self.args):
-            args += [arg.prototype_cstr(argname)]
-        args = ', '.join(args)
-
         return_type = self.return_type.prototype_return_cstr()
-        return return_type + ' ' + self.func_name + '(' + args + ');\n'
+        return return_type + ' ' + self.func_name + '(' + self._prototype_args() + ');\n'
+
+    def _prototype_args(self):
+        return ', '.join(arg.prototype_cstr(argname)
+                         for argname, arg in zip(self.argnames, self.args))
+
+    def math_signature(self):
+        """
+        Returns the argument and return types of the library function, as
+        given to LibraryFunctionLoad.
+        """
+        arg_code = ', '.join(arg.math_name for _, arg in self.inputs())
+        if isinstance(self.return_type, HandleType):
+            # id of the expression to store the constructed object in
+            arg_code += ', Integer' if arg_code else 'Integer'
+        ret_code = self.result_type.math_return_name
+        if self.asynchronous:
+            # the library function returns the id of the task
+            ret_code = 'Integer'
+        return arg_code, ret_code
 
-    def math_load(self, libname, suffix=None):
+    def math_load(self, libname, suffix=None, dispatch=None):
         """
         Returns a Mathematica string to load the function from the library.
+        Args:
+        - dispatch (tuple): the loaded dispatcher and the id of the function,
+        to call the function through the dispatcher instead of loading it.
         """
-        arg_code = ', '.join(arg.math_name for arg in self.args)
-        ret_code = self.return_type.math_name
         func_name = self.func_name
         func_math_name = self.func_name.replace('_', '')
         if suffix is None:
             suffix = BasicType.default_suffix
-        form = '{func_math_name}{suffix} = LibraryFunctionLoad["{libname}", "math_{func_name}{suffix}", {{{arg_code}}}, {ret_code}];\n'
-        return form.format(**locals())
+        if dispatch is not None:
+            dispatcher, index = dispatch
+            return self.MATH_DISPATCHED.render(func_math_name=func_math_name, suffix=suffix,
+                                               dispatcher=dispatcher, index=index)
+        arg_code, ret_code = self.math_signature()
+        return self.MATH_LOAD.render(func_math_name=func_math_name, suffix=suffix, libname=libname,
+                                     func_name=func_name, arg_code=arg_code, ret_code=ret_code)
 
-    def math_str(self, libname, tab='', suffix=None):
+    def _math_call(self, tab, suffix):
         """
-        Return the full Mathematica code to link the function from the library.
+        Returns the Mathematica code converting the arguments, the patterns
+        and local variables of the definition, the arguments of the library
+        function and the result sent back.
         """
-        if suffix is None:
-            suffix = BasicType.default_suffix
-        math_load = self.math_load(libname, suffix)
+        inputs = self.inputs()
         arg_code = ''.join(arg.before_mathstr(argname, tab, suffix)
-                           for arg, argname in zip(self.args, self.argnames))
+                           for argname, arg in inputs)
 
-        args_prototype = ', '.join(argname + '_' for argname in self.argnames)
+        args_prototype = ', '.join(argname + '_' for argname, _ in inputs)
         mod_var_names = ', '.join(['return' + suffix] +
-                              [argname + suffix for argname in self.argnames])
-        return_var_names = ', '.join((['return' + suffix] if self.return_type != VoidType('void') else []) +
-                              [argname + suffix
-                               for argname, arg in zip(self.argnames, self.args)
-                               if arg.should_return])
-        arg_names = ', '.join(argname + suffix for argname in self.argnames)
+                              [argname + suffix for argname, _ in inputs])
+        return_var_names = [argname + suffix for argname, arg in inputs if arg.should_return]
+        if self.packed_outputs():
+            # the packed tensor already is the list of outputs
+            result = 'return' + suffix
+            if return_var_names:
+                result = 'Join[' + result + ', {' + ', '.join(return_var_names) + '}]'
+        else:
+            if self.result_type != VoidType('void'):
+                return_var_names = ['return' + suffix] + return_var_names
+            result = '{' + ', '.join(return_var_names) + '}'
+        arg_names = ', '.join(arg.call_mathstr(argname, suffix) for argname, arg in inputs)
+        return arg_code, args_prototype, mod_var_names, arg_names, result
+
+    def math_routine(self, routine, tab='', suffix=None):
+        """
+        Returns the Mathematica definition doing the work of math_str for any
+        function with the same arguments and result, the loaded library
+        function being its first argument. Only the plain definitions are
+        shared: None is returned for asynchronous, memoized and chunked
+        functions and for constructors.
+        """
+        if (self.asynchronous or self.memoize or self.chunked or
+                isinstance(self.return_type, HandleType)):
+            return None
+        if suffix is None:
+            suffix = BasicType.default_suffix
+        arg_code, _, mod_var_names, arg_names, result = self._math_call(tab, suffix)
+        return self.MATH_ROUTINE.render(
+            routine=routine, args_prototype=''.join(', ' + argname + '_' for argname, _ in self.inputs()),
+            mod_var_names=mod_var_names, arg_code=arg_code, tab=tab, suffix=suffix,
+            arg_names=arg_names, result=result)
+
+    def math_str(self, libname, tab='', suffix=None, routine=None, dispatch=None):
+        """
+        Return the full Mathematica code to link the function from the library.
+        Args:
+        - routine (str): name of the definition from math_routine to hand the
+        call over to, instead of defining the whole conversion.
+        - dispatch (tuple): the loaded dispatcher and the id of the function,
+        as for math_load.
+        """
+        if suffix is None:
+            suffix = BasicType.default_suffix
+        math_load = self.math_load(libname, suffix, dispatch)
+        inputs = self.inputs()
         func_name = self.func_name.replace('_', '')
+        if routine is not None:
+            return math_load + self.MATH_DISPATCH.render(
+                func_name=func_name, suffix=suffix, routine=routine,
+                args_prototype=', '.join(argname + '_' for argname, _ in inputs),
+                args=''.join(', ' + argname for argname, _ in inputs))
+        arg_code, args_prototype, mod_var_names, arg_names, result = self._math_call(tab, suffix)
 
-        func_code = (
-            '{func_name}[{args_prototype}] := Module[{{{mod_var_names}}},\n'
-            '{arg_code}'
-            '{tab}return{suffix} = {func_name}{suffix}[{arg_names}];\n'
-            '{tab}{{{return_var_names}}}\n'
-            ']\n'
-        ).format(**locals())
+        if self.asynchronous:
+            # the handler receives the values in the "Result" event
+            args_prototype = ', '.join([argname + '_' for argname, _ in inputs] + ['handler_'])
+            func_code = self.MATH_ASYNC.render(
+                func_name=func_name, args_prototype=args_prototype,
+                mod_var_names=', '.join(argname + suffix for argname, _ in inputs),
+                arg_code=arg_code, tab=tab, suffix=suffix, arg_names=arg_names)
+        elif self.chunked:
+            func_code = self._chunked_mathstr(func_name, args_prototype, mod_var_names,
+                                              arg_names, tab, suffix)
+        elif isinstance(self.return_type, HandleType):
+            arg_names = ', '.join([arg.call_mathstr(argname, suffix) for argname, arg in inputs] +
+                                  ['ManagedLibraryExpressionID[return' + suffix + ']'])
+            func_code = self.MATH_CONSTRUCTOR.render(
+                func_name=func_name, args_prototype=args_prototype, mod_var_names=mod_var_names,
+                arg_code=arg_code, tab=tab, suffix=suffix, arg_names=arg_names,
+                result=result, object_name=self.return_type.name)
+        else:
+            func_code = self.MATH_FUNC.render(
+                func_name=func_name, args_prototype=args_prototype, mod_var_names=mod_var_names,
+                arg_code=arg_code, tab=tab, suffix=suffix, arg_names=arg_names,
+                result=result)
+
+        if self.memoize:
+            func_code += self.MATH_MEMO_STATS.render(func_math_name=func_name, func_name=self.func_name,
+                                                     suffix=suffix, libname=libname)
 
         return math_load + func_code
 
+    def _chunked_mathstr(self, func_name, args_prototype, mod_var_names, arg_names, tab, suffix):
+        """
+        Returns the Mathematica function calling the library function once per
+        chunk of the input arrays and filling the results into buffers. Only
+        the buffers are preallocated: the output arrays of a chunk come back
+        as new tensors from the unchanged C wrapper, and are copied in place.
+        """
+        chunked = dict(self.chunked_arrays())
+        inputs = self.inputs()
+        arg_code = ''.join(arg.before_mathstr(argname, tab, suffix)
+                           for argname, arg in inputs if argname not in chunked)
+        chunk_code = ''.join(arg.chunk_mathstr(argname, 'start' + suffix, 'end' + suffix, tab + tab, suffix)
+                             for argname, arg in inputs if argname in chunked)
+
+        results = [(argname, arg) for argname, arg in inputs if arg.should_return]
+        if self.result_type != VoidType('void'):
+            results = [('return', self.result_type)] + results
+        buffers = fill = ''
+        names = []
+        for name, result in results:
+            if isinstance(result, ArrayType):
+                zero = self.CHUNK_ZEROS.get(result.basetype.math_name, '0')
+                buffers += self.CHUNK_BUFFER.render(tab=tab, name=name, suffix=suffix, zero=zero)
+                fill += self.CHUNK_FILL.render(tab=tab + tab, name=name, suffix=suffix)
+            else:
+                buffers += self.CHUNK_VALUES.render(tab=tab, name=name, suffix=suffix,
+                                                    chunk_size=self.chunk_size)
+                fill += self.CHUNK_FILL_VALUE.render(tab=tab + tab, name=name, suffix=suffix,
+                                                     chunk_size=self.chunk_size)
+            names += [name + 'Chunks' + suffix]
+
+        mod_var_names = ', '.join([mod_var_names] + [name + suffix for name in ('length', 'start', 'end')] +
+                                  names)
+        return self.MATH_CHUNKED.render(
+            func_name=func_name, args_prototype=args_prototype, mod_var_names=mod_var_names,
+            arg_code=arg_code, tab=tab, suffix=suffix, first=self.chunked_arrays()[0][0],
+            buffers=buffers, chunk_code=chunk_code, chunk_size=self.chunk_size,
+            arg_names=arg_names, fill=fill, result='{' + ', '.join(names) + '}')
+
 
 class LibraryObject:
     """
-    Represents a whole library.
+    Represents a whole library. Any of the FunctionObject.options set in the
+    info dictionary is used as the default for all its functions. The objects
+    entry lists the managed objects, as dictionaries for ManagedObject.from_dict.
+    The init and uninit entries name C functions called when the library is
+    loaded and unloaded, with the prototypes int init(void) and void uninit(void).
+    A non-zero value returned by init is reported back as the loading error.
+    The language entry is the language of the bound functions, 'c' (the
+    default) or 'fortran', which adds the bind(C) glue to call them from C.
+    The features entry lists the compiler capabilities to use when the
+    compiler supports them, as 'openmp' or 'native'.
+    The include and exclude entries select the functions of the library,
+    keeping those matching any include pattern (all by default) and none of
+    the exclude ones. A pattern is a glob on the function name, or 'tag:name'
+    to match the functions tagged with name. Functions left out are never
+    parsed, generated or compiled.
+    With share_wrappers set, the functions whose wrappers would be identical
+    but for the function they call, as those of the functions of the same
+    prototype, share a single routine taking a pointer to that function. Their
+    own wrappers only hand the call over to it, and their Mathematica
+    definitions likewise call a single shared definition.
+    With multiplex set, the functions with the same argument and return types
+    are called through a single exported dispatcher taking the id of the
+    function before its arguments, so the package loads one library function
+    per signature instead of one per function. Asynchronous functions are
+    still loaded by themselves.
     """
+    LANGUAGES = ('c', 'fortran')
+
+    INITIALIZE = Template(
+        'DLLEXPORT int WolframLibrary_initialize(WolframLibraryData libData) {{\n'
+        '{body}'
+        '{tab}return 0;\n'
+        '}}\n'
+    )
+    UNINITIALIZE = Template(
+        'DLLEXPORT void WolframLibrary_uninitialize(WolframLibraryData libData) {{\n'
+        '{body}'
+        '}}\n'
+    )
+    INIT_HOOK = Template(
+        '{tab}int init_error = {init}();\n'
+        '{tab}if(init_error) return init_error;\n'
+    )
+    UNINIT_HOOK = Template('{tab}{uninit}();\n')
+    DISPATCHER = Template(
+        'static int (*const {name}_dispatch{index}_functions{suffix}[])'
+        '(WolframLibraryData, mint, MArgument *, MArgument) = {{\n'
+        '{entries}'
+        '}};\n'
+        'DLLEXPORT int {name}_dispatch{index}{suffix}(WolframLibraryData libData{suffix}, '
+        'mint Argc{suffix}, MArgument *Args{suffix}, MArgument Res{suffix}) {{\n'
+        '{tab}mint id{suffix} = MArgument_getInteger(Args{suffix}[0]);\n'
+        '{tab}if(id{suffix} < 0 || id{suffix} >= {count}) return LIBRARY_FUNCTION_ERROR;\n'
+        '{tab}return {name}_dispatch{index}_functions{suffix}[id{suffix}]'
+        '(libData{suffix}, Argc{suffix} - 1, Args{suffix} + 1, Res{suffix});\n'
+        '}}\n'
+    )
+    DISPATCHER_DECLARATION = Template(
+        'int math_{func_name}{suffix}(WolframLibraryData, mint, MArgument *, MArgument);\n'
+    )
+    DISPATCHER_ENTRY = Template('{tab}math_{func_name}{suffix},\n')
+    VERSION_SCRIPT = Template(
+        '{{\n'
+        '{tab}global:\n'
+        '{symbols}'
+        '{tab}local: *;\n'
+        '}};\n'
+    )
+    MATH_DISPATCHER = Template(
+        '{math_name}Dispatch{index}{suffix} = LibraryFunctionLoad["{libname}", '
+        '"{name}_dispatch{index}{suffix}", {{{arg_code}}}, {ret_code}];\n'
+    )
+
     def __init__(self, info):
         self.name = info['name']
         self.path = info.get('path', '')
@@ -193,18 +1054,64 @@ class LibraryObject:
 
         self.files = info.get('files', [])
         self.flags = info.get('flags', '')
-        self.functions = [FunctionObject.from_obj(f) for f in info['functions']]
+        defaults = {key: info[key] for key in FunctionObject.options if key in info}
+        self.include = info.get('include', [])
+        self.exclude = info.get('exclude', [])
+        self.functions = [FunctionObject.from_obj(f, defaults) for f in info['functions']
+                          if self.selects(f)]
+        self.objects = [ManagedObject.from_dict(o) for o in info.get('objects', [])]
+        declared = {o.name for o in self.objects}
+        for func in self.functions:
+            for t in [func.return_type] + list(func.args):
+                if isinstance(t, HandleType) and t.name not in declared:
+                    raise ValueError('Undeclared managed object %r' % t.name)
+        self.init = info.get('init')
+        self.uninit = info.get('uninit')
+        self.language = info.get('language', 'c')
+        if self.language not in self.LANGUAGES:
+            raise ValueError('Unknown language %r' % self.language)
+        self.bindings = []
+        if self.language == 'fortran':
+            self.bindings = [FortranBinding(func) for func in self.functions]
         self.libraries = info.get('libraries', [])
         self.lib_paths = info.get('lib_paths', [])
         self.lib_paths = [p.format(current=self.path) for p in self.lib_paths]
         self.include_paths = info.get('include_paths', [])
         self.include_paths = [p.format(current=self.path) for p in self.include_paths]
+        self.features = info.get('features', [])
+        self.share_wrappers = info.get('share_wrappers', False)
+        self.multiplex = info.get('multiplex', False)
+
+    @staticmethod
+    def _matches(obj, patterns):
+        name = FunctionObject.name_of(obj)
+        tags = FunctionObject.tags_of(obj)
+        for pattern in patterns:
+            if pattern.startswith('tag:'):
+                if pattern[len('tag:'):] in tags:
+                    return True
+            elif fnmatch.fnmatchcase(name, pattern):
+                return True
+        return False
+
+    def selects(self, obj):
+        """
+        Returns whether the function defined by obj is selected by the
+        include and exclude patterns, without parsing it.
+        """
+        if self.include and not self._matches(obj, self.include):
+            return False
+        return not self._matches(obj, self.exclude)
 
     def __eq__(self, other):
         return (self.name == other.name and
                 self.path == other.path and
                 self.flags == other.flags and
-                self.functions == other.functions)
+                self.functions == other.functions and
+                self.objects == other.objects and
+                self.init == other.init and
+                self.uninit == other.uninit and
+                self.language == other.language)
 
     def __repr__(self):
         return 'LibraryObject(%r)' % {
@@ -215,13 +1122,25 @@ class LibraryObject:
         }
 
     @classmethod
-    def from_file(cls, file, include_paths=None, libraries=None, lib_paths=None, flags=''):
+    def from_file(cls, file, include_paths=None, libraries=None, lib_paths=None, flags='',
+                  features=None, include=None, exclude=None, cached=True):
         """
-        Returns a LibraryObject based on the given filename
+        Returns a LibraryObject based on the given filename. Unless cached is
+        False, the parsed library is kept in the on-disk cache and reused
+        while the file, the arguments and mathbind itself are unchanged.
         """
         path = Path(file).abspath().parent
-        with open(file) as fp:
-            d = json.load(fp)
+        with open(file, 'rb') as fp:
+            content = fp.read()
+        if cached:
+            key = cache.cache_key(content, Path(file).abspath(), include_paths, libraries,
+                                  lib_paths, flags, features, include, exclude,
+                                  cache.package_stamp())
+            lib = cache.load('libraries', key)
+            if lib is not None:
+                return lib
+
+        d = json.loads(content.decode('utf-8'))
         d.setdefault('path', path)
 
         basename = Path(file).basename().replace('.json', '')
@@ -235,32 +1154,246 @@ class LibraryObject:
         d['libraries'] += libraries or []
         d['lib_paths'] += lib_paths or []
         d['include_paths'] += include_paths or []
-        return LibraryObject(d)
+        d['features'] = d.get('features', []) + (features or [])
+        d['include'] = d.get('include', []) + (include or [])
+        d['exclude'] = d.get('exclude', []) + (exclude or [])
+        lib = LibraryObject(d)
+        if cached:
+            cache.store('libraries', key, lib)
+        return lib
 
     def to_cstr(self):
         """
         Returns the complete C code for interfacing with the library.
         """
+        return self.to_cstr_shards(1)[0]
+
+    def _includes_cstr(self):
         code = (
             '#include <stdlib.h>\n'
             '#include <stdio.h>\n'
             '#include "WolframLibrary.h"\n'
-            'DLLEXPORT mint WolframLibrary_getVersion() {return WolframLibraryVersion;}\n'
-            'DLLEXPORT int WolframLibrary_initialize(WolframLibraryData libData) {return 0;}\n'
-            'DLLEXPORT void WolframLibrary_uninitialize(WolframLibraryData libData) {return;}\n'
         )
+        includes = []
         for func in self.functions:
-            code += func.prototype_cstr()
-            code += func.func_str('    ', 'Gen')
+            includes += [inc for inc in func.includes() if inc not in includes]
+        return code + ''.join('#include ' + inc + '\n' for inc in includes)
+
+    @staticmethod
+    def _helpers_cstr(functions):
+        """
+        Returns the C helpers called by the functions, each defined once.
+        """
+        helpers = []
+        for func in functions:
+            helpers += [helper for helper in func.helpers() if helper not in helpers]
+        return ''.join(helpers)
+
+    def _shard_functions(self, count):
+        """
+        Splits the functions in at most count lists of consecutive functions,
+        keeping those using managed objects in the first one, as the tables of
+        the objects are private to its translation unit.
+        """
+        def managed(func):
+            return any(isinstance(t, HandleType) for t in [func.return_type] + list(func.args))
+
+        first = [func for func in self.functions if managed(func)]
+        rest = [func for func in self.functions if not managed(func)]
+        count = max(1, min(count, len(self.functions)))
+        taken = max(0, -(-len(self.functions) // count) - len(first))
+        shards = [first + rest[:taken]]
+        rest = rest[taken:]
+        if rest:
+            per_shard = -(-len(rest) // (count - 1))
+            shards += [rest[i:i + per_shard] for i in range(0, len(rest), per_shard)]
+        return shards
+
+    @staticmethod
+    def _shared_routines(functions, render, prefix):
+        """
+        Groups the functions rendering the same routine once their arguments
+        are normalized, returning a dict mapping the name of each function
+        sharing its routine with another one to the name of the routine, and a
+        dict mapping the names of the routines to their code.
+        Args:
+        - render: function returning the code of the routine of a function
+        given its name, or None if the function can't share one.
+        - prefix (str): prefix of the names of the routines, numbered in order.
+        """
+        groups = {}
+        for func in functions:
+            code = render(func.normalized(), prefix)
+            if code is not None:
+                groups.setdefault(code, []).append(func)
+        names, routines = {}, {}
+        for group in groups.values():
+            if len(group) > 1:
+                name = prefix + str(len(routines))
+                routines[name] = render(group[0], name)
+                names.update((func.func_name, name) for func in group)
+        return names, routines
+
+    def dispatchers(self):
+        """
+        Returns a list of (argument types, return type, functions) with the
+        functions called through each dispatcher, in the order of their ids,
+        empty unless multiplex is set.
+        """
+        if not self.multiplex:
+            return []
+        groups = {}
+        for func in self.functions:
+            if not func.asynchronous:
+                groups.setdefault(func.math_signature(), []).append(func)
+        return [signature + (functions,) for signature, functions in groups.items()]
+
+    def exported_symbols(self):
+        """
+        Returns the names of the C functions exported by the library: the
+        functions run when it's loaded, the wrappers loaded from Mathematica
+        and the dispatchers.
+        """
+        symbols = ['WolframLibrary_getVersion', 'WolframLibrary_initialize',
+                   'WolframLibrary_uninitialize']
+        dispatchers = self.dispatchers()
+        dispatched = {func.func_name for _, _, functions in dispatchers for func in functions}
+        for func in self.functions:
+            if func.func_name not in dispatched:
+                symbols.append('math_' + func.func_name + 'Gen')
+            if func.memoize:
+                symbols.append('math_' + func.func_name + '_memo_statsGen')
+        symbols += ['%s_dispatch%dGen' % (self.name, index) for index in range(len(dispatchers))]
+        return symbols
+
+    def to_version_script(self):
+        """
+        Returns the linker version script keeping the exported symbols of the
+        library global and making all the others local.
+        """
+        return self.VERSION_SCRIPT.render(
+            tab='    ', symbols=''.join('        ' + symbol + ';\n' for symbol in self.exported_symbols()))
 
+    def _dispatchers_cstr(self, tab, suffix):
+        """
+        Returns the C code of the exported dispatchers, calling the wrappers
+        from a table indexed by the id of the function.
+        """
+        code = ''
+        for index, (_, _, functions) in enumerate(self.dispatchers()):
+            # the wrappers may be in other shards
+            code += ''.join(self.DISPATCHER_DECLARATION.render(func_name=func.func_name, suffix=suffix)
+                            for func in functions)
+            code += self.DISPATCHER.render(
+                tab=tab, name=self.name, index=index, suffix=suffix, count=len(functions),
+                entries=''.join(self.DISPATCHER_ENTRY.render(tab=tab, func_name=func.func_name,
+                                                             suffix=suffix)
+                                for func in functions))
         return code
 
+    def to_cstr_shards(self, count):
+        """
+        Returns the C code for interfacing with the library split in at most
+        count translation units, so large libraries can be compiled in
+        parallel. The first one also has the functions run when the library
+        is loaded.
+        """
+        includes = self._includes_cstr()
+        shards = self._shard_functions(count)
+        loading = 'DLLEXPORT mint WolframLibrary_getVersion() {return WolframLibraryVersion;}\n'
+        if self.objects or self.init or self.uninit:
+            loading += self._initialize_cstr('    ')
+        else:
+            loading += (
+                'DLLEXPORT int WolframLibrary_initialize(WolframLibraryData libData) {return 0;}\n'
+                'DLLEXPORT void WolframLibrary_uninitialize(WolframLibraryData libData) {return;}\n'
+            )
+        names, routines = {}, {}
+        if self.share_wrappers:
+            names, routines = self._shared_routines(
+                self.functions, lambda func, name: func.routine_cstr(name, '    ', 'Gen'),
+                'mathbind_wrapper')
+
+        dispatched = {func.func_name for _, _, functions in self.dispatchers() for func in functions}
+        codes = []
+        for i, functions in enumerate(shards):
+            # the routines are static, so each shard has those it calls
+            used = []
+            for func in functions:
+                if func.func_name in names and names[func.func_name] not in used:
+                    used.append(names[func.func_name])
+            wrappers = ''
+            for func in functions:
+                export = func.func_name not in dispatched
+                if func.func_name in names:
+                    wrapper = func.dispatch_cstr(names[func.func_name], '    ', 'Gen', export)
+                else:
+                    wrapper = func.func_str('    ', 'Gen', export)
+                wrappers += func.prototype_cstr() + wrapper
+            codes.append(includes + self._helpers_cstr(functions) + (loading if i == 0 else '') +
+                         ''.join(routines[name] for name in used) + wrappers)
+        if dispatched:
+            codes[0] += '\n' + self._dispatchers_cstr('    ', 'Gen')
+        return codes
+
+    def _initialize_cstr(self, tab):
+        """
+        Returns the C code of the functions run when the library is loaded and
+        unloaded, calling the user hooks and managing the objects.
+        """
+        code = ''
+        if self.init:
+            code += 'int ' + self.init + '(void);\n'
+        if self.uninit:
+            code += 'void ' + self.uninit + '(void);\n'
+        code += ''.join(o.prelude_cstr(tab) for o in self.objects)
+
+        init_body = ''
+        if self.init:
+            init_body += self.INIT_HOOK.render(tab=tab, init=self.init)
+        # a failed registration undoes the ones before it and the init hook
+        undo = self.UNINIT_HOOK.render(tab=tab + tab, uninit=self.uninit) if self.uninit else ''
+        for o in self.objects:
+            init_body += o.register_cstr(tab, undo)
+            undo = o.unregister_cstr(tab + tab, objects=False) + undo
+        uninit_body = ''.join(o.unregister_cstr(tab) for o in self.objects)
+        if self.uninit:
+            uninit_body += self.UNINIT_HOOK.render(tab=tab, uninit=self.uninit)
+
+        return (code + self.INITIALIZE.render(tab=tab, body=init_body) +
+                self.UNINITIALIZE.render(body=uninit_body))
+
+    def to_f90str(self):
+        """
+        Returns the Fortran code exporting the Fortran routines to C, empty
+        unless the language is Fortran.
+        """
+        return '\n'.join(binding.to_f90str('    ') for binding in self.bindings)
+
     def to_mathstr(self, libname):
         """
         Returns the complete Mathematica code for interfacing with the library.
+        The shared definitions and the dispatchers are named after the library,
+        so they don't clash with those of another package.
         """
-        code = 'Needs["Developer`"];\n' + ''.join(
-            func.math_str(libname, '    ', 'Gen') for func in self.functions
+        math_name = self.name.replace('_', '')
+        names, routines = {}, {}
+        if self.share_wrappers:
+            names, routines = self._shared_routines(
+                self.functions, lambda func, name: func.math_routine(name, '    ', 'Gen'),
+                math_name + 'Wrapper')
+        code = 'Needs["Developer`"];\n' + ''.join(routines.values())
+        dispatch = {}
+        for index, (arg_code, ret_code, functions) in enumerate(self.dispatchers()):
+            code += self.MATH_DISPATCHER.render(
+                name=self.name, math_name=math_name, index=index, suffix='Gen', libname=libname,
+                ret_code=ret_code,
+                arg_code=', '.join(['Integer'] + ([arg_code] if arg_code else [])))
+            dispatch.update((func.func_name, ('%sDispatch%dGen' % (math_name, index), i))
+                            for i, func in enumerate(functions))
+        code += ''.join(
+            func.math_str(libname, '    ', 'Gen', names.get(func.func_name), dispatch.get(func.func_name))
+            for func in self.functions
         )
         return code
 
@@ -271,21 +1404,55 @@ class LibraryObject:
         with open(c_output, 'w') as fp:
             fp.write(self.to_cstr())
 
-    def build_c_library(self, form_output, compiler='gcc'):
+    def build_c_library(self, form_output, compiler=None, shards=1, **options):
+        """
+        Generates the bindings and compiles them with the sources of the
+        library.
+        Args:
+        - form_output (str): name of the library, formatted with the name.
+        - compiler (str): name of the compiler, defaults to gfortran for
+        Fortran libraries and to gcc otherwise.
+        - shards (int): number of C files the wrappers are split in.
+        - options: extra arguments of the compiler, as the lto mode of clang.
+        The features of the library are enabled unless given in options.
+        The symbols are hidden unless exported from the wrappers, as with
+        visibility='hidden' (pass visibility=None to keep the default of the
+        compiler). version_script=True links with the script of
+        to_version_script, written to {name}.map, and a str is the path of a
+        script of your own. gc_sections=True drops the unreferenced code.
+        """
         libname = self.path.joinpath(form_output.format(name=self.name))
-        gen_path = str(self.path.joinpath(self.name + 'Gen.c'))
+        if compiler is None:
+            compiler = 'gfortran' if self.language == 'fortran' else 'gcc'
 
-        with open(str(self.path.joinpath(gen_path)), 'w') as fp:
-            fp.write(self.to_cstr())
+        gen_paths = []
+        codes = self.to_cstr_shards(shards)
+        for i, code in enumerate(codes):
+            gen_name = self.name + 'Gen' + (str(i) if len(codes) > 1 else '') + '.c'
+            gen_paths.append(str(self.path.joinpath(gen_name)))
+            with open(gen_paths[-1], 'w') as fp:
+                fp.write(code)
+        if self.bindings:
+            bind_path = str(self.path.joinpath(self.name + 'Bind.f90'))
+            with open(bind_path, 'w') as fp:
+                fp.write(self.to_f90str())
+            gen_paths.append(bind_path)
+
+        if options.get('version_script') is True:
+            options['version_script'] = str(self.path.joinpath(self.name + '.map'))
+            with open(options['version_script'], 'w') as fp:
+                fp.write(self.to_version_script())
 
         compiler_type = Compiler.by_name(compiler)
+        options.setdefault('features', self.features)
+        options.setdefault('visibility', 'hidden')
         comp = compiler_type(flags=self.flags,
                              include_paths=self.include_paths,
                              libs=self.libraries,
-                             lib_paths=self.lib_paths
-                             )
+                             lib_paths=self.lib_paths,
+                             **options)
         files = [str(self.path.joinpath(file)) for file in self.files]
-        comp.compile_shared_library(files + [gen_path], libname)
+        comp.compile_shared_library(files + gen_paths, libname)
 
         with open(str(self.path.joinpath(self.name + '.m')), 'w') as fp:
             fp.write(self.to_mathstr(libname))
\ No newline at end of file
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""
+Module with the glue for the C objects kept alive between calls as Mathematica
+managed library expressions.
+"""
+
+from mathbind.template import Template
+
+
+class ManagedObject:
+    """
+    Represents a C object type whose instances persist across calls. Functions
+    returning 'managed Name' construct it and arguments declared as 'managed Name'
+    receive it. The generated glue keeps the objects in a table indexed by the id
+    of their expressions and calls the destructor when Mathematica frees them.
+    Attributes:
+    - name (str): name of the object, also the C struct name (struct Name).
+    - destructor (str): name of the C function that frees an object, with the
+    prototype void destructor(Name * object).
+    """
+    __slots__ = ('name', 'destructor')
+
+    PRELUDE = Template(
+        'typedef struct {name} {name};\n'
+        'void {destructor}({name} * object);\n'
+        'static {name} ** managed_{name} = NULL;\n'
+        'static mint managed_{name}_size = 0;\n'
+        'static void managed_free_{name}({name} * object) {{\n'
+        '{tab}{destructor}(object);\n'
+        '}}\n'
+        'static {name} * managed_get_{name}(mint id) {{\n'
+        '{tab}return (id >= 0 && id < managed_{name}_size) ? managed_{name}[id] : NULL;\n'
+        '}}\n'
+        'static void manage_{name}(WolframLibraryData libData, mbool mode, mint id) {{\n'
+        '{tab}if(mode == 0 && id >= managed_{name}_size) {{\n'
+        '{tab}{tab}mint size = 2 * managed_{name}_size > id ? 2 * managed_{name}_size : id + 1;\n'
+        '{tab}{tab}{name} ** table = realloc(managed_{name}, sizeof({name} *) * size);\n'
+        '{tab}{tab}if(table == NULL) return;\n'
+        '{tab}{tab}for(mint i = managed_{name}_size; i < size; ++i)\n'
+        '{tab}{tab}{tab}table[i] = NULL;\n'
+        '{tab}{tab}managed_{name} = table;\n'
+        '{tab}{tab}managed_{name}_size = size;\n'
+        '{tab}}}\n'
+        '{tab}else if(mode != 0 && managed_get_{name}(id) != NULL) {{\n'
+        '{tab}{tab}managed_free_{name}(managed_{name}[id]);\n'
+        '{tab}{tab}managed_{name}[id] = NULL;\n'
+        '{tab}}}\n'
+        '}}\n'
+    )
+    REGISTER = Template(
+        '{tab}if(libData->registerLibraryExpressionManager("{name}", manage_{name}))\n'
+        '{tab}{tab}return LIBRARY_FUNCTION_ERROR;\n'
+    )
+    REGISTER_CLEANUP = Template(
+        '{tab}if(libData->registerLibraryExpressionManager("{name}", manage_{name})) {{\n'
+        '{cleanup}'
+        '{tab}{tab}return LIBRARY_FUNCTION_ERROR;\n'
+        '{tab}}}\n'
+    )
+    UNREGISTER_MANAGER = Template('{tab}libData->unregisterLibraryExpressionManager("{name}");\n')
+    UNREGISTER = Template(
+        '{tab}libData->unregisterLibraryExpressionManager("{name}");\n'
+        '{tab}for(mint i = 0; i < managed_{name}_size; ++i)\n'
+        '{tab}{tab}if(managed_{name}[i] != NULL) managed_free_{name}(managed_{name}[i]);\n'
+        '{tab}free(managed_{name});\n'
+        '{tab}managed_{name} = NULL;\n'
+        '{tab}managed_{name}_size = 0;\n'
+    )
+
+    def __init__(self, name, destructor):
+        self.name = name
+        self.destructor = destructor
+
+    def __eq__(self, other):
+        return self.name == other.name and self.destructor == other.destructor
+
+    def __repr__(self):
+        return 'ManagedObject(name=%r, destructor=%r)' % (self.name, self.destructor)
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Returns a new ManagedObject from a dictionary of the form
+        {"name": "Name", "destructor": "name_free"}.
+        """
+        return ManagedObject(d['name'], d['destructor'])
+
+    def prelude_cstr(self, tab='    '):
+        """
+        Returns the C declarations of the object table and of its manager.
+        """
+        return self.PRELUDE.render(name=self.name, destructor=self.destructor, tab=tab)
+
+    def register_cstr(self, tab='    ', cleanup=''):
+        """
+        Returns the C code registering the manager when the library is loaded.
+        Args:
+        - cleanup (str): C code run before returning the error when the
+        registration fails, undoing what was done before.
+        """
+        if cleanup:
+            return self.REGISTER_CLEANUP.render(name=self.name, tab=tab, cleanup=cleanup)
+        return self.REGISTER.render(name=self.name, tab=tab)
+
+    def unregister_cstr(self, tab='    ', objects=True):
+        """
+        Returns the C code unregistering the manager and freeing the objects
+        still alive when the library is unloaded. Without objects, only the
+        manager is unregistered, as when the loading fails before any object
+        is created.
+        """
+        if not objects:
+            return self.UNREGISTER_MANAGER.render(name=self.name, tab=tab)
+        return self.UNREGISTER.render(name=self.name, tab=tab)
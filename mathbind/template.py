@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+"""
+Module with the precompiled code templates used by the emitters.
+"""
+
+from string import Formatter
+
+
+class Template:
+    """
+    A str.format template that is parsed only once.
+
+    Fields that are known in advance (e.g. the C name of a type) can be
+    substituted with bind(), which returns a new template, so rendering only
+    has to fill in the fields that change on each call.
+    Attributes:
+    - form (str): the str.format string for the fields still unbound.
+    """
+    __slots__ = ('_parts', 'form')
+
+    _convert = {'r': repr, 's': str, 'a': ascii}
+
+    def __init__(self, form):
+        self._set_parts(tuple(Formatter().parse(form)))
+
+    def _set_parts(self, parts):
+        self._parts = parts
+        form = ''
+        for literal, field, spec, conversion in parts:
+            form += literal.replace('{', '{{').replace('}', '}}')
+            if field is not None:
+                form += '{' + field
+                if conversion:
+                    form += '!' + conversion
+                if spec:
+                    form += ':' + spec
+                form += '}'
+        self.form = form
+
+    @property
+    def fields(self):
+        """
+        Returns the set of names of the fields still unbound.
+        """
+        return {field for _, field, _, _ in self._parts if field is not None}
+
+    def bind(self, **fields):
+        """
+        Returns a new template with the given fields already substituted.
+        """
+        parts = []
+        pending = ''
+        for literal, field, spec, conversion in self._parts:
+            pending += literal
+            if field is None:
+                continue
+            if field in fields:
+                value = fields[field]
+                if conversion:
+                    value = self._convert[conversion](value)
+                pending += format(value, spec)
+            else:
+                parts.append((pending, field, spec, conversion))
+                pending = ''
+        if pending:
+            parts.append((pending, None, None, None))
+
+        template = Template.__new__(Template)
+        template._set_parts(tuple(parts))
+        return template
+
+    def render(self, **fields):
+        """
+        Returns the template filled with the given fields.
+        """
+        return self.form.format_map(fields)
+
+    def __repr__(self):
+        return 'Template(%r)' % self.form
@@ -8,4 +8,9 @@ from mathbind.types.basictype import BasicType
 from mathbind.types.basicvaluetype import BasicValueType
 from mathbind.types.voidtype import VoidType
 from mathbind.types.pointertype import PointerType
-from mathbind.types.arraytype import ArrayType
\ No newline at end of file
+from mathbind.types.arraytype import ArrayType
+from mathbind.types.numericarraytype import NumericArrayType
+from mathbind.types.sparsearraytype import SparseArrayType
+from mathbind.types.handletype import HandleType
+from mathbind.types.mappedarraytype import MappedArrayType
+from mathbind.types.tensortype import TensorType
@@ -1,6 +1,34 @@
 #!/usr/bin/env python3
 
+import re
 from mathbind.types import BasicType, BasicValueType
+from mathbind.template import Template
+
+
+# mcomplex is a struct, so complex elements are converted part by part
+# instead of assigned
+COMPLEX_COPIES = (
+    ('array[i] = data[i];',
+     'array[i] = ({c_name}) (mcreal(data[i]) + I * mcimag(data[i]));'),
+    ('data[i] = array[i];',
+     '{{ mcreal(data[i]) = creal(array[i]); mcimag(data[i]) = cimag(array[i]); }}'),
+)
+
+
+# malloc of size elements, NULL if the byte count doesn't fit in a size_t
+CHECKED_MALLOC = ('((size_t) {size} <= (size_t) -1 / sizeof({c_name}) ? '
+                  'malloc(sizeof({c_name}) * (size_t) {size}) : NULL)')
+
+
+def _complex_template(template):
+    """
+    Returns a copy of the template with the element copies converted between
+    mcomplex and the C complex types.
+    """
+    form = template.form
+    for plain, converted in COMPLEX_COPIES:
+        form = form.replace(plain, converted)
+    return Template(form)
 
 
 class ArrayType(BasicType):
@@ -11,23 +39,215 @@ class ArrayType(BasicType):
     - policy (str): size policy of the array. Can be 'fixed', 'infinite', 'variable' (tied to another variable).
     - size (str or int):
     - const (bool): can the parameter be changed?
+    - out (bool): is it an output-only array, allocated in the wrapper and
+    returned to Mathematica without being passed in?
+    - ownership (str): when returned by a function, who owns the returned
+    buffer. 'copy' leaves it to the function, 'adopt' makes the wrapper free it
+    after copying it into the result tensor.
     """
 
-    def __init__(self, basetype, policy, size=None, const=False):
-        self.basetype = basetype
-        self.typename = basetype.typename + ' [{}]'.format('' if size is None else size)
-        self.policy = policy
-        self.size = size
-        self.const = const
+    __slots__ = ('basetype', 'policy', 'size', 'const', 'out', 'ownership', 'helpers', 'return_helpers',
+                 '_before', '_before_math', '_chunk_math', '_after', '_retrieve', '_return')
+
+    qualifiers = ('const', 'out')
+
+    # the conversions shared by all the arrays of the same element type: the
+    # tensor data is used in place when the types have the same size, and
+    # copied to (get) and back from (release) a new buffer otherwise
+    HELPER_GET = Template(
+        'static int mathbind_get_{tag}({c_math_name} * data, mint size, int copy, {c_name} ** result) {{\n'
+        '{tab}if(sizeof({c_math_name}) == sizeof({c_name})) {{\n'
+        '{tab}{tab}*result = ({c_name} *) data;\n'
+        '{tab}{tab}return 0;\n'
+        '{tab}}}\n'
+        '{tab}{c_name} * array = ' + CHECKED_MALLOC.format(size='size', c_name='{c_name}') + ';\n'
+        '{tab}if(array == NULL && size > 0)\n'
+        '{tab}{tab}return LIBRARY_MEMORY_ERROR;\n'
+        '{tab}if(copy)\n'
+        '{tab}{tab}for(mint i = 0; i < size; ++i)\n'
+        '{tab}{tab}{tab}array[i] = data[i];\n'
+        '{tab}*result = array;\n'
+        '{tab}return 0;\n'
+        '}}\n'
+    )
+    HELPER_PUT = Template(
+        'static void mathbind_put_{tag}({c_math_name} * data, const {c_name} * array, mint size) {{\n'
+        '{tab}for(mint i = 0; i < size; ++i)\n'
+        '{tab}{tab}data[i] = array[i];\n'
+        '}}\n'
+    )
+    HELPER_RELEASE = Template(
+        'static void mathbind_release_{tag}({c_math_name} * data, {c_name} * array, mint size) {{\n'
+        '{tab}if(sizeof({c_math_name}) != sizeof({c_name}) && array != NULL) {{\n'
+        '{tab}{tab}mathbind_put_{tag}(data, array, size);\n'
+        '{tab}{tab}free(array);\n'
+        '{tab}}}\n'
+        '}}\n'
+    )
+    COMPLEX_HELPER_GET = _complex_template(HELPER_GET)
+    COMPLEX_HELPER_PUT = _complex_template(HELPER_PUT)
+
+    # the buffers start as NULL, so the cleanup only releases those converted
+    BEFORE = Template(
+        '{tab}/* Converting {argname} */\n'
+        '{tab}{c_name} * {argname} = NULL;\n'
+        '{tab}if(mathbind_get_{tag}(data_{argname}{suffix}, {size}, 1, &{argname})) {{\n'
+        '{tab}    error{suffix} = LIBRARY_MEMORY_ERROR;\n'
+        '{tab}    goto {own};\n'
+        '{tab}}}\n'
+    )
+    BEFORE_MATH_CONST = Template(
+        '{tab}{argname}{suffix} = If[Length[{argname}] == 0, ConstantArray[0, {size}], {argname}];\n'
+        '{tab}{argname}{suffix} = Developer`ToPackedArray[Map[{convert_f}, {argname}{suffix}]];\n'
+    )
+    BEFORE_MATH = Template(
+        '{tab}{argname}{suffix} = {argname};\n'
+        '{tab}{argname}{suffix} = Developer`ToPackedArray[Map[{convert_f}, {argname}{suffix}]];\n'
+    )
+    CHUNK_MATH = Template(
+        '{tab}{argname}{suffix} = Developer`ToPackedArray[Map[{convert_f}, {argname}[[{start} ;; {end}]]]];\n'
+    )
+    AFTER = Template(
+        '{tab}/* Copying and releasing {argname} */\n'
+        '{tab}mathbind_release_{tag}(data_{argname}{suffix}, {argname}, {size});\n'
+        '{tab}libData{suffix}->MTensor_disownAll(mtensor_{argname}{suffix});\n'
+    )
+    RETRIEVE = Template(
+        '{tab}MTensor mtensor_{argname}{suffix} = MArgument_getMTensor(Args{suffix}[{index}]);\n'
+        '{tab}{c_math_name} * data_{argname}{suffix} = libData{suffix}->MTensor_get{math_name}Data(mtensor_{argname}{suffix});\n'
+    )
+    RETRIEVE_LENGTH = Template(
+        '{tab}MTensor mtensor_{argname}{suffix} = MArgument_getMTensor(Args{suffix}[{index}]);\n'
+        '{tab}{c_math_name} * data_{argname}{suffix} = libData{suffix}->MTensor_get{math_name}Data(mtensor_{argname}{suffix});\n'
+        '{tab}mint length_{argname}{suffix} = libData{suffix}->MTensor_getFlattenedLength(mtensor_{argname}{suffix});\n'
+    )
+    OUT_BEFORE = Template(
+        '{tab}{c_name} * {argname} = NULL;\n'
+        '{tab}if(mathbind_get_{tag}(data_{argname}{suffix}, {size}, 0, &{argname})) {{\n'
+        '{tab}    error{suffix} = LIBRARY_MEMORY_ERROR;\n'
+        '{tab}    goto {own};\n'
+        '{tab}}}\n'
+    )
+    OUT_AFTER = Template(
+        '{tab}/* Copying and returning {argname} */\n'
+        '{tab}mathbind_release_{tag}(data_{argname}{suffix}, {argname}, {size});\n'
+        '{tab}if(error{suffix} == LIBRARY_NO_ERROR)\n'
+        '{tab}    MArgument_setMTensor(Res{suffix}, mtensor_{argname}{suffix});\n'
+        '{tab}else\n'
+        '{tab}    libData{suffix}->MTensor_free(mtensor_{argname}{suffix});\n'
+    )
+    OUT_RETRIEVE = Template(
+        '{tab}/* Allocating {argname} */\n'
+        '{tab}MTensor mtensor_{argname}{suffix};\n'
+        '{tab}mint dims_{argname}{suffix}[1] = {{{size}}};\n'
+        '{tab}int error_{argname}{suffix} = libData{suffix}->MTensor_new(MType_{math_name}, 1, dims_{argname}{suffix}, &mtensor_{argname}{suffix});\n'
+        '{tab}if(error_{argname}{suffix}) {{\n'
+        '{tab}    error{suffix} = error_{argname}{suffix};\n'
+        '{tab}    goto {cleanup};\n'
+        '{tab}}}\n'
+        '{tab}{c_math_name} * data_{argname}{suffix} = libData{suffix}->MTensor_get{math_name}Data(mtensor_{argname}{suffix});\n'
+    )
+
+    RETURN_FORM = (
+        '{tab}{c_name} * return_value{suffix} = {func_call};\n'
+        '{tab}if(return_value{suffix} == NULL && {size} > 0) {{\n'
+        '{tab}    error{suffix} = LIBRARY_FUNCTION_ERROR;\n'
+        '{tab}    goto {cleanup};\n'
+        '{tab}}}\n'
+        '{tab}MTensor return_mtensor{suffix};\n'
+        '{tab}mint return_dims{suffix}[1] = {{{size}}};\n'
+        '{tab}error{suffix} = libData{suffix}->MTensor_new(MType_{math_name}, 1, return_dims{suffix}, &return_mtensor{suffix});\n'
+        '{tab}if(error{suffix}) {{\n'
+        '<release>    '
+        '{tab}    goto {cleanup};\n'
+        '{tab}}}\n'
+        '{tab}{c_math_name} * return_data{suffix} = libData{suffix}->MTensor_get{math_name}Data(return_mtensor{suffix});\n'
+        '{tab}mathbind_put_{tag}(return_data{suffix}, return_value{suffix}, {size});\n'
+        '<release>'
+        '{tab}MArgument_setMTensor(Res{suffix}, return_mtensor{suffix});\n'
+    )
+    RETURNS = {
+        'copy': Template(RETURN_FORM.replace('<release>    ', '').replace('<release>', '')),
+        'adopt': Template(RETURN_FORM.replace('<release>    ', '{tab}    free(return_value{suffix});\n')
+                                     .replace('<release>', '{tab}free(return_value{suffix});\n')),
+    }
+
+
+    def __init__(self, basetype, policy, size=None, const=False, out=False, ownership='copy'):
+        if ownership not in self.RETURNS:
+            raise ValueError('Unknown ownership %r' % ownership)
+        if out and const:
+            raise ValueError('An output array can not be constant')
+        if out and policy == 'infinite':
+            raise ValueError('An output array must have a bound size')
+
+        typename = basetype.typename + ' [{}]'.format('' if size is None else size)
+        if out:
+            typename = 'out ' + typename
+        if const:
+            typename = 'const ' + typename
+        self._set(typename=typename, basetype=basetype, policy=policy,
+                  size=size, const=const, out=out, ownership=ownership)
+
+        fields = dict(c_name=basetype.c_name, c_math_name=basetype.c_math_name,
+                      math_name=basetype.math_name, convert_f=self._math_convert_f(),
+                      tag=re.sub(r'\W+', '_', basetype.c_name))
+        if basetype.math_name == 'Complex':
+            get, put = self.COMPLEX_HELPER_GET, self.COMPLEX_HELPER_PUT
+        else:
+            get, put = self.HELPER_GET, self.HELPER_PUT
+        get, put, release = (helper.render(tab='    ', **fields)
+                             for helper in (get, put, self.HELPER_RELEASE))
+        self._set(helpers=(get, put, release), return_helpers=(put,))
+        if out or policy == 'fixed':
+            # otherwise the length is only known from the tensor
+            fields['size'] = size
+        if out:
+            self._set(_before=self.OUT_BEFORE.bind(**fields),
+                      _before_math=Template(''),
+                      _after=self.OUT_AFTER.bind(**fields),
+                      _retrieve=self.OUT_RETRIEVE.bind(**fields))
+        else:
+            before_math = self.BEFORE_MATH_CONST if const and policy == 'fixed' else self.BEFORE_MATH
+            retrieve = self.RETRIEVE if policy == 'fixed' else self.RETRIEVE_LENGTH
+            self._set(_before=self.BEFORE.bind(**fields),
+                      _before_math=before_math.bind(**fields),
+                      _after=self.AFTER.bind(**fields),
+                      _retrieve=retrieve.bind(**fields))
+        self._set(_chunk_math=self.CHUNK_MATH.bind(convert_f=fields['convert_f']),
+                  _return=self.RETURNS[ownership].bind(**dict(fields, size=size)))
+
+    def _args(self):
+        return (self.basetype, self.policy, self.size, self.const, self.out,
+                self.ownership)
+
+    def with_ownership(self, ownership):
+        """
+        Returns the same array type with the given ownership.
+        """
+        return ArrayType(self.basetype, self.policy, self.size, self.const,
+                         self.out, ownership)
 
     @property
     def should_return(self):
-        return not self.const
+        return not self.const and not self.out
+
+    @property
+    def is_input(self):
+        return not self.out
+
+    @property
+    def includes(self):
+        return self.basetype.includes
 
     @property
     def math_name(self):
         return '{{{self.basetype.math_name}, 1, "Shared"}}'.format(self=self)
 
+    @property
+    def math_return_name(self):
+        return '{{{self.basetype.math_name}, 1}}'.format(self=self)
+
     @classmethod
     def from_str(cls, s):
         """
@@ -53,12 +273,14 @@ class ArrayType(BasicType):
                 policy = 'variable'
                 size = length_spec
 
-        const = False
-        if 'const' in type_spec.split():
-            type_spec = ' '.join(type_spec.split()[1:])
-            const = True
+        words = type_spec.split()
+        qualifiers = set()
+        while words and words[0] in cls.qualifiers:
+            qualifiers.add(words.pop(0))
+        type_spec = ' '.join(words)
 
-        return ArrayType(BasicValueType.from_str(type_spec), policy, size, const)
+        return ArrayType(BasicValueType.from_str(type_spec), policy, size,
+                         'const' in qualifiers, 'out' in qualifiers)
 
     @classmethod
     def from_prototype_cstr(cls, s):
@@ -74,56 +296,55 @@ class ArrayType(BasicType):
             raise ValueError('Misplaced brackets')
 
         *words, argname = s[: bra1].split()
-        return ArrayType.from_str(' '.join(words) + '[' + s[bra1 + 1:bra2] + ']'), argname
-
-    def __eq__(self, other):
-        return (self.basetype == other.basetype and self.policy == other.policy
-                and self.size == other.size and self.const == other.const)
+        return ArrayType.from_str(' '.join(words) + s[bra1:]), argname
 
     def __repr__(self):
-        return ('ArrayType(basetype=%r, policy=%r, size=%r, const=%r)'
-                % (self.basetype, self.policy, self.size, self.const))
+        return ('ArrayType(basetype=%r, policy=%r, size=%r, const=%r, out=%r, ownership=%r)'
+                % (self.basetype, self.policy, self.size, self.const, self.out,
+                   self.ownership))
 
-    def before_cstr(self, argname, tab='', suffix=None):
+    def length_cstr(self, argname, suffix=None):
         """
-        Returns a C string with the instructions to convert the argname from the
-        Mathematica required format.
+        Returns a C expression with the number of elements of the array. Unless
+        the size is fixed, input arrays take it from the tensor itself.
         """
         if suffix is None:
             suffix = self.default_suffix
-        convert = (
-            '{tab}/* Converting {argname} */\n'
-            '{tab}{self.basetype.c_name} * {argname} = ({self.basetype.c_name} *) data_{argname}{suffix};\n'
-            '{tab}if(sizeof({self.basetype.c_math_name}) != sizeof({self.basetype.c_name})) {{\n'
-            '{tab}    {argname} = malloc(sizeof({self.basetype.c_name}) * {self.size});\n'
-            '{tab}    for(int i{suffix} = 0; i{suffix} < {self.size}; ++i{suffix})\n'
-            '{tab}        {argname}[i{suffix}] = data_{argname}Gen[i{suffix}];\n'
-            '{tab}}}\n'
-        )
-        return convert.format(argname=argname, self=self, tab=tab, suffix=suffix)
+        if self.out or self.policy == 'fixed':
+            return str(self.size)
+        return 'length_' + argname + suffix
 
-    def before_mathstr(self, argname, tab='', suffix=None):
+    def before_cstr(self, argname, tab='', suffix=None):
+        """
+        Returns a C string with the instructions to convert the argname from the
+        Mathematica required format. On errors, it jumps to the cleanup of the
+        argument itself.
+        """
         if suffix is None:
             suffix = self.default_suffix
+        return self._before.render(argname=argname, tab=tab, suffix=suffix,
+                                   size=self.length_cstr(argname, suffix),
+                                   own=self.cleanup_label(argname, suffix))
 
+    def _math_convert_f(self):
         if 'float' in self.typename or 'double' in self.typename:
-            convert_f = 'N'
+            return 'N'
         else:
-            convert_f = 'IntegerPart'
+            return 'IntegerPart'
 
-        if self.const:
-            form = (
-                '{tab}{argname}{suffix} = If[Length[{argname}] == 0, ConstantArray[0, {self.size}], {argname}];\n'
-                '{tab}{argname}{suffix} = Developer`ToPackedArray[Map[{convert_f}, {argname}{suffix}]];\n'
-            )
-        else:
-            form = (
-                '{tab}{argname}{suffix} = {argname};\n'
-                '{tab}{argname}{suffix} = Developer`ToPackedArray[Map[{convert_f}, {argname}{suffix}]];\n'
-            )
+    def before_mathstr(self, argname, tab='', suffix=None):
+        if suffix is None:
+            suffix = self.default_suffix
+        return self._before_math.render(argname=argname, tab=tab, suffix=suffix)
 
-        return form.format(argname=argname, tab=tab,
-                           suffix=suffix, self=self, convert_f=convert_f)
+    def chunk_mathstr(self, argname, start, end, tab='', suffix=None):
+        """
+        Returns a Mathematica string converting only the elements from start to
+        end (both included) of the array, for the functions called in chunks.
+        """
+        if suffix is None:
+            suffix = self.default_suffix
+        return self._chunk_math.render(argname=argname, start=start, end=end, tab=tab, suffix=suffix)
 
     def after_cstr(self, argname, tab='', suffix=None):
         """
@@ -132,18 +353,10 @@ class ArrayType(BasicType):
         """
         if suffix is None:
             suffix = self.default_suffix
-        convert = (
-            '{tab}/* Copying and releasing {argname} */\n'
-            '{tab}if(sizeof({self.basetype.c_math_name}) != sizeof({self.basetype.c_name})) {{\n'
-            '{tab}    for(int i{suffix} = 0; i{suffix} < {self.size}; ++i{suffix})\n'
-            '{tab}        data_{argname}Gen[i{suffix}] = {argname}[i{suffix}];\n'
-            '{tab}    free({argname});\n'
-            '{tab}}}\n'
-            '{tab}libData{suffix}->MTensor_disownAll(mtensor_{argname}{suffix});\n'
-        )
-        return convert.format(argname=argname, self=self, tab=tab, suffix=suffix)
-
-    def retrieve_cstr(self, argname, index, tab='', suffix=None):
+        return self._after.render(argname=argname, tab=tab, suffix=suffix,
+                                  size=self.length_cstr(argname, suffix))
+
+    def retrieve_cstr(self, argname, index, tab='', suffix=None, cleanup=None):
         """
         Returns a C string to retrieve the argument from Mathematica.
         Args:
@@ -151,19 +364,38 @@ class ArrayType(BasicType):
         - index (int): index of the position in the argument list (starts from 0)
         - tab (str): string to add at the beginning of each line.
         - suffix: suffix to add after the variable
+        - cleanup (str): label releasing the arguments retrieved before, jumped
+        to when an output array can't be allocated.
         """
         if suffix is None:
             suffix = self.default_suffix
+        if cleanup is None:
+            cleanup = self.cleanup_label(suffix=suffix)
         before = self.before_cstr(argname, tab, suffix)
-
-        form = (
-            '{tab}MTensor mtensor_{argname}{suffix} = MArgument_getMTensor(Args{suffix}[{index}]);\n'
-            '{tab}{self.basetype.c_math_name} * data_{argname}{suffix} = libData{suffix}->MTensor_get{self.basetype.math_name}Data(mtensor_{argname}{suffix});\n')
-
-        return form.format(argname=argname, self=self, tab=tab, index=index, suffix=suffix) + before
+        return (self._retrieve.render(argname=argname, tab=tab, index=index, suffix=suffix,
+                                      cleanup=cleanup) + before)
 
     def prototype_cstr(self, argname):
         """
         Returns a C string representing the declaration in a prototype argument.
         """
-        return self.basetype.c_name + ' * ' + argname
\ No newline at end of file
+        return self.basetype.c_name + ' * ' + argname
+
+    def return_cstr(self, func_call, tab='', suffix=None, cleanup=None):
+        """
+        Returns a C string that calls the function and copies the returned
+        buffer into a new tensor sent back to Mathematica.
+        """
+        if suffix is None:
+            suffix = self.default_suffix
+        if cleanup is None:
+            cleanup = self.cleanup_label(suffix=suffix)
+        if self.policy == 'infinite':
+            raise ValueError('A returned array must have a bound size')
+        return self._return.render(func_call=func_call, tab=tab, suffix=suffix, cleanup=cleanup)
+
+    def prototype_return_cstr(self):
+        """
+        Returns a C string representing the declaration in a prototype return.
+        """
+        return ('const ' if self.const else '') + self.basetype.c_name + ' *'
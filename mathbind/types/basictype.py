@@ -1,21 +1,98 @@
 #!/usr/bin/env python3
 
 from mathbind.generic import iterate_subtypes
+from mathbind.template import Template
 
 
-class BasicType:
+class InternedType(type):
     """
-    Represents the interface to a basic generic type.
+    Metaclass that shares a single instance between all the calls with the
+    same constructor arguments, so equal types are built only once.
+    """
+
+    def __init__(cls, name, bases, namespace):
+        super().__init__(name, bases, namespace)
+        cls._instances = {}
+
+    def __call__(cls, *args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        try:
+            return cls._instances[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable arguments can't be interned
+            return super().__call__(*args, **kwargs)
+
+        instance = super().__call__(*args, **kwargs)
+        # calls with default or keyword arguments share the same instance
+        instance = cls._instances.setdefault((None, instance._args()), instance)
+        cls._instances[key] = instance
+        return instance
+
+
+class BasicType(metaclass=InternedType):
+    """
+    Represents the interface to a basic generic type. Instances are interned
+    and immutable, so they can be shared and used as dictionary keys.
 
     Class properties:
     - default_suffix (str): string to add to each generated identifier, used
     to avoid clashes.
     - default_value  (str): default value of the type, defaults to '0'
+    - includes (tuple): headers the generated C code needs for this type, as
+    written after #include (e.g. '<stdint.h>')
+    - arg_count (int): number of LibraryLink arguments taken by a value of this
+    type, defaults to 1
+    - helpers (tuple): C definitions the generated code for an argument of
+    this type calls, emitted once for the whole library
+    - return_helpers (tuple): C definitions the generated code for a return
+    value of this type calls
     Instance properties
     - typename (str): real typename, as declared
     """
+    __slots__ = ('typename',)
+
     default_suffix = 'Gen'
     default_value = '0'
+    includes = ()
+    helpers = ()
+    return_helpers = ()
+    arg_count = 1
+
+    BEFORE_MATH = Template('{tab}{argname}{suffix} = {argname};\n')
+
+    def _set(self, **attrs):
+        """
+        Sets the instance attributes, only meant to be called while building
+        the object.
+        """
+        for name, value in attrs.items():
+            object.__setattr__(self, name, value)
+
+    def _args(self):
+        """
+        Returns the tuple of arguments that rebuilds this type when passed to
+        the constructor.
+        """
+        raise NotImplementedError
+
+    def __setattr__(self, name, value):
+        raise AttributeError('%s objects are immutable' % type(self).__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError('%s objects are immutable' % type(self).__name__)
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return self._args() == other._args()
+
+    def __hash__(self):
+        return hash((type(self), self._args()))
+
+    def __reduce__(self):
+        return (type(self), self._args())
 
     @property
     def should_return(self):
@@ -24,6 +101,21 @@ class BasicType:
         """
         return False
 
+    @property
+    def is_input(self):
+        """
+        True if the value is passed from Mathematica to the function.
+        """
+        return True
+
+    @property
+    def math_return_name(self):
+        """
+        Mathematica type specification when the value is the result of the
+        library function, defaults to the argument specification.
+        """
+        return self.math_name
+
     @classmethod
     def from_str(cls, s):
         """
@@ -60,6 +152,15 @@ class BasicType:
         """
         return argname
 
+    def call_mathstr(self, argname, suffix=None):
+        """
+        Returns a Mathematica string that represents how to pass the converted
+        variable to the library function, defaults to the variable itself.
+        """
+        if suffix is None:
+            suffix = self.default_suffix
+        return argname + suffix
+
     def before_cstr(self, argname, tab='', suffix=None):
         """
         Returns a C string with the instructions to convert the argname from the
@@ -81,9 +182,7 @@ class BasicType:
         - tab (str): string to add at the beginning of each line.
         - suffix (str): suffix to add after the variable, defaults to None
         '''
-        return '{tab}{argname}{suffix} = {argname};\n'.format(
-            tab=tab, argname=argname, suffix=suffix
-        )
+        return self.BEFORE_MATH.render(tab=tab, argname=argname, suffix=suffix)
 
     def after_cstr(self, argname, tab='', suffix=None):
         """
@@ -95,20 +194,33 @@ class BasicType:
         """
         return ""
 
-    def retrieve_cstr(self, argname, index, tab='', suffix=None):
+    @staticmethod
+    def cleanup_label(argname=None, suffix=None):
+        """
+        Returns the label of the wrapper cleanup releasing the argument and
+        those retrieved before it, or the one returning the error when no
+        argname is given.
+        """
+        if suffix is None:
+            suffix = BasicType.default_suffix
+        return 'cleanup' + ('_' + argname if argname else '') + suffix
+
+    def retrieve_cstr(self, argname, index, tab='', suffix=None, cleanup=None):
         """
         Returns a C string to retrieve the argument from the Mathematica call
-        scheme.
+        scheme. On errors, it sets error{suffix} and jumps to the cleanup.
 
         Args:
         - argname (str): name of the argument to retrieve
         - index (int): index of the position in the argument list (starts from 0) 
         - tab (str): string to add at the beginning of each line.
         - suffix: suffix to add after the variable
+        - cleanup (str): label releasing the arguments retrieved before,
+        defaults to cleanup_label().
         """
         raise NotImplemented
 
-    def return_cstr(self, func_call, tab='', suffix=None):
+    def return_cstr(self, func_call, tab='', suffix=None, cleanup=None):
         """
         Returns a C string with the code to call the function, retrieve the
         return value and send it to Mathematica.
@@ -117,6 +229,8 @@ class BasicType:
         - func_call (str): string to effectively call the function.
         - tab (str): string to add at the beginning of each line.
         - suffix: suffix to add after the variable
+        - cleanup (str): label releasing the arguments on errors, as for
+        retrieve_cstr.
         """
         raise NotImplemented
 
@@ -1,40 +1,76 @@
 #!/usr/bin/env python3
 
 from mathbind.types import BasicType
+from mathbind.template import Template
 
 
 class BasicValueType(BasicType):
     """
     Represents a basic pure type that can be passed by value, thus excluding arrays and pointers.
     Attributes:
-    - typename (str): basic C typename (int, long long, unsigned, bool, etc)
+    - typename (str): basic C typename (int, long long, unsigned, bool, double complex, etc)
     - c_math_name (str): corresponding Mathematica C type
-    - math_name (str): corresponding Mathematica type (Integer, Real)
+    - math_name (str): corresponding Mathematica type (Integer, Real, Complex)
     - c_name (str): corresponding C type (int, long long, float).
     """
 
-    def __init__(self, typename):
-
-        self.typename = typename
+    __slots__ = ('c_name', 'c_math_name', 'math_name', '_retrieve', '_return')
+
+    # the qualifiers choosing the other types, so that 'numeric float' or
+    # 'sparse double' are never taken as plain values
+    reserved = ('out', 'numeric', 'sparse', 'mapped', 'managed')
+
+    RETRIEVE = Template('{tab}{c_name} {argname} = MArgument_get{math_name}(Args{suffix}[{index}]);\n')
+    RETURN = Template(
+        '{tab}{c_name} return_value{suffix} = {func_call};\n'
+        '{tab}MArgument_set{math_name}(Res{suffix}, return_value{suffix});\n'
+    )
+    COMPLEX_RETRIEVE = Template(
+        '{tab}mcomplex math_{argname}{suffix} = MArgument_getComplex(Args{suffix}[{index}]);\n'
+        '{tab}{c_name} {argname} = ({c_name}) (mcreal(math_{argname}{suffix}) + I * mcimag(math_{argname}{suffix}));\n'
+    )
+    COMPLEX_RETURN = Template(
+        '{tab}{c_name} return_value{suffix} = {func_call};\n'
+        '{tab}mcomplex return_math{suffix};\n'
+        '{tab}mcreal(return_math{suffix}) = creal(return_value{suffix});\n'
+        '{tab}mcimag(return_math{suffix}) = cimag(return_value{suffix});\n'
+        '{tab}MArgument_setComplex(Res{suffix}, return_math{suffix});\n'
+    )
 
+    def __init__(self, typename):
         type_parts = set(typename.split())
-        self.c_name = typename
+        c_name = typename
 
         if not type_parts:
             raise ValueError
+        elif {'complex', '_Complex'} & type_parts and {'float', 'double'} & type_parts:
+            c_math_name = 'mcomplex'
+            math_name = 'Complex'
         elif {'float', 'double'} & type_parts:
-            self.c_math_name = 'mreal'
-            self.math_name = 'Real'
+            c_math_name = 'mreal'
+            math_name = 'Real'
         elif 'bool' in type_parts:
-            self.c_name = 'int'
-            self.c_math_name = 'mbool'
-            self.math_name = 'Boolean'
+            c_name = 'int'
+            c_math_name = 'mbool'
+            math_name = 'Boolean'
         elif not type_parts - {'signed', 'unsigned', 'char', 'int', 'short', 'long'}:
-            self.c_math_name = 'mint'
-            self.math_name = 'Integer'
+            c_math_name = 'mint'
+            math_name = 'Integer'
         else:
             raise ValueError('Unrecognized C type')
 
+        self._set(typename=typename, c_name=c_name,
+                  c_math_name=c_math_name, math_name=math_name)
+        if math_name == 'Complex':
+            retrieve, return_ = self.COMPLEX_RETRIEVE, self.COMPLEX_RETURN
+        else:
+            retrieve, return_ = self.RETRIEVE, self.RETURN
+        self._set(_retrieve=retrieve.bind(c_name=c_name, math_name=math_name),
+                  _return=return_.bind(c_name=c_name, math_name=math_name))
+
+    def _args(self):
+        return (self.typename,)
+
     @classmethod
     def from_str(cls, s):
         """
@@ -43,6 +79,8 @@ class BasicValueType(BasicType):
         """
         if '*' in s or '[' in s or ']' in s:
             raise ValueError('Not a valid basic C type')
+        if set(s.split()) & set(cls.reserved):
+            raise ValueError('Qualified as another type')
 
         while '  ' in s:
             s = s.replace('  ', ' ')
@@ -64,26 +102,22 @@ class BasicValueType(BasicType):
         *words, argname = s.split()
         return BasicValueType.from_str(' '.join(words)), argname.strip()
 
+    @property
+    def includes(self):
+        return ('<complex.h>',) if self.math_name == 'Complex' else ()
+
     def __repr__(self):
         return 'BasicValueType(typename=%r)' % self.typename
 
-    def __eq__(self, other):
-        return self.typename == other.typename
-
-    def retrieve_cstr(self, argname, index, tab='', suffix=None):
+    def retrieve_cstr(self, argname, index, tab='', suffix=None, cleanup=None):
         if suffix is None:
             suffix = self.default_suffix
-        form = '{tab}{self.c_name} {argname} = MArgument_get{self.math_name}(Args{suffix}[{index}]);\n'
-        return form.format(argname=argname, self=self, tab=tab, index=index, suffix=suffix)
+        return self._retrieve.render(argname=argname, tab=tab, index=index, suffix=suffix)
 
-    def return_cstr(self, func_call, tab='', suffix=None):
+    def return_cstr(self, func_call, tab='', suffix=None, cleanup=None):
         if suffix is None:
             suffix = self.default_suffix
-        form = (
-            '{tab}{self.c_name} return_value{suffix} = {func_call};\n'
-            '{tab}MArgument_set{self.math_name}(Res{suffix}, return_value{suffix});\n'
-        )
-        return form.format(func_call=func_call, tab=tab, self=self, suffix=suffix)
+        return self._return.render(func_call=func_call, tab=tab, suffix=suffix)
 
     def prototype_cstr(self, argname):
         return self.c_name + ' ' + argname
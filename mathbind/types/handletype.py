@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+from mathbind.types import BasicType
+from mathbind.template import Template
+
+
+class HandleType(BasicType):
+    """
+    Represents a handle to a C object kept alive between calls as a Mathematica
+    managed library expression. Declared as 'managed Plan', it's passed to C as a
+    'Plan *' looked up by the id of the expression. A function returning it is a
+    constructor: the wrapper creates the expression and stores the returned
+    pointer under its id, until Mathematica frees the expression.
+    Attributes:
+    - name (str): name of the managed object, also the C struct name.
+    """
+
+    __slots__ = ('name', '_retrieve', '_before_math', '_return')
+
+    RETRIEVE = Template(
+        '{tab}{name} * {argname} = managed_get_{name}(MArgument_getInteger(Args{suffix}[{index}]));\n'
+        '{tab}if({argname} == NULL) {{\n'
+        '{tab}    error{suffix} = LIBRARY_FUNCTION_ERROR;\n'
+        '{tab}    goto {cleanup};\n'
+        '{tab}}}\n'
+    )
+    BEFORE_MATH = Template('{tab}{argname}{suffix} = ManagedLibraryExpressionID[{argname}, "{name}"];\n')
+    RETURN = Template(
+        '{tab}mint return_id{suffix} = MArgument_getInteger(Args{suffix}[Argc{suffix} - 1]);\n'
+        '{tab}if(return_id{suffix} < 0 || return_id{suffix} >= managed_{name}_size) {{\n'
+        '{tab}    error{suffix} = LIBRARY_FUNCTION_ERROR;\n'
+        '{tab}    goto {cleanup};\n'
+        '{tab}}}\n'
+        '{tab}if(managed_{name}[return_id{suffix}] != NULL) managed_free_{name}(managed_{name}[return_id{suffix}]);\n'
+        '{tab}managed_{name}[return_id{suffix}] = {func_call};\n'
+        '{tab}if(managed_{name}[return_id{suffix}] == NULL) {{\n'
+        '{tab}    error{suffix} = LIBRARY_FUNCTION_ERROR;\n'
+        '{tab}    goto {cleanup};\n'
+        '{tab}}}\n'
+    )
+
+    def __init__(self, name):
+        if not name.replace('_', '').isalnum():
+            raise ValueError('Invalid managed object name %r' % name)
+
+        self._set(typename='managed ' + name, name=name)
+        self._set(_retrieve=self.RETRIEVE.bind(name=name),
+                  _before_math=self.BEFORE_MATH.bind(name=name),
+                  _return=self.RETURN.bind(name=name))
+
+    def _args(self):
+        return (self.name,)
+
+    @property
+    def math_name(self):
+        return 'Integer'
+
+    @property
+    def math_return_name(self):
+        return '"Void"'
+
+    @classmethod
+    def from_str(cls, s):
+        """
+        Tries to build a new HandleType from the string specification, failing
+        unless it has the form 'managed Name'.
+        """
+        words = s.split()
+        if len(words) != 2 or words[0] != 'managed':
+            raise ValueError('Not a managed object type')
+        return HandleType(words[1])
+
+    @classmethod
+    def from_prototype_cstr(cls, s):
+        """
+        Tries to extract (type, argname) from the string.
+        """
+        *words, argname = s.split()
+        return HandleType.from_str(' '.join(words)), argname
+
+    def __repr__(self):
+        return 'HandleType(name=%r)' % self.name
+
+    def before_mathstr(self, argname, tab='', suffix=None):
+        if suffix is None:
+            suffix = self.default_suffix
+        return self._before_math.render(argname=argname, tab=tab, suffix=suffix)
+
+    def retrieve_cstr(self, argname, index, tab='', suffix=None, cleanup=None):
+        """
+        Returns a C string looking up the object by the id of the expression.
+        Args:
+        - argname (str): name of the argument to retrieve
+        - index (int): index of the position in the argument list (starts from 0)
+        - tab (str): string to add at the beginning of each line.
+        - suffix: suffix to add after the variable
+        """
+        if suffix is None:
+            suffix = self.default_suffix
+        if cleanup is None:
+            cleanup = self.cleanup_label(suffix=suffix)
+        return self._retrieve.render(argname=argname, tab=tab, index=index, suffix=suffix,
+                                     cleanup=cleanup)
+
+    def return_cstr(self, func_call, tab='', suffix=None, cleanup=None):
+        """
+        Returns a C string storing the constructed object under the id passed
+        as the last argument, replacing any object previously stored there.
+        """
+        if suffix is None:
+            suffix = self.default_suffix
+        if cleanup is None:
+            cleanup = self.cleanup_label(suffix=suffix)
+        return self._return.render(func_call=func_call, tab=tab, suffix=suffix, cleanup=cleanup)
+
+    def prototype_cstr(self, argname):
+        return self.name + ' * ' + argname
+
+    def prototype_return_cstr(self):
+        return self.name + ' *'
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+from mathbind.types import BasicType, BasicValueType
+from mathbind.template import Template
+
+
+class MappedArrayType(BasicType):
+    """
+    Represents an array read straight from a file with mmap, so the data never
+    goes through Mathematica. Declared as 'mapped double x[]' or
+    'const mapped float x[n]', the Mathematica value is {path, offset, length},
+    with the offset in bytes (defaults to 0) and the length in elements of the
+    declared type (defaults to the rest of the file). Const arrays are mapped
+    read-only, the others are mapped read-write and shared with the file.
+    Attributes:
+    - basetype (BasicValueType): type of the elements in the file.
+    - policy (str): size policy of the array. Can be 'infinite' or 'variable' (tied to another variable).
+    - size (str):
+    - const (bool): can the file be changed?
+    """
+
+    __slots__ = ('basetype', 'policy', 'size', 'const', '_retrieve', '_after')
+
+    qualifiers = ('const', 'mapped')
+    includes = ('<fcntl.h>', '<unistd.h>', '<sys/mman.h>', '<sys/stat.h>')
+    arg_count = 3
+
+    RETRIEVE = Template(
+        '{tab}/* Mapping {argname} */\n'
+        '{tab}char * path_{argname}{suffix} = MArgument_getUTF8String(Args{suffix}[{index}]);\n'
+        '{tab}mint offset_{argname}{suffix} = MArgument_getInteger(Args{suffix}[{offset_index}]);\n'
+        '{tab}mint length_{argname}{suffix} = MArgument_getInteger(Args{suffix}[{length_index}]);\n'
+        '{tab}int fd_{argname}{suffix} = open(path_{argname}{suffix}, {open_mode});\n'
+        '{tab}libData{suffix}->UTF8String_disown(path_{argname}{suffix});\n'
+        '{tab}if(fd_{argname}{suffix} < 0) {{\n'
+        '{tab}    error{suffix} = LIBRARY_FUNCTION_ERROR;\n'
+        '{tab}    goto {cleanup};\n'
+        '{tab}}}\n'
+        '{tab}struct stat stat_{argname}{suffix};\n'
+        '{tab}if(fstat(fd_{argname}{suffix}, &stat_{argname}{suffix}) != 0 || offset_{argname}{suffix} < 0 || '
+        'stat_{argname}{suffix}.st_size < offset_{argname}{suffix}) {{\n'
+        '{tab}    close(fd_{argname}{suffix});\n'
+        '{tab}    error{suffix} = LIBRARY_FUNCTION_ERROR;\n'
+        '{tab}    goto {cleanup};\n'
+        '{tab}}}\n'
+        '{tab}/* mapping past the end of the file would fault when read */\n'
+        '{tab}mint available_{argname}{suffix} = (stat_{argname}{suffix}.st_size - offset_{argname}{suffix}) / sizeof({c_name});\n'
+        '{tab}if(length_{argname}{suffix} < 0)\n'
+        '{tab}    length_{argname}{suffix} = available_{argname}{suffix};\n'
+        '{tab}if(length_{argname}{suffix} > available_{argname}{suffix}) {{\n'
+        '{tab}    close(fd_{argname}{suffix});\n'
+        '{tab}    error{suffix} = LIBRARY_DIMENSION_ERROR;\n'
+        '{tab}    goto {cleanup};\n'
+        '{tab}}}\n'
+        '{tab}mint skip_{argname}{suffix} = offset_{argname}{suffix} % sysconf(_SC_PAGESIZE);\n'
+        '{tab}if((size_t) length_{argname}{suffix} > ((size_t) -1 - skip_{argname}{suffix}) / sizeof({c_name})) {{\n'
+        '{tab}    close(fd_{argname}{suffix});\n'
+        '{tab}    error{suffix} = LIBRARY_DIMENSION_ERROR;\n'
+        '{tab}    goto {cleanup};\n'
+        '{tab}}}\n'
+        '{tab}size_t size_{argname}{suffix} = skip_{argname}{suffix} + sizeof({c_name}) * (size_t) length_{argname}{suffix};\n'
+        '{tab}char * map_{argname}{suffix} = mmap(NULL, size_{argname}{suffix} ? size_{argname}{suffix} : 1, {protection}, '
+        'MAP_SHARED, fd_{argname}{suffix}, offset_{argname}{suffix} - skip_{argname}{suffix});\n'
+        '{tab}close(fd_{argname}{suffix});\n'
+        '{tab}if(map_{argname}{suffix} == MAP_FAILED) {{\n'
+        '{tab}    error{suffix} = LIBRARY_FUNCTION_ERROR;\n'
+        '{tab}    goto {cleanup};\n'
+        '{tab}}}\n'
+        '{tab}{c_name} * {argname} = ({c_name} *) (map_{argname}{suffix} + skip_{argname}{suffix});\n'
+    )
+    BEFORE_MATH = Template(
+        '{tab}{argname}{suffix} = Flatten[{{{argname}}}];\n'
+        '{tab}{argname}{suffix} = Join[{{ExpandFileName[First[{argname}{suffix}]]}}, Rest[{argname}{suffix}], '
+        '{{0, -1}}[[Length[{argname}{suffix}] ;;]]];\n'
+    )
+    AFTER = Template('{tab}munmap(map_{argname}{suffix}, size_{argname}{suffix} ? size_{argname}{suffix} : 1);\n')
+
+    def __init__(self, basetype, policy, size=None, const=False):
+        if policy == 'fixed':
+            raise ValueError('The length of a mapped array is given with the file')
+
+        typename = 'mapped ' + basetype.typename + ' [{}]'.format('' if size is None else size)
+        if const:
+            typename = 'const ' + typename
+        self._set(typename=typename, basetype=basetype, policy=policy, size=size, const=const)
+
+        if const:
+            modes = dict(open_mode='O_RDONLY', protection='PROT_READ')
+        else:
+            modes = dict(open_mode='O_RDWR', protection='PROT_READ | PROT_WRITE')
+        self._set(_retrieve=self.RETRIEVE.bind(c_name=basetype.c_name, **modes),
+                  _after=self.AFTER)
+
+    def _args(self):
+        return (self.basetype, self.policy, self.size, self.const)
+
+    @property
+    def math_name(self):
+        return '"UTF8String", Integer, Integer'
+
+    @classmethod
+    def from_str(cls, s):
+        """
+        Tries to build a new MappedArrayType from the string specification,
+        failing unless the type is an array qualified as mapped.
+        """
+        bracket1 = s.index('[')
+        bracket2 = s.index(']')
+        if bracket1 > bracket2 or s.count('[') != 1 or s.count(']') != 1:
+            raise ValueError('Misplaced brackets')
+
+        length_spec = s[bracket1 + 1: bracket2].strip()
+        size = length_spec or None
+        policy = 'variable' if length_spec else 'infinite'
+        if length_spec.isdigit():
+            policy = 'fixed'
+
+        words = s[:bracket1].split()
+        qualifiers = set()
+        while words and words[0] in cls.qualifiers:
+            qualifiers.add(words.pop(0))
+        if 'mapped' not in qualifiers:
+            raise ValueError('Not a mapped array type')
+
+        return MappedArrayType(BasicValueType.from_str(' '.join(words)), policy, size,
+                               'const' in qualifiers)
+
+    @classmethod
+    def from_prototype_cstr(cls, s):
+        """
+        Tries to extract (type, argname) from the string.
+        """
+        try:
+            bra1, bra2 = s.index('['), s.index(']')
+        except ValueError:
+            raise ValueError('No brackets found')
+
+        if bra1 > bra2:
+            raise ValueError('Misplaced brackets')
+
+        *words, argname = s[: bra1].split()
+        return MappedArrayType.from_str(' '.join(words) + s[bra1:]), argname
+
+    def __repr__(self):
+        return ('MappedArrayType(basetype=%r, policy=%r, size=%r, const=%r)'
+                % (self.basetype, self.policy, self.size, self.const))
+
+    def length_cstr(self, argname, suffix=None):
+        """
+        Returns a C expression with the number of elements of the array.
+        """
+        if suffix is None:
+            suffix = self.default_suffix
+        return 'length_' + argname + suffix
+
+    def call_mathstr(self, argname, suffix=None):
+        if suffix is None:
+            suffix = self.default_suffix
+        return 'Sequence @@ ' + argname + suffix
+
+    def before_mathstr(self, argname, tab='', suffix=None):
+        if suffix is None:
+            suffix = self.default_suffix
+        return self.BEFORE_MATH.render(argname=argname, tab=tab, suffix=suffix)
+
+    def after_cstr(self, argname, tab='', suffix=None):
+        """
+        Returns a C string unmapping the file.
+        """
+        if suffix is None:
+            suffix = self.default_suffix
+        return self._after.render(argname=argname, tab=tab, suffix=suffix)
+
+    def retrieve_cstr(self, argname, index, tab='', suffix=None, cleanup=None):
+        """
+        Returns a C string mapping the file given by the path, offset and length
+        arguments. The offset and length must be within the file.
+        Args:
+        - argname (str): name of the argument to retrieve
+        - index (int): index of the path in the argument list (starts from 0)
+        - tab (str): string to add at the beginning of each line.
+        - suffix: suffix to add after the variable
+        - cleanup (str): label releasing the arguments retrieved before, jumped
+        to on errors, as nothing is left mapped then.
+        """
+        if suffix is None:
+            suffix = self.default_suffix
+        if cleanup is None:
+            cleanup = self.cleanup_label(suffix=suffix)
+        return self._retrieve.render(argname=argname, tab=tab, index=index, suffix=suffix,
+                                     offset_index=index + 1, length_index=index + 2,
+                                     cleanup=cleanup)
+
+    def prototype_cstr(self, argname):
+        """
+        Returns a C string representing the declaration in a prototype argument.
+        """
+        return ('const ' if self.const else '') + self.basetype.c_name + ' * ' + argname
+
+    def return_cstr(self, func_call, tab='', suffix=None, cleanup=None):
+        raise ValueError('Mapped arrays can only be passed as arguments')
+
+    def prototype_return_cstr(self):
+        raise ValueError('Mapped arrays can only be passed as arguments')
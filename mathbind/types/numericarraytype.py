@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+from mathbind.types import BasicType
+from mathbind.template import Template
+
+
+class NumericArrayType(BasicType):
+    """
+    Represents an array passed as a Mathematica NumericArray, whose data is
+    handed to C in its own element type, without widening it to mint or mreal.
+    Declared as 'numeric float x[]', 'const numeric uint8_t x[length]', etc.
+    Attributes:
+    - c_name (str): C element type.
+    - numeric_name (str): corresponding NumericArray type (Real32, Integer8, etc).
+    - policy (str): size policy of the array. Can be 'fixed', 'infinite', 'variable' (tied to another variable).
+    - size (str or int):
+    - const (bool): can the parameter be changed?
+    """
+
+    __slots__ = ('c_name', 'numeric_name', 'policy', 'size', 'const',
+                 '_retrieve', '_before_math', '_after')
+
+    qualifiers = ('const', 'numeric')
+    INCLUDES = ('<stdint.h>', '"WolframNumericArrayLibrary.h"')
+
+    NUMERIC_NAMES = {
+        'float': 'Real32',
+        'double': 'Real64',
+        'int8_t': 'Integer8',
+        'signed char': 'Integer8',
+        'uint8_t': 'UnsignedInteger8',
+        'unsigned char': 'UnsignedInteger8',
+        'int16_t': 'Integer16',
+        'short': 'Integer16',
+        'uint16_t': 'UnsignedInteger16',
+        'unsigned short': 'UnsignedInteger16',
+        'int32_t': 'Integer32',
+        'int': 'Integer32',
+        'uint32_t': 'UnsignedInteger32',
+        'unsigned': 'UnsignedInteger32',
+        'unsigned int': 'UnsignedInteger32',
+        'int64_t': 'Integer64',
+        'long long': 'Integer64',
+        'uint64_t': 'UnsignedInteger64',
+        'unsigned long long': 'UnsignedInteger64',
+        'float complex': 'ComplexReal32',
+        'double complex': 'ComplexReal64',
+    }
+
+    RETRIEVE = Template(
+        '{tab}MNumericArray numeric_{argname}{suffix} = MArgument_getMNumericArray(Args{suffix}[{index}]);\n'
+        '{tab}{c_name} * {argname} = ({c_name} *) libData{suffix}->numericarrayLibraryFunctions->MNumericArray_getData(numeric_{argname}{suffix});\n'
+    )
+    RETRIEVE_LENGTH = Template(
+        '{tab}MNumericArray numeric_{argname}{suffix} = MArgument_getMNumericArray(Args{suffix}[{index}]);\n'
+        '{tab}{c_name} * {argname} = ({c_name} *) libData{suffix}->numericarrayLibraryFunctions->MNumericArray_getData(numeric_{argname}{suffix});\n'
+        '{tab}mint length_{argname}{suffix} = libData{suffix}->numericarrayLibraryFunctions->MNumericArray_getFlattenedLength(numeric_{argname}{suffix});\n'
+    )
+    BEFORE_MATH = Template(
+        '{tab}{argname}{suffix} = NumericArray[{argname}, "{numeric_name}", "ClipAndRound"];\n'
+    )
+    AFTER = Template(
+        '{tab}libData{suffix}->numericarrayLibraryFunctions->MNumericArray_disownAll(numeric_{argname}{suffix});\n'
+    )
+
+    def __init__(self, c_name, policy, size=None, const=False):
+        try:
+            numeric_name = self.NUMERIC_NAMES[c_name]
+        except KeyError:
+            raise ValueError('Unsupported NumericArray element type %r' % c_name)
+
+        typename = 'numeric ' + c_name + ' [{}]'.format('' if size is None else size)
+        if const:
+            typename = 'const ' + typename
+        self._set(typename=typename, c_name=c_name, numeric_name=numeric_name,
+                  policy=policy, size=size, const=const)
+
+        # the length is only read to fill in the size it is tied to
+        retrieve = self.RETRIEVE_LENGTH if policy == 'variable' else self.RETRIEVE
+        self._set(_retrieve=retrieve.bind(c_name=c_name),
+                  _before_math=self.BEFORE_MATH.bind(numeric_name=numeric_name),
+                  _after=self.AFTER)
+
+    def _args(self):
+        return (self.c_name, self.policy, self.size, self.const)
+
+    @property
+    def includes(self):
+        if self.numeric_name.startswith('Complex'):
+            return self.INCLUDES + ('<complex.h>',)
+        return self.INCLUDES
+
+    @property
+    def should_return(self):
+        return not self.const
+
+    @property
+    def math_name(self):
+        return '{{LibraryDataType[NumericArray, "{}", 1], "Shared"}}'.format(self.numeric_name)
+
+    @classmethod
+    def from_str(cls, s):
+        """
+        Tries to build a new NumericArrayType from the string specification,
+        failing unless the type is an array qualified as numeric.
+        """
+        bracket1 = s.index('[')
+        bracket2 = s.index(']')
+        if bracket1 > bracket2 or s.count('[') != 1 or s.count(']') != 1:
+            raise ValueError('Misplaced brackets')
+
+        length_spec = s[bracket1 + 1: bracket2].strip()
+        size = None
+        policy = 'infinite'
+
+        try:
+            size = int(length_spec)
+            policy = 'fixed'
+        except ValueError:
+            if length_spec:
+                policy = 'variable'
+                size = length_spec
+
+        words = s[:bracket1].split()
+        qualifiers = set()
+        while words and words[0] in cls.qualifiers:
+            qualifiers.add(words.pop(0))
+        if 'numeric' not in qualifiers:
+            raise ValueError('Not a NumericArray type')
+
+        return NumericArrayType(' '.join(words), policy, size, 'const' in qualifiers)
+
+    @classmethod
+    def from_prototype_cstr(cls, s):
+        """
+        Tries to extract (type, argname) from the string.
+        """
+        try:
+            bra1, bra2 = s.index('['), s.index(']')
+        except ValueError:
+            raise ValueError('No brackets found')
+
+        if bra1 > bra2:
+            raise ValueError('Misplaced brackets')
+
+        *words, argname = s[: bra1].split()
+        return NumericArrayType.from_str(' '.join(words) + s[bra1:]), argname
+
+    def __repr__(self):
+        return ('NumericArrayType(c_name=%r, policy=%r, size=%r, const=%r)'
+                % (self.c_name, self.policy, self.size, self.const))
+
+    def length_cstr(self, argname, suffix=None):
+        """
+        Returns a C expression with the number of elements of the array.
+        """
+        if suffix is None:
+            suffix = self.default_suffix
+        if self.policy == 'fixed':
+            return str(self.size)
+        return 'length_' + argname + suffix
+
+    def before_mathstr(self, argname, tab='', suffix=None):
+        if suffix is None:
+            suffix = self.default_suffix
+        return self._before_math.render(argname=argname, tab=tab, suffix=suffix)
+
+    def after_cstr(self, argname, tab='', suffix=None):
+        """
+        Returns a C string releasing the shared NumericArray.
+        """
+        if suffix is None:
+            suffix = self.default_suffix
+        return self._after.render(argname=argname, tab=tab, suffix=suffix)
+
+    def retrieve_cstr(self, argname, index, tab='', suffix=None, cleanup=None):
+        """
+        Returns a C string pointing the argument straight to the NumericArray data.
+        Args:
+        - argname (str): name of the argument to retrieve
+        - index (int): index of the position in the argument list (starts from 0)
+        - tab (str): string to add at the beginning of each line.
+        - suffix: suffix to add after the variable
+        """
+        if suffix is None:
+            suffix = self.default_suffix
+        return self._retrieve.render(argname=argname, tab=tab, index=index, suffix=suffix)
+
+    def prototype_cstr(self, argname):
+        """
+        Returns a C string representing the declaration in a prototype argument.
+        """
+        return ('const ' if self.const else '') + self.c_name + ' * ' + argname
+
+    def return_cstr(self, func_call, tab='', suffix=None, cleanup=None):
+        raise ValueError('NumericArrays can only be passed as arguments')
+
+    def prototype_return_cstr(self):
+        raise ValueError('NumericArrays can only be passed as arguments')
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 from mathbind.types import BasicType, BasicValueType
+from mathbind.template import Template
 
 
 class PointerType(BasicType):
@@ -11,12 +12,44 @@ class PointerType(BasicType):
     - const (bool): is it constant?
     """
 
+    __slots__ = ('basetype', 'const', '_retrieve', '_before_math')
+
+    RETRIEVE_CONST = Template(
+        '{tab}{c_name} {argname} = MArgument_get{math_name}(Args{suffix}[{index}]);\n'
+    )
+    RETRIEVE = Template(
+        '{tab}MTensor mtensor_{argname}{suffix} = MArgument_getMTensor(Args{suffix}[{index}]);\n'
+        '{tab}{c_name} {argname} = * (libData{suffix}->MTensor_get{math_name}Data(mtensor_{argname}{suffix}));\n'
+    )
+    COMPLEX_RETRIEVE_CONST = BasicValueType.COMPLEX_RETRIEVE
+    COMPLEX_RETRIEVE = Template(
+        '{tab}MTensor mtensor_{argname}{suffix} = MArgument_getMTensor(Args{suffix}[{index}]);\n'
+        '{tab}mcomplex * data_{argname}{suffix} = libData{suffix}->MTensor_getComplexData(mtensor_{argname}{suffix});\n'
+        '{tab}{c_name} {argname} = ({c_name}) (mcreal(*data_{argname}{suffix}) + I * mcimag(*data_{argname}{suffix}));\n'
+    )
+    BEFORE_MATH = Template('{tab}{argname}{suffix} = Developer`ToPackedArray[{{{convert_f}[{argname}]}}];\n')
+    AFTER = Template('{tab}libData{suffix}->MTensor_disownAll(mtensor_{argname}{suffix});\n')
+
     def __init__(self, basetype, const=False):
-        self.typename = basetype.typename + ' * '
+        typename = basetype.typename + ' * '
+        if const:
+            typename = 'const ' + typename
+        self._set(typename=typename, basetype=basetype, const=const)
+
+        fields = dict(c_name=basetype.c_name, math_name=basetype.math_name)
+        if basetype.math_name == 'Complex':
+            retrieve_const, retrieve = self.COMPLEX_RETRIEVE_CONST, self.COMPLEX_RETRIEVE
+        else:
+            retrieve_const, retrieve = self.RETRIEVE_CONST, self.RETRIEVE
         if const:
-            self.typename = 'const ' + self.typename
-        self.basetype = basetype
-        self.const = const
+            self._set(_retrieve=retrieve_const.bind(**fields),
+                      _before_math=BasicType.BEFORE_MATH)
+        else:
+            self._set(_retrieve=retrieve.bind(**fields),
+                      _before_math=self.BEFORE_MATH.bind(convert_f=basetype.math_convert_f))
+
+    def _args(self):
+        return (self.basetype, self.const)
 
     @classmethod
     def from_str(self, s):
@@ -56,6 +89,10 @@ class PointerType(BasicType):
     def should_return(self):
         return not self.const
 
+    @property
+    def includes(self):
+        return self.basetype.includes
+
     @property
     def math_name(self):
         if self.const:
@@ -64,33 +101,18 @@ class PointerType(BasicType):
             base_name = self.basetype.math_name
             return '{{{0}, 1, "Shared"}}'.format(base_name)
 
-    def __eq__(self, other):
-        return self.basetype == other.basetype and self.const == other.const
-
     def __repr__(self):
         return 'PointerType(basetype=%r, const=%r)' % (self.basetype, self.const)
 
     def before_mathstr(self, argname, tab='', suffix=None):
         if suffix is None:
             suffix = self.default_suffix
-        if self.const:
-            return super().before_mathstr(argname, tab, suffix)
-        convert_f = self.basetype.math_convert_f
-        form = '{tab}{argname}{suffix} = Developer`ToPackedArray[{{{convert_f}[{argname}]}}];\n'
-        return form.format(**locals())
+        return self._before_math.render(argname=argname, tab=tab, suffix=suffix)
 
-    def retrieve_cstr(self, argname, index, tab='', suffix=None):
+    def retrieve_cstr(self, argname, index, tab='', suffix=None, cleanup=None):
         if suffix is None:
             suffix = self.default_suffix
-        if self.const:
-            form = '{tab}{self.basetype.c_name} {argname} = MArgument_get{self.basetype.math_name}(Args{suffix}[{index}]);\n'
-        else:
-            form = ('{tab}MTensor mtensor_{argname}{suffix} = MArgument_getMTensor(Args{suffix}[{index}]);\n'
-                    '{tab}{self.basetype.c_name} {argname} = * (libData{suffix}->MTensor_get{self.basetype.math_name}Data(mtensor_{argname}{suffix}));\n')
-
-        cstr = form.format(argname=argname, self=self, tab=tab, index=index, suffix=suffix)
-
-        return cstr
+        return self._retrieve.render(argname=argname, tab=tab, index=index, suffix=suffix)
 
     def pass_cstr(self, argname, suffix=''):
         return '&' + argname + suffix
@@ -103,8 +125,4 @@ class PointerType(BasicType):
             suffix = self.default_suffix
         if self.const:
             return ''
-
-        convert = (
-            '{tab}libData{suffix}->MTensor_disownAll(mtensor_{argname}{suffix});\n'
-        )
-        return convert.format(argname=argname, self=self, tab=tab, suffix=suffix)
\ No newline at end of file
+        return self.AFTER.render(argname=argname, tab=tab, suffix=suffix)
\ No newline at end of file
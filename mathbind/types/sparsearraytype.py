@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+from mathbind.types import BasicType, BasicValueType
+from mathbind.template import Template
+
+
+class SparseArrayType(BasicType):
+    """
+    Represents a matrix passed as a Mathematica SparseArray, without densifying
+    it. Declared as 'sparse double A' or 'const sparse double A', the C function
+    receives its CSR buffers as five arguments, straight from the MSparseArray:
+    mint A_rows, mint A_cols, const mint * A_row_pointers,
+    const mint * A_column_indices and mreal * A_values (or mint * for integers).
+    As in Mathematica, the row pointers start at 0 and the column indices at 1.
+    The elements left out are 0: the wrappers make it the background of the
+    array, and arrays with another one are rejected with LIBRARY_TYPE_ERROR.
+    Attributes:
+    - basetype (BasicValueType): type of the values, Integer or Real.
+    - const (bool): can the values be changed?
+    """
+
+    __slots__ = ('basetype', 'const', '_retrieve', '_before_math', '_after')
+
+    qualifiers = ('const', 'sparse')
+    includes = ('"WolframSparseLibrary.h"',)
+
+    RETRIEVE = Template(
+        '{tab}MSparseArray sparse_{argname}{suffix} = MArgument_getMSparseArray(Args{suffix}[{index}]);\n'
+        '{tab}MTensor * implicit_{argname}{suffix} = libData{suffix}->sparseLibraryFunctions->MSparseArray_getImplicitValue(sparse_{argname}{suffix});\n'
+        '{tab}if(implicit_{argname}{suffix} && *implicit_{argname}{suffix} && '
+        'libData{suffix}->MTensor_get{math_name}Data(*implicit_{argname}{suffix})[0] != 0) {{\n'
+        '{tab}    error{suffix} = LIBRARY_TYPE_ERROR;\n'
+        '{tab}    goto {cleanup};\n'
+        '{tab}}}\n'
+        '{tab}const mint * dims_{argname}{suffix} = libData{suffix}->sparseLibraryFunctions->MSparseArray_getDimensions(sparse_{argname}{suffix});\n'
+        '{tab}MTensor * rows_{argname}{suffix} = libData{suffix}->sparseLibraryFunctions->MSparseArray_getRowPointers(sparse_{argname}{suffix});\n'
+        '{tab}MTensor * columns_{argname}{suffix} = libData{suffix}->sparseLibraryFunctions->MSparseArray_getColumnIndices(sparse_{argname}{suffix});\n'
+        '{tab}MTensor * values_{argname}{suffix} = libData{suffix}->sparseLibraryFunctions->MSparseArray_getExplicitValues(sparse_{argname}{suffix});\n'
+        '{tab}mint {argname}_rows = dims_{argname}{suffix}[0];\n'
+        '{tab}mint {argname}_cols = dims_{argname}{suffix}[1];\n'
+        '{tab}mint * {argname}_row_pointers = libData{suffix}->MTensor_getIntegerData(*rows_{argname}{suffix});\n'
+        '{tab}mint * {argname}_column_indices = (columns_{argname}{suffix} && *columns_{argname}{suffix}) ? '
+        'libData{suffix}->MTensor_getIntegerData(*columns_{argname}{suffix}) : NULL;\n'
+        '{tab}{c_math_name} * {argname}_values = (values_{argname}{suffix} && *values_{argname}{suffix}) ? '
+        'libData{suffix}->MTensor_get{math_name}Data(*values_{argname}{suffix}) : NULL;\n'
+    )
+    BEFORE_MATH = Template(
+        '{tab}{argname}{suffix} = SparseArray[{convert_f}[{argname}], Dimensions[{argname}], 0];\n'
+    )
+    AFTER = Template(
+        '{tab}libData{suffix}->sparseLibraryFunctions->MSparseArray_disownAll(sparse_{argname}{suffix});\n'
+    )
+
+    def __init__(self, basetype, const=False):
+        if basetype.math_name not in ('Integer', 'Real'):
+            raise ValueError('Sparse arrays only hold Integer or Real values')
+
+        typename = 'sparse ' + basetype.typename
+        if const:
+            typename = 'const ' + typename
+        self._set(typename=typename, basetype=basetype, const=const)
+
+        self._set(_retrieve=self.RETRIEVE.bind(c_math_name=basetype.c_math_name,
+                                               math_name=basetype.math_name),
+                  _before_math=self.BEFORE_MATH.bind(convert_f=basetype.math_convert_f),
+                  _after=Template('') if const else self.AFTER)
+
+    def _args(self):
+        return (self.basetype, self.const)
+
+    @property
+    def should_return(self):
+        return not self.const
+
+    @property
+    def math_name(self):
+        passing = 'Constant' if self.const else 'Shared'
+        return '{{LibraryDataType[SparseArray, {}, 2], "{}"}}'.format(self.basetype.math_name, passing)
+
+    @classmethod
+    def from_str(cls, s):
+        """
+        Tries to build a new SparseArrayType from the string specification,
+        failing unless the type is qualified as sparse.
+        """
+        if '*' in s or '[' in s or ']' in s:
+            raise ValueError('Not a valid sparse type')
+
+        words = s.split()
+        qualifiers = set()
+        while words and words[0] in cls.qualifiers:
+            qualifiers.add(words.pop(0))
+        if 'sparse' not in qualifiers:
+            raise ValueError('Not a sparse type')
+
+        return SparseArrayType(BasicValueType.from_str(' '.join(words)), 'const' in qualifiers)
+
+    @classmethod
+    def from_prototype_cstr(cls, s):
+        """
+        Tries to extract (type, argname) from the string.
+        """
+        *words, argname = s.split()
+        return SparseArrayType.from_str(' '.join(words)), argname
+
+    def __repr__(self):
+        return 'SparseArrayType(basetype=%r, const=%r)' % (self.basetype, self.const)
+
+    def before_mathstr(self, argname, tab='', suffix=None):
+        if suffix is None:
+            suffix = self.default_suffix
+        return self._before_math.render(argname=argname, tab=tab, suffix=suffix)
+
+    def after_cstr(self, argname, tab='', suffix=None):
+        """
+        Returns a C string releasing the shared SparseArray.
+        """
+        if suffix is None:
+            suffix = self.default_suffix
+        return self._after.render(argname=argname, tab=tab, suffix=suffix)
+
+    def retrieve_cstr(self, argname, index, tab='', suffix=None, cleanup=None):
+        """
+        Returns a C string pointing the CSR arguments straight to the SparseArray data.
+        Args:
+        - argname (str): name of the argument to retrieve
+        - index (int): index of the position in the argument list (starts from 0)
+        - tab (str): string to add at the beginning of each line.
+        - suffix: suffix to add after the variable
+        - cleanup (str): label releasing the arguments retrieved before, jumped
+        to when the background is not 0. The shared arrays jump to their own
+        cleanup instead, which disowns them too.
+        """
+        if suffix is None:
+            suffix = self.default_suffix
+        if not self.const:
+            cleanup = self.cleanup_label(argname, suffix)
+        elif cleanup is None:
+            cleanup = self.cleanup_label(suffix=suffix)
+        return self._retrieve.render(argname=argname, tab=tab, index=index, suffix=suffix,
+                                     cleanup=cleanup)
+
+    def pass_cstr(self, argname):
+        return ', '.join(argname + part for part in
+                         ('_rows', '_cols', '_row_pointers', '_column_indices', '_values'))
+
+    def prototype_cstr(self, argname):
+        """
+        Returns a C string with the declarations of the CSR arguments.
+        """
+        values = ('const ' if self.const else '') + self.basetype.c_math_name
+        return ('mint {0}_rows, mint {0}_cols, const mint * {0}_row_pointers, '
+                'const mint * {0}_column_indices, {1} * {0}_values').format(argname, values)
+
+    def return_cstr(self, func_call, tab='', suffix=None, cleanup=None):
+        raise ValueError('SparseArrays can only be passed as arguments')
+
+    def prototype_return_cstr(self):
+        raise ValueError('SparseArrays can only be passed as arguments')
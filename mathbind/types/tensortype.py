@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+from mathbind.types import BasicType, BasicValueType, ArrayType
+from mathbind.template import Template
+
+
+class TensorType(BasicType):
+    """
+    Represents a rank-N array, declared in row-major order as 'double a[m][n]'
+    or 'const int a[][3]'. The C function receives the flat data of the tensor,
+    as laid out by Mathematica, and the variable dimensions can be derived from
+    the tensor like the length of an array.
+    Attributes:
+    - basetype (BasicValueType): type of the elements.
+    - dims (tuple): size of each dimension, from the outermost one. Each is an
+    int (fixed), a str (tied to another variable) or None (any size).
+    - const (bool): can the parameter be changed?
+    """
+
+    __slots__ = ('basetype', 'dims', 'const', '_flat', '_retrieve', '_before_math')
+
+    qualifiers = ('const',)
+
+    RETRIEVE = Template(
+        '{tab}MTensor mtensor_{argname}{suffix} = MArgument_getMTensor(Args{suffix}[{index}]);\n'
+        '{tab}{c_math_name} * data_{argname}{suffix} = libData{suffix}->MTensor_get{math_name}Data(mtensor_{argname}{suffix});\n'
+        '{tab}mint length_{argname}{suffix} = libData{suffix}->MTensor_getFlattenedLength(mtensor_{argname}{suffix});\n'
+        '{tab}const mint * dims_{argname}{suffix} = libData{suffix}->MTensor_getDimensions(mtensor_{argname}{suffix});\n'
+    )
+    CHECK_DIM = Template(
+        '{tab}if(dims_{argname}{suffix}[{index}] != {size}) {{\n'
+        '{tab}    error{suffix} = LIBRARY_DIMENSION_ERROR;\n'
+        '{tab}    goto {own};\n'
+        '{tab}}}\n'
+    )
+    BEFORE_MATH = Template(
+        '{tab}{argname}{suffix} = {argname};\n'
+        '{tab}{argname}{suffix} = Developer`ToPackedArray[Map[{convert_f}, {argname}{suffix}, {{{rank}}}]];\n'
+    )
+
+    def __init__(self, basetype, dims, const=False):
+        dims = tuple(dims)
+        if len(dims) < 2:
+            raise ValueError('A tensor has at least two dimensions')
+
+        typename = basetype.typename + ' ' + ''.join('[{}]'.format('' if d is None else d) for d in dims)
+        if const:
+            typename = 'const ' + typename
+        self._set(typename=typename, basetype=basetype, dims=dims, const=const)
+
+        # converted and released as the flat array of its elements
+        flat = ArrayType(basetype, 'infinite', None, const)
+        self._set(_flat=flat,
+                  _retrieve=self.RETRIEVE.bind(c_math_name=basetype.c_math_name,
+                                               math_name=basetype.math_name),
+                  _before_math=self.BEFORE_MATH.bind(convert_f=basetype.math_convert_f, rank=len(dims)))
+
+    def _args(self):
+        return (self.basetype, self.dims, self.const)
+
+    @property
+    def rank(self):
+        return len(self.dims)
+
+    @property
+    def should_return(self):
+        return not self.const
+
+    @property
+    def includes(self):
+        return self.basetype.includes
+
+    @property
+    def helpers(self):
+        return self._flat.helpers
+
+    @property
+    def math_name(self):
+        return '{{{}, {}, "Shared"}}'.format(self.basetype.math_name, self.rank)
+
+    @classmethod
+    def from_str(cls, s):
+        """
+        Tries to build a new TensorType from the string specification, failing
+        unless it has two or more dimensions.
+        """
+        type_spec, bracket, rest = s.partition('[')
+        if not bracket:
+            raise ValueError('No brackets found')
+
+        rest = bracket + rest.strip()
+        dims = []
+        while rest:
+            if not rest.startswith('[') or ']' not in rest:
+                raise ValueError('Misplaced brackets')
+            spec, _, rest = rest[1:].partition(']')
+            spec, rest = spec.strip(), rest.strip()
+            if '[' in spec:
+                raise ValueError('Misplaced brackets')
+            try:
+                dims.append(int(spec))
+            except ValueError:
+                dims.append(spec or None)
+
+        words = type_spec.split()
+        qualifiers = set()
+        while words and words[0] in cls.qualifiers:
+            qualifiers.add(words.pop(0))
+
+        return TensorType(BasicValueType.from_str(' '.join(words)), dims, 'const' in qualifiers)
+
+    @classmethod
+    def from_prototype_cstr(cls, s):
+        """
+        Tries to extract (type, argname) from the string.
+        """
+        try:
+            bra1 = s.index('[')
+        except ValueError:
+            raise ValueError('No brackets found')
+
+        *words, argname = s[: bra1].split()
+        return TensorType.from_str(' '.join(words) + s[bra1:]), argname
+
+    def __repr__(self):
+        return 'TensorType(basetype=%r, dims=%r, const=%r)' % (self.basetype, self.dims, self.const)
+
+    def length_cstr(self, argname, suffix=None):
+        """
+        Returns a C expression with the number of elements of the tensor.
+        """
+        return self._flat.length_cstr(argname, suffix)
+
+    def dim_cstr(self, argname, size, suffix=None, index=None):
+        """
+        Returns a C expression with the dimension of the tensor tied to the
+        variable size, the first one unless its index is given.
+        """
+        if suffix is None:
+            suffix = self.default_suffix
+        if index is None:
+            index = self.dims.index(size)
+        return 'dims_' + argname + suffix + '[' + str(index) + ']'
+
+    def before_mathstr(self, argname, tab='', suffix=None):
+        if suffix is None:
+            suffix = self.default_suffix
+        return self._before_math.render(argname=argname, tab=tab, suffix=suffix)
+
+    def after_cstr(self, argname, tab='', suffix=None):
+        """
+        Returns a C string converting the elements back and releasing the tensor.
+        """
+        return self._flat.after_cstr(argname, tab, suffix)
+
+    def retrieve_cstr(self, argname, index, tab='', suffix=None, cleanup=None):
+        """
+        Returns a C string to retrieve the tensor and its dimensions, checking
+        the fixed ones once it's converted, so the cleanup of the tensor
+        releases it on errors.
+        Args:
+        - argname (str): name of the argument to retrieve
+        - index (int): index of the position in the argument list (starts from 0)
+        - tab (str): string to add at the beginning of each line.
+        - suffix: suffix to add after the variable
+        """
+        if suffix is None:
+            suffix = self.default_suffix
+        checks = ''.join(self.CHECK_DIM.render(tab=tab, argname=argname, suffix=suffix,
+                                               index=i, size=size,
+                                               own=self.cleanup_label(argname, suffix))
+                         for i, size in enumerate(self.dims) if isinstance(size, int))
+        return (self._retrieve.render(argname=argname, tab=tab, index=index, suffix=suffix) +
+                self._flat.before_cstr(argname, tab, suffix) + checks)
+
+    def prototype_cstr(self, argname):
+        """
+        Returns a C string representing the declaration in a prototype argument.
+        """
+        return ('const ' if self.const else '') + self.basetype.c_name + ' * ' + argname
+
+    def return_cstr(self, func_call, tab='', suffix=None, cleanup=None):
+        raise ValueError('Tensors can only be passed as arguments')
+
+    def prototype_return_cstr(self):
+        raise ValueError('Tensors can only be passed as arguments')
@@ -7,13 +7,15 @@ class VoidType(BasicType):
     """
     Represents the void type, used in the return type of functions.
     """
+    __slots__ = ()
+
     def __init__(self, typename):
         if typename != 'void':
             raise ValueError("VoidType only accepts the type specification 'void'")
-        self.typename = 'void'
+        self._set(typename='void')
 
-    def __eq__(self, other):
-        return self.typename == other.typename
+    def _args(self):
+        return ('void',)
 
     def __repr__(self):
         return 'VoidType(%r)' % 'void'
@@ -34,14 +36,14 @@ class VoidType(BasicType):
         """
         return VoidType(s.strip())
 
-    def retrieve_cstr(self, argname, index, tab='', suffix=None):
+    def retrieve_cstr(self, argname, index, tab='', suffix=None, cleanup=None):
         """
         Because the void type can not be passed as an argument, this method is
         left unimplemented.
         """
         raise NotImplemented
 
-    def return_cstr(self, func_call, tab='', suffix=None):
+    def return_cstr(self, func_call, tab='', suffix=None, cleanup=None):
         return '{tab}{func_call};\n'.format(func_call=func_call, tab=tab)
 
     def prototype_return_cstr(self):
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+import os
+import unittest
+from unittest import mock
+
+from mathbind.compilers.clang import ClangCompiler
+
+
+class TestClangCompiler(unittest.TestCase):
+    def setUp(self):
+        self.os_system_backup = os.system
+        self.capabilities = mock.patch.object(ClangCompiler, 'capabilities',
+                                              return_value=set(ClangCompiler.PROBES))
+        self.capabilities.start()
+
+    def tearDown(self):
+        os.system = self.os_system_backup
+        self.capabilities.stop()
+
+    def test_thin_lto(self):
+        os.system = mock.MagicMock(return_value=0)
+        c1 = ClangCompiler(flags='-O2', jobs=4)
+        c1.compile_shared_library(['file.c', 'libGen0.c', 'libGen1.c'], 'libfile.so')
+        os.system.assert_called_with(('clang -fPIC -shared -o "libfile.so" "file.c" "libGen0.c" "libGen1.c" '
+                                      '-O2 -flto=thin -flto-jobs=4'))
+
+    def test_default_jobs(self):
+        os.system = mock.MagicMock(return_value=0)
+        with mock.patch('os.cpu_count', return_value=12):
+            ClangCompiler().compile_shared_library(['file.c'], 'libfile.so')
+        os.system.assert_called_with(('clang -fPIC -shared -o "libfile.so" "file.c" -flto=thin -flto-jobs=12'))
+
+    def test_lto_modes(self):
+        os.system = mock.MagicMock(return_value=0)
+        ClangCompiler(lto='full', libs=['m']).compile_shared_library(['file.c'], 'libfile.so')
+        os.system.assert_called_with(('clang -fPIC -shared -o "libfile.so" "file.c" -lm -flto=full'))
+        ClangCompiler(lto=None, command='clang-17').compile_shared_library(['file.c'], 'libfile.so')
+        os.system.assert_called_with(('clang-17 -fPIC -shared -o "libfile.so" "file.c"'))
+        with self.assertRaises(ValueError):
+            ClangCompiler(lto='fat')
+
+    def test_unsupported_lto(self):
+        os.system = mock.MagicMock(return_value=0)
+        with mock.patch.object(ClangCompiler, 'capabilities', return_value={'openmp'}):
+            ClangCompiler(features=['openmp']).compile_shared_library(['file.c'], 'libfile.so')
+        os.system.assert_called_with(('clang -fPIC -shared -o "libfile.so" "file.c" -fopenmp'))
+
+
+if __name__ == '__main__':
+    unittest.main()
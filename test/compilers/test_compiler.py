@@ -3,11 +3,17 @@
 import unittest
 from mathbind.compilers.compiler import Compiler
 from mathbind.compilers.gcc import GccCompiler
+from mathbind.compilers.gfortran import GfortranCompiler
+from mathbind.compilers.clang import ClangCompiler
 
 
 class TestCompiler(unittest.TestCase):
     def test_find(self):
         self.assertEqual(Compiler.by_name('gcc'), GccCompiler)
+        self.assertEqual(Compiler.by_name('gfortran'), GfortranCompiler)
+        self.assertEqual(Compiler.by_name('clang'), ClangCompiler)
+        with self.assertRaises(ValueError):
+            Compiler.by_name('tcc')
 
 
 if __name__ == '__main__':
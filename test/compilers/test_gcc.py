@@ -1,13 +1,15 @@
 #!/usr/bin/env python3
 
 import os
+import shutil
+import tempfile
 import unittest
 from unittest import mock
 
-from mathbind.compilers.gcc import GccCompiler
+from mathbind.compilers.gcc import GccCompiler, PROBE_SOURCE
 
 
-class TestGFortranCompiler(unittest.TestCase):
+class TestGccCompiler(unittest.TestCase):
     def setUp(self):
         self.os_system_backup = os.system
 
@@ -24,4 +26,45 @@ class TestGFortranCompiler(unittest.TestCase):
         os.system = mock.MagicMock(return_value=0)
         c1 = GccCompiler(libs=['m', 'mock'], lib_paths=['/dev/zero'])
         c1.compile_shared_library(['file.c', 'otherfile.f90'], 'libfile.so')
-        os.system.assert_called_with(('gcc -fPIC -shared -o "libfile.so" "file.c" "otherfile.f90" -lm -lmock -L "/dev/zero"'))
\ No newline at end of file
+        os.system.assert_called_with(('gcc -fPIC -shared -o "libfile.so" "file.c" "otherfile.f90" -lm -lmock -L "/dev/zero"'))
+
+    def test_features(self):
+        os.system = mock.MagicMock(return_value=0)
+        with mock.patch.object(GccCompiler, 'capabilities', return_value={'openmp', 'lto'}):
+            GccCompiler(flags=['-O2', '-g'], features=['native', 'openmp']).compile_shared_library(
+                ['file.c'], 'libfile.so')
+        os.system.assert_called_with(('gcc -fPIC -shared -o "libfile.so" "file.c" -O2 -g -fopenmp'))
+        with self.assertRaises(ValueError):
+            GccCompiler(features=['avx'])
+
+    def test_symbols(self):
+        os.system = mock.MagicMock(return_value=0)
+        GccCompiler(visibility='hidden', gc_sections=True, version_script='lib.map').compile_shared_library(
+            ['file.c'], 'libfile.so')
+        os.system.assert_called_with(('gcc -fPIC -shared -o "libfile.so" "file.c" -fvisibility=hidden '
+                                      '-ffunction-sections -fdata-sections -Wl,--gc-sections '
+                                      '-Wl,--version-script="lib.map"'))
+
+    def test_capabilities_cached(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.dict(os.environ, {'MATHBIND_CACHE_DIR': tmp}), \
+                mock.patch.object(GccCompiler, 'version', return_value='gcc 1.0'), \
+                mock.patch.object(GccCompiler, 'probe', side_effect=lambda flags, source: flags != '-flto') as probe:
+            self.assertEqual(GccCompiler().capabilities(), {'openmp', 'native'})
+            self.assertEqual(probe.call_count, len(GccCompiler.PROBES))
+            # probed once per binary and version, in any process
+            compiler = GccCompiler()
+            self.assertTrue(compiler.supports('openmp'))
+            self.assertFalse(compiler.supports('lto'))
+            self.assertEqual(probe.call_count, len(GccCompiler.PROBES))
+            GccCompiler.version.return_value = 'gcc 2.0'
+            GccCompiler().capabilities()
+            self.assertEqual(probe.call_count, 2 * len(GccCompiler.PROBES))
+
+    @unittest.skipIf(shutil.which('gcc') is None, 'gcc is needed to probe it')
+    def test_probe(self):
+        compiler = GccCompiler()
+        self.assertTrue(compiler.probe('', PROBE_SOURCE))
+        self.assertFalse(compiler.probe('-fno-such-option', PROBE_SOURCE))
+        self.assertFalse(GccCompiler(command='no-such-gcc').probe('', PROBE_SOURCE))
+        self.assertEqual(GccCompiler(command='no-such-gcc').version(), '')
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+import os
+import unittest
+from unittest import mock
+
+from mathbind.compilers.gfortran import GfortranCompiler
+
+
+class TestGfortranCompiler(unittest.TestCase):
+    def setUp(self):
+        self.os_system_backup = os.system
+
+    def tearDown(self):
+        os.system = self.os_system_backup
+
+    def test1(self):
+        os.system = mock.MagicMock(return_value=0)
+        c1 = GfortranCompiler()
+        c1.compile_shared_library(['file.c'], 'libfile.so')
+        os.system.assert_called_with(('gfortran -fPIC -shared -o "libfile.so" "file.c"'))
+
+    def test2(self):
+        os.system = mock.MagicMock(return_value=0)
+        c1 = GfortranCompiler(libs=['m', 'mock'], lib_paths=['/dev/zero'])
+        c1.compile_shared_library(['file.c', 'otherfile.f90'], 'libfile.so')
+        os.system.assert_called_with(('gfortran -fPIC -shared -o "libfile.so" "file.c" "otherfile.f90" -lm -lmock -L "/dev/zero"'))
\ No newline at end of file
@@ -0,0 +1,85 @@
+/*
+ * Stand-in for the LibraryLink header shipped with Mathematica, with the
+ * subset of its declarations used by the generated wrappers. It lets the
+ * tests compile the wrappers and call them without a Mathematica install,
+ * through the WolframLibraryData built by runtime.c.
+ */
+#ifndef WOLFRAMLIBRARY_H
+#define WOLFRAMLIBRARY_H
+
+#include <stdint.h>
+
+#define WolframLibraryVersion 6
+#define DLLEXPORT __attribute__((visibility("default")))
+
+typedef int64_t mint;
+typedef uint64_t umint;
+typedef double mreal;
+typedef int mbool;
+typedef struct {mreal ri[2];} mcomplex;
+
+#define mcreal(mc) (((mc).ri)[0])
+#define mcimag(mc) (((mc).ri)[1])
+
+#define LIBRARY_NO_ERROR 0
+#define LIBRARY_FUNCTION_ERROR 1
+#define LIBRARY_TYPE_ERROR 2
+#define LIBRARY_RANK_ERROR 3
+#define LIBRARY_DIMENSION_ERROR 4
+#define LIBRARY_NUMERICAL_ERROR 5
+#define LIBRARY_MEMORY_ERROR 6
+
+#define MType_Integer 2
+#define MType_Real 3
+#define MType_Complex 4
+
+typedef struct st_MTensor *MTensor;
+typedef struct st_MNumericArray *MNumericArray;
+typedef struct st_MSparseArray *MSparseArray;
+
+typedef union {
+    mbool *boolean;
+    mint *integer;
+    mreal *real;
+    mcomplex *cmplex;
+    MTensor *tensor;
+    MSparseArray *sparse;
+    MNumericArray *numeric;
+    void **voidp;
+    char **utf8string;
+} MArgument;
+
+#define MArgument_getBoolean(a) (*((a).boolean))
+#define MArgument_getInteger(a) (*((a).integer))
+#define MArgument_getReal(a) (*((a).real))
+#define MArgument_getComplex(a) (*((a).cmplex))
+#define MArgument_getMTensor(a) (*((a).tensor))
+#define MArgument_getUTF8String(a) (*((a).utf8string))
+#define MArgument_setBoolean(a, v) (*((a).boolean) = (v))
+#define MArgument_setInteger(a, v) (*((a).integer) = (v))
+#define MArgument_setReal(a, v) (*((a).real) = (v))
+#define MArgument_setComplex(a, v) (*((a).cmplex) = (v))
+#define MArgument_setMTensor(a, v) (*((a).tensor) = (v))
+
+typedef struct st_WolframLibraryData *WolframLibraryData;
+
+struct st_WolframLibraryData {
+    void (*UTF8String_disown)(char *);
+    int (*MTensor_new)(mint, mint, const mint *, MTensor *);
+    void (*MTensor_free)(MTensor);
+    void (*MTensor_disown)(MTensor);
+    void (*MTensor_disownAll)(MTensor);
+    mint (*MTensor_getRank)(MTensor);
+    const mint *(*MTensor_getDimensions)(MTensor);
+    mint (*MTensor_getFlattenedLength)(MTensor);
+    mint *(*MTensor_getIntegerData)(MTensor);
+    mreal *(*MTensor_getRealData)(MTensor);
+    mcomplex *(*MTensor_getComplexData)(MTensor);
+    void *numericarrayLibraryFunctions;
+    void *sparseLibraryFunctions;
+    void *ioLibraryFunctions;
+    int (*registerLibraryExpressionManager)(const char *, void (*)(WolframLibraryData, mbool, mint));
+    int (*unregisterLibraryExpressionManager)(const char *);
+};
+
+#endif
@@ -0,0 +1,96 @@
+/*
+ * Minimal implementation of the LibraryLink callbacks declared in the
+ * stand-in WolframLibrary.h. Tensors are flat malloc'ed buffers and the
+ * strings are owned by the caller. runtime_tensor and runtime_tensor_data
+ * let the tests build the tensors passed as arguments.
+ */
+#include <stdlib.h>
+#include "WolframLibrary.h"
+
+#define RUNTIME_MAX_RANK 8
+
+struct st_MTensor {
+    mint type;
+    mint rank;
+    mint dims[RUNTIME_MAX_RANK];
+    mint length;
+    void *data;
+};
+
+static void runtime_string_disown(char *string) {
+}
+
+static int runtime_tensor_new(mint type, mint rank, const mint *dims, MTensor *tensor) {
+    size_t size = type == MType_Complex ? sizeof(mcomplex) : sizeof(mint);
+    mint length = 1;
+    if(rank > RUNTIME_MAX_RANK) return LIBRARY_RANK_ERROR;
+    MTensor t = malloc(sizeof(struct st_MTensor));
+    if(t == NULL) return LIBRARY_MEMORY_ERROR;
+    for(mint i = 0; i < rank; ++i) {
+        t->dims[i] = dims[i];
+        length *= dims[i];
+    }
+    t->type = type;
+    t->rank = rank;
+    t->length = length;
+    t->data = calloc(length ? length : 1, size);
+    if(t->data == NULL) {
+        free(t);
+        return LIBRARY_MEMORY_ERROR;
+    }
+    *tensor = t;
+    return LIBRARY_NO_ERROR;
+}
+
+static void runtime_tensor_free(MTensor tensor) {
+    free(tensor->data);
+    free(tensor);
+}
+
+static void runtime_tensor_disown(MTensor tensor) {
+}
+
+static mint runtime_tensor_rank(MTensor tensor) {
+    return tensor->rank;
+}
+
+static const mint *runtime_tensor_dims(MTensor tensor) {
+    return tensor->dims;
+}
+
+static mint runtime_tensor_length(MTensor tensor) {
+    return tensor->length;
+}
+
+DLLEXPORT void *runtime_tensor_data(MTensor tensor) {
+    return tensor->data;
+}
+
+DLLEXPORT MTensor runtime_tensor(mint type, mint rank, const mint *dims) {
+    MTensor tensor = NULL;
+    runtime_tensor_new(type, rank, dims, &tensor);
+    return tensor;
+}
+
+static struct st_WolframLibraryData runtime_data = {
+    runtime_string_disown,
+    runtime_tensor_new,
+    runtime_tensor_free,
+    runtime_tensor_disown,
+    runtime_tensor_disown,
+    runtime_tensor_rank,
+    runtime_tensor_dims,
+    runtime_tensor_length,
+    (mint *(*)(MTensor)) runtime_tensor_data,
+    (mreal *(*)(MTensor)) runtime_tensor_data,
+    (mcomplex *(*)(MTensor)) runtime_tensor_data,
+    NULL,
+    NULL,
+    NULL,
+    NULL,
+    NULL,
+};
+
+DLLEXPORT WolframLibraryData runtime_library_data(void) {
+    return &runtime_data;
+}
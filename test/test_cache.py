@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from mathbind import cache
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict(os.environ, {'MATHBIND_CACHE_DIR': self.tmp.name})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def test_cache_dir(self):
+        self.assertEqual(cache.cache_dir(), self.tmp.name)
+        with mock.patch.dict(os.environ, {'MATHBIND_CACHE_DIR': '', 'XDG_CACHE_HOME': '/xdg'}):
+            self.assertEqual(cache.cache_dir(), '/xdg/mathbind')
+
+    def test_cache_key(self):
+        self.assertEqual(cache.cache_key('a', b'b', 1), cache.cache_key('a', b'b', 1))
+        self.assertNotEqual(cache.cache_key('ab', 'c'), cache.cache_key('a', 'bc'))
+        self.assertNotEqual(cache.cache_key(b'x'), cache.cache_key('x'))
+
+    def test_package_stamp(self):
+        stamp = cache.package_stamp()
+        self.assertIn('cache.py', [name for name, size, mtime in stamp])
+        self.assertIn(os.path.join('types', 'basictype.py'), [name for name, size, mtime in stamp])
+
+    def test_load_store(self):
+        key = cache.cache_key('value')
+        self.assertIsNone(cache.load('kind', key))
+        cache.store('kind', key, {'a': [1, 2]})
+        self.assertEqual(cache.load('kind', key), {'a': [1, 2]})
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, 'kind')), [key])
+
+        with open(os.path.join(self.tmp.name, 'kind', key), 'wb') as fp:
+            fp.write(b'truncated')
+        self.assertIsNone(cache.load('kind', key))
+
+    def test_store_failure(self):
+        with open(os.path.join(self.tmp.name, 'kind'), 'w'):
+            pass
+        # a file in the way of the directory
+        cache.store('kind', 'key', 1)
+        self.assertIsNone(cache.load('kind', 'key'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import unittest
+from mathbind.fortran import FortranBinding
+from mathbind.library import FunctionObject
+
+
+class TestFortranBinding(unittest.TestCase):
+    def test_kind(self):
+        self.assertEqual(FortranBinding.kind('double'), 'real(c_double)')
+        self.assertEqual(FortranBinding.kind('unsigned int'), 'integer(c_int)')
+        self.assertEqual(FortranBinding.kind('long long int'), 'integer(c_long_long)')
+        self.assertEqual(FortranBinding.kind('unsigned char'), 'integer(c_signed_char)')
+        self.assertEqual(FortranBinding.kind('float _Complex'), 'complex(c_float_complex)')
+        self.assertEqual(FortranBinding.kind('uint16_t'), 'integer(c_int16_t)')
+        with self.assertRaises(ValueError):
+            FortranBinding.kind('mint')
+
+    def test_function(self):
+        f = FunctionObject.from_str('double corner(const double a[m][n], int m, int n);')
+        s = (
+            "function corner_bind(a, m, n) bind(C, name='corner') result(return_value)\n"
+            "  use iso_c_binding\n"
+            "  implicit none\n"
+            "  integer(c_int), value :: m\n"
+            "  integer(c_int), value :: n\n"
+            "  real(c_double), intent(in) :: a(n, m)\n"
+            "  real(c_double) :: return_value\n"
+            "  interface\n"
+            "    function corner(a, m, n)\n"
+            "      import\n"
+            "      integer(c_int) :: m\n"
+            "      integer(c_int) :: n\n"
+            "      real(c_double), intent(in) :: a(n, m)\n"
+            "      real(c_double) :: corner\n"
+            "    end function corner\n"
+            "  end interface\n"
+            "  return_value = corner(a, m, n)\n"
+            "end function corner_bind\n"
+        )
+        self.assertEqual(FortranBinding(f).to_f90str('  '), s)
+
+    def test_subroutine(self):
+        f = FunctionObject.from_str('void scale(double a[][n], int n, double * s, out float y[n]);')
+        s = FortranBinding(f).to_f90str('  ')
+        self.assertTrue(s.startswith("subroutine scale_bind(a, n, s, y) bind(C, name='scale')\n"))
+        self.assertIn('  real(c_double) :: a(n, *)\n'
+                      '  real(c_double) :: s\n'
+                      '  real(c_float) :: y(*)\n', s)
+        self.assertTrue(s.endswith('  call scale(a, n, s, y)\n'
+                                   'end subroutine scale_bind\n'))
+
+    def test_long_arguments(self):
+        names = ['argument_number_%d' % i for i in range(8)]
+        f = FunctionObject.from_str('void f(' + ', '.join('int ' + n for n in names) + ');')
+        s = FortranBinding(f).to_f90str('  ')
+        self.assertIn('  call f(argument_number_0, argument_number_1, argument_number_2, argument_number_3, '
+                      'argument_number_4, argument_number_5, &\n'
+                      '    argument_number_6, argument_number_7)\n', s)
+
+    def test_long_statements(self):
+        # the whole statements are wrapped, the bind clause included
+        f = FunctionObject.from_str('double compute_the_weighted_moving_average_window(int number_of_samples, '
+                                    'int window_size, const double samples[number_of_samples], '
+                                    'double weights[window_size]);')
+        s = FortranBinding(f).to_f90str('    ')
+        self.assertTrue(s.startswith(
+            'function compute_the_weighted_moving_average_window_bind(number_of_samples, window_size, '
+            'samples, weights) &\n'
+            "    bind(C, name='compute_the_weighted_moving_average_window') result(return_value)\n"))
+        self.assertLessEqual(max(len(line) for line in s.splitlines()), FortranBinding.MAX_LINE_WIDTH)
+
+    def test_long_name(self):
+        FortranBinding(FunctionObject.from_str('void %s(int n);' % ('f' * 58)))
+        with self.assertRaisesRegex(ValueError, 'longer than 63 characters'):
+            FortranBinding(FunctionObject.from_str('void %s(int n);' % ('f' * 59)))
+
+    def test_errors(self):
+        for prototype in ['double * f(int n);',
+                          'void f(sparse double A);',
+                          'void f(double a[n][], int n);',
+                          'void f(double a[n][m], int n);']:
+            with self.assertRaises(ValueError):
+                FortranBinding(FunctionObject.from_str(prototype))
@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 
+import os
+import re
 import tempfile
 import unittest
+from unittest import mock
 from path import Path
 from mathbind.types import BasicValueType, VoidType, PointerType, ArrayType
+from mathbind.fortran import FortranBinding
 from mathbind.library import FunctionObject, LibraryObject
 
 
@@ -49,6 +53,21 @@ class TestFunctionObject(unittest.TestCase):
         func2 = FunctionObject.from_str('void myfunc(const double * web);')
         self.assertEqual(func2, func)
 
+        # qualified scalars are plain values, as the numeric arrays are not
+        self.assertEqual(FunctionObject.from_str('double f(const double x);').args,
+                         [BasicValueType('const double')])
+        self.assertEqual(FunctionObject.from_str('float g(volatile double x, const float y);').args,
+                         [BasicValueType('volatile double'), BasicValueType('const float')])
+
+    def test_name_of(self):
+        func = FunctionObject.from_str('int spiderman(double web);')
+        self.assertEqual(FunctionObject.name_of(func), 'spiderman')
+        self.assertEqual(FunctionObject.name_of('const double * f (int n);'), 'f')
+        self.assertEqual(FunctionObject.name_of({'prototype': 'void g(void);', 'tags': ['x']}), 'g')
+        self.assertEqual(FunctionObject.name_of({'name': 'h', 'return': 'void', 'args': []}), 'h')
+        self.assertEqual(FunctionObject.tags_of({'prototype': 'void g(void);', 'tags': ['x']}), ['x'])
+        self.assertEqual(FunctionObject.tags_of('void g(void);'), [])
+
     def test_math_load(self):
         f1 = FunctionObject.from_str('int myfunc(double arg);')
         s1 = 'myfuncSuf = LibraryFunctionLoad["trololo", "math_myfuncSuf", {Real}, Integer];\n'
@@ -133,6 +152,459 @@ class TestFunctionObject(unittest.TestCase):
         )
         self.assertEqual(f6.math_str('trololo', '\t', 'Gen'), s6)
 
+    def test_from_str_const_array(self):
+        f = FunctionObject.from_str('void myfunc(const double arg[3]);')
+        self.assertEqual(f.args, [ArrayType.from_str('const double [3]')])
+
+    def test_out_array(self):
+        f = FunctionObject.from_str('void fill(int n, out double res[n]);')
+        self.assertEqual(f.inputs(), [('n', BasicValueType('int'))])
+        self.assertEqual(f.result_type, ArrayType.from_str('out double [n]'))
+        self.assertEqual(f.math_load('lib', 'Gen'),
+                         'fillGen = LibraryFunctionLoad["lib", "math_fillGen", {Integer}, {Real, 1}];\n')
+
+        res = f.args[1]
+        supposed = (
+            'DLLEXPORT int math_fillGen(WolframLibraryData libDataGen, mint ArgcGen, MArgument *ArgsGen, MArgument ResGen) {\n'
+            '    int errorGen = LIBRARY_NO_ERROR;\n'
+            '    int n = MArgument_getInteger(ArgsGen[0]);\n' +
+            res.retrieve_cstr('res', None, '    ', 'Gen') +
+            '    fill(n, res);\n'
+            'cleanup_resGen:\n' +
+            res.after_cstr('res', '    ', 'Gen') +
+            'cleanupGen:\n'
+            '    return errorGen;\n'
+            '}')
+        self.assertEqual(f.func_str('    ', 'Gen'), supposed)
+
+        s = f.math_load('trololo', 'Gen') + (
+            'fill[n_] := Module[{returnGen, nGen},\n'
+            '\tnGen = n;\n'
+            '\treturnGen = fillGen[nGen];\n'
+            '\t{returnGen}\n'
+            ']\n'
+        )
+        self.assertEqual(f.math_str('trololo', '\t', 'Gen'), s)
+
+    def test_derived_size(self):
+        f = FunctionObject.from_str('double norm(int n, const double x[n]);')
+        x = f.args[1]
+        self.assertEqual(f.derived_sizes(), {'n': ('x', x)})
+        self.assertEqual(f.inputs(), [('x', x)])
+        supposed = (
+            'DLLEXPORT int math_normGen(WolframLibraryData libDataGen, mint ArgcGen, MArgument *ArgsGen, MArgument ResGen) {\n'
+            '    int errorGen = LIBRARY_NO_ERROR;\n' +
+            x.retrieve_cstr('x', 0, '    ', 'Gen') +
+            '    int n = (int) length_xGen;\n'
+            '    if((mint) n != length_xGen) {\n'
+            '        errorGen = LIBRARY_DIMENSION_ERROR;\n'
+            '        goto cleanup_xGen;\n'
+            '    }\n'
+            '    double return_valueGen = norm(n, x);\n'
+            '    MArgument_setReal(ResGen, return_valueGen);\n'
+            'cleanup_xGen:\n' +
+            x.after_cstr('x', '    ', 'Gen') +
+            '    return errorGen;\n'
+            '}')
+        self.assertEqual(f.func_str('    ', 'Gen'), supposed)
+
+        s = f.math_load('trololo', 'Gen') + (
+            'norm[x_] := Module[{returnGen, xGen},\n' +
+            x.before_mathstr('x', '\t', 'Gen') +
+            '\treturnGen = normGen[xGen];\n'
+            '\t{returnGen}\n'
+            ']\n'
+        )
+        self.assertEqual(f.math_str('trololo', '\t', 'Gen'), s)
+
+    def test_derived_size_out_array(self):
+        f = FunctionObject.from_str('void scale(int n, const double x[n], out double y[n]);')
+        self.assertEqual(f.inputs(), [('x', f.args[1])])
+        code = f.func_str('    ', 'Gen')
+        self.assertLess(code.index('int n = (int) length_xGen;'),
+                        code.index('mint dims_yGen[1] = {n};'))
+
+    def test_shared_derived_size(self):
+        # the size is taken from the first array, the others must match it
+        f = FunctionObject.from_str('void axpy(const double x[n], double y[n], int n, const double a[n][n]);')
+        x, y, _, a = f.args
+        self.assertEqual(f.derived_sizes(), {'n': ('x', x)})
+        check = ('    if({} != {}) {{\n'
+                 '        errorGen = LIBRARY_DIMENSION_ERROR;\n'
+                 '        goto cleanup_aGen;\n'
+                 '    }}\n').format
+        self.assertIn('    int n = (int) length_xGen;\n' +
+                      check('(mint) n', 'length_xGen') +
+                      check('length_yGen', '(mint) n') +
+                      check('dims_aGen[0]', '(mint) n') +
+                      check('dims_aGen[1]', '(mint) n') +
+                      '    axpy(x, y, n, a);\n', f.func_str('    ', 'Gen'))
+
+    def test_numeric_array(self):
+        f = FunctionObject.from_str('float mean(int n, const numeric float x[n]);')
+        x = f.args[1]
+        self.assertEqual(f.derived_sizes(), {'n': ('x', x)})
+        self.assertEqual(f.includes(), ['<stdint.h>', '"WolframNumericArrayLibrary.h"'])
+        self.assertEqual(f.prototype_cstr(), 'float mean(int n, const float * x);\n')
+        self.assertEqual(f.math_load('lib', 'Gen'),
+                         'meanGen = LibraryFunctionLoad["lib", "math_meanGen", '
+                         '{{LibraryDataType[NumericArray, "Real32", 1], "Shared"}}, Real];\n')
+        supposed = (
+            'DLLEXPORT int math_meanGen(WolframLibraryData libDataGen, mint ArgcGen, MArgument *ArgsGen, MArgument ResGen) {\n'
+            '    int errorGen = LIBRARY_NO_ERROR;\n' +
+            x.retrieve_cstr('x', 0, '    ', 'Gen') +
+            '    int n = (int) length_xGen;\n'
+            '    if((mint) n != length_xGen) {\n'
+            '        errorGen = LIBRARY_DIMENSION_ERROR;\n'
+            '        goto cleanup_xGen;\n'
+            '    }\n'
+            '    float return_valueGen = mean(n, x);\n'
+            '    MArgument_setReal(ResGen, return_valueGen);\n'
+            'cleanup_xGen:\n' +
+            x.after_cstr('x', '    ', 'Gen') +
+            '    return errorGen;\n'
+            '}')
+        self.assertEqual(f.func_str('    ', 'Gen'), supposed)
+
+    def test_complex(self):
+        f = FunctionObject.from_str('double complex f(double complex x[n], int n, float complex * z);')
+        self.assertEqual(f.includes(), ['<complex.h>'])
+        self.assertEqual(f.math_load('lib', 'Gen'),
+                         'fGen = LibraryFunctionLoad["lib", "math_fGen", '
+                         '{{Complex, 1, "Shared"}, {Complex, 1, "Shared"}}, Complex];\n')
+        with self.assertRaises(ValueError):
+            FunctionObject.from_str('void f(double complex * z);', {'pack_outputs': True})
+
+    def test_sparse_array(self):
+        f = FunctionObject.from_str('void scale(sparse double A, double k);')
+        self.assertEqual(f.includes(), ['"WolframSparseLibrary.h"'])
+        self.assertEqual(f.prototype_cstr(),
+                         'void scale(mint A_rows, mint A_cols, const mint * A_row_pointers, '
+                         'const mint * A_column_indices, mreal * A_values, double k);\n')
+        self.assertIn('    scale(A_rows, A_cols, A_row_pointers, A_column_indices, A_values, k);\n',
+                      f.func_str('    ', 'Gen'))
+        self.assertTrue(f.math_str('lib', '\t', 'Gen').endswith('\t{AGen}\n]\n'))
+        # the background is made 0 before the call, and checked by the wrapper
+        self.assertIn('\tAGen = SparseArray[N[A], Dimensions[A], 0];\n', f.math_str('lib', '\t', 'Gen'))
+        self.assertIn('        errorGen = LIBRARY_TYPE_ERROR;\n'
+                      '        goto cleanup_AGen;\n', f.func_str('    ', 'Gen'))
+
+    def test_mapped_array(self):
+        f = FunctionObject.from_str('double sum(const mapped double x[n], int n, double k);')
+        x = f.args[0]
+        self.assertEqual(f.derived_sizes(), {'n': ('x', x)})
+        self.assertIn('<sys/mman.h>', f.includes())
+        self.assertEqual(f.prototype_cstr(), 'double sum(const double * x, int n, double k);\n')
+        self.assertEqual(f.math_load('lib', 'Gen'),
+                         'sumGen = LibraryFunctionLoad["lib", "math_sumGen", '
+                         '{"UTF8String", Integer, Integer, Real}, Real];\n')
+        s = f.func_str('    ', 'Gen')
+        # the file is mapped after the other inputs, and unmapped on errors
+        self.assertIn('    double k = MArgument_getReal(ArgsGen[3]);\n' +
+                      x.retrieve_cstr('x', 0, '    ', 'Gen') +
+                      '    int n = (int) length_xGen;\n'
+                      '    if((mint) n != length_xGen) {\n'
+                      '        errorGen = LIBRARY_DIMENSION_ERROR;\n'
+                      '        goto cleanup_xGen;\n'
+                      '    }\n', s)
+        self.assertTrue(s.endswith('cleanup_xGen:\n' +
+                                   x.after_cstr('x', '    ', 'Gen') +
+                                   'cleanupGen:\n'
+                                   '    return errorGen;\n'
+                                   '}'))
+        self.assertIn('\treturnGen = sumGen[Sequence @@ xGen, kGen];\n', f.math_str('lib', '\t', 'Gen'))
+
+        f = FunctionObject.from_str('void copy(const mapped double x[n], int n, mapped float y[], '
+                                    'out double z[n]);')
+        x, _, y, z = f.args
+        s = f.func_str('    ', 'Gen')
+        # every argument jumps to the cleanup of those retrieved before it
+        self.assertIn(y.retrieve_cstr('y', 3, '    ', 'Gen', 'cleanup_xGen'), s)
+        self.assertIn(z.retrieve_cstr('z', None, '    ', 'Gen', 'cleanup_yGen'), s)
+        self.assertIn('    copy(x, n, y, z);\n'
+                      'cleanup_zGen:\n' +
+                      z.after_cstr('z', '    ', 'Gen') +
+                      'cleanup_yGen:\n' +
+                      y.after_cstr('y', '    ', 'Gen') +
+                      'cleanup_xGen:\n' +
+                      x.after_cstr('x', '    ', 'Gen') +
+                      'cleanupGen:\n'
+                      '    return errorGen;\n', s)
+
+    def test_tensor(self):
+        f = FunctionObject.from_str('double corner(const double a[m][n], int m, int n);')
+        a = f.args[0]
+        self.assertEqual(f.derived_sizes(), {'m': ('a', a), 'n': ('a', a)})
+        self.assertEqual(f.inputs(), [('a', a)])
+        self.assertEqual(f.prototype_cstr(), 'double corner(const double * a, int m, int n);\n')
+        self.assertIn(a.retrieve_cstr('a', 0, '    ', 'Gen') +
+                      '    int m = (int) dims_aGen[0];\n'
+                      '    if((mint) m != dims_aGen[0]) {\n'
+                      '        errorGen = LIBRARY_DIMENSION_ERROR;\n'
+                      '        goto cleanup_aGen;\n'
+                      '    }\n'
+                      '    int n = (int) dims_aGen[1];\n'
+                      '    if((mint) n != dims_aGen[1]) {\n'
+                      '        errorGen = LIBRARY_DIMENSION_ERROR;\n'
+                      '        goto cleanup_aGen;\n'
+                      '    }\n'
+                      '    double return_valueGen = corner(a, m, n);\n', f.func_str('    ', 'Gen'))
+        self.assertEqual(f.math_load('lib', 'Gen'),
+                         'cornerGen = LibraryFunctionLoad["lib", "math_cornerGen", {{Real, 2, "Shared"}}, Real];\n')
+
+    def test_managed_constructor(self):
+        f = FunctionObject.from_str('managed Plan plan_new(int n);')
+        self.assertEqual(f.prototype_cstr(), 'Plan * plan_new(int n);\n')
+        self.assertEqual(f.math_load('lib', 'Gen'),
+                         'plannewGen = LibraryFunctionLoad["lib", "math_plan_newGen", {Integer, Integer}, "Void"];\n')
+        s = f.math_load('lib', 'Gen') + (
+            'plannew[n_] := Module[{returnGen, nGen},\n'
+            '\tnGen = n;\n'
+            '\treturnGen = CreateManagedLibraryExpression["Plan", Plan];\n'
+            '\tplannewGen[nGen, ManagedLibraryExpressionID[returnGen]];\n'
+            '\t{returnGen}\n'
+            ']\n'
+        )
+        self.assertEqual(f.math_str('lib', '\t', 'Gen'), s)
+
+        g = FunctionObject.from_str('managed Plan plan_default(void);')
+        self.assertEqual(g.args, [])
+        self.assertEqual(g.math_load('lib', 'Gen'),
+                         'plandefaultGen = LibraryFunctionLoad["lib", "math_plan_defaultGen", {Integer}, "Void"];\n')
+
+    def test_asynchronous(self):
+        f = FunctionObject.from_dict({'prototype': 'double simulate(double x, int n);', 'asynchronous': True})
+        self.assertEqual(f.includes(), ['"WolframIOLibraryFunctions.h"'])
+        self.assertEqual(f.math_load('lib', 'Gen'),
+                         'simulateGen = LibraryFunctionLoad["lib", "math_simulateGen", {Real, Integer}, Integer];\n')
+        supposed = (
+            'typedef struct {\n'
+            '    WolframLibraryData libData;\n'
+            '    double x;\n'
+            '    int n;\n'
+            '} task_simulateGen;\n'
+            'static void math_simulate_taskGen(mint idGen, void * dataGen) {\n'
+            '    task_simulateGen argsGen = * (task_simulateGen *) dataGen;\n'
+            '    free(dataGen);\n'
+            '    double return_valueGen = simulate(argsGen.x, argsGen.n);\n'
+            '    DataStore storeGen = argsGen.libData->ioLibraryFunctions->createDataStore();\n'
+            '    argsGen.libData->ioLibraryFunctions->DataStore_addReal(storeGen, return_valueGen);\n'
+            '    argsGen.libData->ioLibraryFunctions->raiseAsyncEvent(idGen, "Result", storeGen);\n'
+            '}\n'
+            'DLLEXPORT int math_simulateGen(WolframLibraryData libDataGen, mint ArgcGen, MArgument *ArgsGen, MArgument ResGen) {\n'
+            '    double x = MArgument_getReal(ArgsGen[0]);\n'
+            '    int n = MArgument_getInteger(ArgsGen[1]);\n'
+            '    task_simulateGen * taskGen = malloc(sizeof(task_simulateGen));\n'
+            '    if(taskGen == NULL) return LIBRARY_MEMORY_ERROR;\n'
+            '    taskGen->libData = libDataGen;\n'
+            '    taskGen->x = x;\n'
+            '    taskGen->n = n;\n'
+            '    mint task_idGen = libDataGen->ioLibraryFunctions->createAsynchronousTaskWithThread('
+            'math_simulate_taskGen, taskGen);\n'
+            '    MArgument_setInteger(ResGen, task_idGen);\n'
+            '    return LIBRARY_NO_ERROR;\n'
+            '}')
+        self.assertEqual(f.func_str('    ', 'Gen'), supposed)
+
+        s = f.math_load('lib', 'Gen') + (
+            'simulate[x_, n_, handler_] := Module[{xGen, nGen},\n'
+            '\txGen = x;\n'
+            '\tnGen = n;\n'
+            '\tInternal`CreateAsynchronousTask[simulateGen, {xGen, nGen}, handler @@ #3 &]\n'
+            ']\n'
+        )
+        self.assertEqual(f.math_str('lib', '\t', 'Gen'), s)
+
+        g = FunctionObject.from_str('void warm(void);', {'asynchronous': True})
+        self.assertIn('    warm();\n', g.func_str('    ', 'Gen'))
+        self.assertNotIn('DataStore_add', g.func_str('    ', 'Gen'))
+
+        with self.assertRaises(ValueError):
+            FunctionObject.from_str('void f(double x[]);', {'asynchronous': True})
+        with self.assertRaises(ValueError):
+            FunctionObject.from_str('double complex f(double x);', {'asynchronous': True})
+
+    def test_memoize(self):
+        f = FunctionObject.from_dict({'prototype': 'double bessel(int n, double x);', 'memoize': True})
+        self.assertEqual(f.memo_capacity, FunctionObject.MEMO_CAPACITY)
+        self.assertEqual(FunctionObject.from_str('int f(int x);', {'memoize': 10}).memo_capacity, 12)
+        self.assertEqual(f.includes(), ['<string.h>'])
+
+        code = f.func_str('    ', 'Gen')
+        self.assertIn('static memo_entry_besselGen memo_besselGen[1024];\n', code)
+        self.assertIn('DLLEXPORT int math_bessel_memo_statsGen(', code)
+        self.assertIn('    keyGen.n = n;\n'
+                      '    keyGen.x = x;\n', code)
+        self.assertIn('memo_besselGen + (hashGen % 256) * 4;\n', code)
+        self.assertIn('        entryGen->value = bessel(n, x);\n', code)
+        self.assertTrue(code.endswith(
+            '    entryGen->stamp = ++memo_clock_besselGen;\n'
+            '    double return_valueGen = entryGen->value;\n'
+            '    MArgument_setReal(ResGen, return_valueGen);\n'
+            '    return LIBRARY_NO_ERROR;\n'
+            '}'))
+        self.assertTrue(f.math_str('lib', '\t', 'Gen').endswith(
+            'besselMemoStatsGen = LibraryFunctionLoad["lib", "math_bessel_memo_statsGen", {}, {Integer, 1}];\n'
+            'besselMemoStats[] := AssociationThread[{"Hits", "Misses", "Capacity"}, besselMemoStatsGen[]]\n'))
+
+        with self.assertRaises(ValueError):
+            FunctionObject.from_str('double f(double x[]);', {'memoize': True})
+        with self.assertRaises(ValueError):
+            FunctionObject.from_str('void f(double x);', {'memoize': True})
+
+    def test_chunked(self):
+        f = FunctionObject.from_dict({'prototype': 'void scale(const double x[n], int n, double k, out double y[n]);',
+                                      'chunked': 1000})
+        self.assertEqual(f.chunk_size, 1000)
+        self.assertEqual(FunctionObject.from_str('void f(int x[]);', {'chunked': True}).chunk_size,
+                         FunctionObject.CHUNK_SIZE)
+        self.assertEqual(f.chunked_arrays(), [('x', f.args[0])])
+        # the C side is unchanged, the length comes from each chunk
+        self.assertEqual(f.func_str('    ', 'Gen'), FunctionObject.from_str(
+            'void scale(const double x[n], int n, double k, out double y[n]);').func_str('    ', 'Gen'))
+        s = f.math_load('lib', 'Gen') + (
+            'scale[x_, k_] := Module[{returnGen, xGen, kGen, lengthGen, startGen, endGen, returnChunksGen},\n'
+            '\tkGen = k;\n'
+            '\tlengthGen = Length[x];\n'
+            '\treturnChunksGen = ConstantArray[0., lengthGen];\n'
+            '\tDo[\n'
+            '\t\tendGen = Min[startGen + 1000 - 1, lengthGen];\n'
+            '\t\txGen = Developer`ToPackedArray[Map[N, x[[startGen ;; endGen]]]];\n'
+            '\t\treturnGen = scaleGen[xGen, kGen];\n'
+            '\t\treturnChunksGen[[startGen ;; endGen]] = returnGen;\n'
+            '\t, {startGen, 1, lengthGen, 1000}];\n'
+            '\t{returnChunksGen}\n'
+            ']\n'
+        )
+        self.assertEqual(f.math_str('lib', '\t', 'Gen'), s)
+
+        g = FunctionObject.from_str('int count(int x[]);', {'chunked': 10})
+        code = g.math_str('lib', '\t', 'Gen')
+        self.assertIn('\treturnChunksGen = ConstantArray[0, Ceiling[lengthGen / 10]];\n'
+                      '\txChunksGen = ConstantArray[0, lengthGen];\n', code)
+        self.assertIn('\t\treturnChunksGen[[Quotient[startGen - 1, 10] + 1]] = returnGen;\n'
+                      '\t\txChunksGen[[startGen ;; endGen]] = xGen;\n', code)
+
+        with self.assertRaises(ValueError):
+            FunctionObject.from_str('double f(double x);', {'chunked': True})
+        with self.assertRaises(ValueError):
+            FunctionObject.from_str('void f(double x[3]);', {'chunked': True})
+        with self.assertRaises(ValueError):
+            FunctionObject.from_str('void f(double x[], double * m);', {'chunked': True})
+        with self.assertRaises(ValueError):
+            FunctionObject.from_str('void f(double x[n], int n, int m, out double y[m]);', {'chunked': True})
+
+    def test_fixed_size_not_derived(self):
+        f = FunctionObject.from_str('void f(int n, const double x[3], double * m);')
+        self.assertEqual(f.derived_sizes(), {})
+        self.assertEqual([name for name, _ in f.inputs()], ['n', 'x', 'm'])
+
+    def test_array_return(self):
+        f = FunctionObject.from_dict({'name': 'linspace', 'return': 'double [n]', 'ownership': 'adopt',
+                                      'args': [{'name': 'n', 'type': 'int'}]})
+        self.assertEqual(f.return_type, ArrayType.from_str('double [n]').with_ownership('adopt'))
+        self.assertEqual(f.prototype_cstr(), 'double * linspace(int n);\n')
+        self.assertEqual(f.math_load('lib', 'Gen'),
+                         'linspaceGen = LibraryFunctionLoad["lib", "math_linspaceGen", {Integer}, {Real, 1}];\n')
+        self.assertIn(f.return_type.return_cstr('linspace(n)', '    ', 'Gen'), f.func_str('    ', 'Gen'))
+        self.assertEqual(FunctionObject.from_str('double [n] linspace(int n);').return_type,
+                         ArrayType.from_str('double [n]'))
+
+        with self.assertRaises(ValueError):
+            FunctionObject.from_dict({'name': 'f', 'return': 'int', 'ownership': 'adopt', 'args': []})
+        with self.assertRaises(ValueError):
+            FunctionObject.from_str('double [] f(int n);')
+
+    def test_packed_outputs(self):
+        f = FunctionObject.from_dict({'prototype': 'int stats(const double x[3], double * mean, long * count);',
+                                      'pack_outputs': True})
+        x = f.args[0]
+        self.assertEqual(f.packed_outputs(), [('mean', f.args[1]), ('count', f.args[2])])
+        self.assertEqual(f.inputs(), [('x', x)])
+        self.assertEqual(f.math_load('lib', 'Gen'),
+                         'statsGen = LibraryFunctionLoad["lib", "math_statsGen", {{Real, 1, "Shared"}}, {Real, 1}];\n')
+        supposed = (
+            'DLLEXPORT int math_statsGen(WolframLibraryData libDataGen, mint ArgcGen, MArgument *ArgsGen, MArgument ResGen) {\n'
+            '    int errorGen = LIBRARY_NO_ERROR;\n' +
+            x.retrieve_cstr('x', 0, '    ', 'Gen') +
+            '    double mean = 0;\n'
+            '    long count = 0;\n'
+            '    int return_valueGen = stats(x, &mean, &count);\n'
+            '    /* Packing the outputs */\n'
+            '    MTensor packed_mtensorGen;\n'
+            '    mint packed_dimsGen[1] = {3};\n'
+            '    errorGen = libDataGen->MTensor_new(MType_Real, 1, packed_dimsGen, &packed_mtensorGen);\n'
+            '    if(errorGen) goto cleanup_xGen;\n'
+            '    mreal * packed_dataGen = libDataGen->MTensor_getRealData(packed_mtensorGen);\n'
+            '    packed_dataGen[0] = return_valueGen;\n'
+            '    packed_dataGen[1] = mean;\n'
+            '    packed_dataGen[2] = count;\n'
+            '    MArgument_setMTensor(ResGen, packed_mtensorGen);\n'
+            'cleanup_xGen:\n' +
+            x.after_cstr('x', '    ', 'Gen') +
+            '    return errorGen;\n'
+            '}')
+        self.assertEqual(f.func_str('    ', 'Gen'), supposed)
+
+        s = f.math_load('trololo', 'Gen') + (
+            'stats[x_] := Module[{returnGen, xGen},\n' +
+            x.before_mathstr('x', '\t', 'Gen') +
+            '\treturnGen = statsGen[xGen];\n'
+            '\treturnGen\n'
+            ']\n'
+        )
+        self.assertEqual(f.math_str('trololo', '\t', 'Gen'), s)
+
+    def test_packed_outputs_integer(self):
+        f = FunctionObject.from_str('void minmax(int a, int b, int * lo, int * hi);', {'pack_outputs': True})
+        self.assertEqual(f.result_type.math_return_name, '{Integer, 1}')
+        self.assertIn('    int lo = 0;\n', f.func_str('    ', 'Gen'))
+        self.assertIn('    minmax(a, b, &lo, &hi);\n', f.func_str('    ', 'Gen'))
+        self.assertIn('\treturnGen\n', f.math_str('lib', '\t', 'Gen'))
+
+        for prototype in ('void f(int * a, out double b[3]);', 'int [3] f(int * a);'):
+            FunctionObject.from_str(prototype)
+            with self.assertRaisesRegex(ValueError, 'Packed outputs can not be combined'):
+                FunctionObject.from_str(prototype, {'pack_outputs': True})
+
+        g = FunctionObject.from_str('void minmax(int a, int b, int * lo, int * hi);')
+        self.assertEqual(g.packed_outputs(), [])
+        self.assertNotEqual(f, g)
+
+    def test_routine(self):
+        f = FunctionObject.from_str('double f(double x, int n);')
+        code = f.routine_cstr('shared', '    ', 'Gen')
+        self.assertTrue(code.startswith(
+            'typedef double (*shared_function)(double x, int n);\n'
+            'static int shared(shared_function functionGen, WolframLibraryData libDataGen, '
+            'mint ArgcGen, MArgument *ArgsGen, MArgument ResGen) {\n'))
+        self.assertIn('    double return_valueGen = functionGen(x, n);\n', code)
+        self.assertEqual(f.dispatch_cstr('shared', '    ', 'Gen'),
+                         f.func_str('    ', 'Gen').partition('\n')[0] + '\n'
+                         '    return shared(f, libDataGen, ArgcGen, ArgsGen, ResGen);\n'
+                         '}')
+        self.assertEqual(f.math_routine('shared', '    ', 'Gen'),
+                         'shared[functionGen_, x_, n_] := Module[{returnGen, xGen, nGen},\n'
+                         '    xGen = x;\n'
+                         '    nGen = n;\n'
+                         '    returnGen = functionGen[xGen, nGen];\n'
+                         '    {returnGen}\n'
+                         ']\n')
+        self.assertEqual(f.math_str('lib', '    ', 'Gen', 'shared'),
+                         f.math_load('lib', 'Gen') + 'f[x_, n_] := shared[fGen, x, n]\n')
+
+        # the functions keeping state of their own have no shared routine
+        self.assertIsNone(FunctionObject.from_str('double f(double x);', {'memoize': True})
+                          .routine_cstr('shared'))
+        self.assertIsNone(FunctionObject.from_str('double f(double x);', {'asynchronous': True})
+                          .math_routine('shared'))
+
+    def test_out_array_errors(self):
+        with self.assertRaises(ValueError):
+            FunctionObject.from_str('int fill(int n, out double res[n]);')
+        with self.assertRaises(ValueError):
+            FunctionObject.from_str('void fill(int n, out double a[n], out double b[n]);')
+
 
 class TestLibraryObject(unittest.TestCase):
     def setUp(self):
@@ -145,6 +617,8 @@ class TestLibraryObject(unittest.TestCase):
         })
 
         self.temp1 = Path(tempfile.mkdtemp())
+        self.env = mock.patch.dict(os.environ, {'MATHBIND_CACHE_DIR': self.temp1.joinpath('cache')})
+        self.env.start()
         self.file2 = self.temp1.joinpath('def2.json')
         int_t = BasicValueType.from_str('int')
         f2 = FunctionObject('foo', int_t, ['bar'], [double_t])
@@ -165,13 +639,303 @@ class TestLibraryObject(unittest.TestCase):
             ''')
 
     def tearDown(self):
+        self.env.stop()
         self.temp1.rmtree()
 
     def test_properties(self):
         lib2 = LibraryObject.from_file(self.file2)
         self.assertEqual(lib2, self.lib2)
 
+    def test_from_file_cached(self):
+        lib2 = LibraryObject.from_file(self.file2, flags='-O2')
+        with mock.patch.object(FunctionObject, 'from_obj', side_effect=AssertionError('parsed')):
+            cached = LibraryObject.from_file(self.file2, flags='-O2')
+            with self.assertRaises(AssertionError):
+                LibraryObject.from_file(self.file2, cached=False)
+            with self.assertRaises(AssertionError):
+                LibraryObject.from_file(self.file2, flags='-O3')
+        self.assertEqual(cached, lib2)
+        self.assertIsNot(cached, lib2)
+        self.assertIs(cached.functions[0].args[0], BasicValueType.from_str('double'))
+        self.assertEqual(cached.to_cstr(), lib2.to_cstr())
+
+        with open(self.file2, 'w') as fp:
+            fp.write('{"functions": ["int foo(double bar, int baz);"]}')
+        self.assertEqual(LibraryObject.from_file(self.file2, flags='-O2').functions[0].argnames,
+                         ['bar', 'baz'])
+
+
+
+    def test_pack_outputs_default(self):
+        lib = LibraryObject({'name': 'lib', 'pack_outputs': True,
+                             'functions': ['void f(int * a);',
+                                           {'prototype': 'void g(int * a);', 'pack_outputs': False}]})
+        self.assertEqual([f.pack_outputs for f in lib.functions], [True, False])
+
+    def test_to_cstr_includes(self):
+        lib = LibraryObject({'name': 'lib', 'functions': [
+            'void f(numeric float x[]);', 'void g(numeric uint8_t x[], int y);', 'int h(double z);']})
+        code = lib.to_cstr()
+        self.assertEqual(code.count('#include "WolframNumericArrayLibrary.h"\n'), 1)
+        self.assertLess(code.index('#include "WolframLibrary.h"'), code.index('#include <stdint.h>'))
+        self.assertNotIn('<stdint.h>', self.lib1.to_cstr())
+
+    def test_to_cstr_helpers(self):
+        lib = LibraryObject({'name': 'lib', 'functions': [
+            'void f(int n, const int x[n], out int y[n]);', 'int g(int x[3], double y[]);', 'int h(double z);']})
+        int_helpers = ArrayType.from_str('int []').helpers
+        double_helpers = ArrayType.from_str('double []').helpers
+        self.assertEqual(lib.functions[0].helpers(), list(int_helpers))
+        self.assertEqual(lib.functions[2].helpers(), [])
+        code = lib.to_cstr()
+        for helper in int_helpers + double_helpers:
+            self.assertEqual(code.count(helper), 1)
+            self.assertLess(code.index(helper), code.index('DLLEXPORT'))
+        # each shard defines the helpers its functions call, so none is unused
+        shards = lib.to_cstr_shards(3)
+        self.assertEqual([sum(shard.count(helper) for helper in int_helpers + double_helpers)
+                          for shard in shards], [3, 6, 0])
+
+        lib = LibraryObject({'name': 'lib', 'functions': [
+            {'name': 'f', 'return': 'int [n]', 'args': [{'name': 'n', 'type': 'int'}]}]})
+        self.assertEqual(lib.functions[0].helpers(), [int_helpers[1]])
+        self.assertNotIn(int_helpers[0], lib.to_cstr())
+
+    def test_managed_objects(self):
+        lib = LibraryObject({'name': 'lib', 'objects': [{'name': 'Plan', 'destructor': 'plan_free'}],
+                             'functions': ['managed Plan plan_new(int n);',
+                                           'double plan_run(managed Plan p, double x);']})
+        code = lib.to_cstr()
+        self.assertIn(lib.objects[0].prelude_cstr(), code)
+        self.assertIn('DLLEXPORT int WolframLibrary_initialize(WolframLibraryData libData) {\n' +
+                      lib.objects[0].register_cstr() + '    return 0;\n}\n', code)
+        self.assertIn('DLLEXPORT void WolframLibrary_uninitialize(WolframLibraryData libData) {\n' +
+                      lib.objects[0].unregister_cstr() + '}\n', code)
+
+        with self.assertRaises(ValueError):
+            LibraryObject({'name': 'lib', 'functions': ['managed Plan plan_new(int n);']})
+
+    def test_init_hooks(self):
+        lib = LibraryObject({'name': 'lib', 'init': 'tables_init', 'uninit': 'tables_free',
+                             'functions': ['double f(double x);']})
+        code = lib.to_cstr()
+        self.assertIn('int tables_init(void);\n'
+                      'void tables_free(void);\n'
+                      'DLLEXPORT int WolframLibrary_initialize(WolframLibraryData libData) {\n'
+                      '    int init_error = tables_init();\n'
+                      '    if(init_error) return init_error;\n'
+                      '    return 0;\n'
+                      '}\n'
+                      'DLLEXPORT void WolframLibrary_uninitialize(WolframLibraryData libData) {\n'
+                      '    tables_free();\n'
+                      '}\n', code)
+
+        lib = LibraryObject({'name': 'lib', 'uninit': 'tables_free', 'functions': []})
+        self.assertIn('DLLEXPORT int WolframLibrary_initialize(WolframLibraryData libData) {\n'
+                      '    return 0;\n'
+                      '}\n', lib.to_cstr())
+        self.assertNotIn('init_error', lib.to_cstr())
+
+        # a failed registration undoes the previous ones and the init hook
+        lib = LibraryObject({'name': 'lib', 'init': 'tables_init', 'uninit': 'tables_free',
+                             'objects': [{'name': 'Plan', 'destructor': 'plan_free'},
+                                         {'name': 'Grid', 'destructor': 'grid_free'}],
+                             'functions': []})
+        self.assertIn('    if(init_error) return init_error;\n'
+                      '    if(libData->registerLibraryExpressionManager("Plan", manage_Plan)) {\n'
+                      '        tables_free();\n'
+                      '        return LIBRARY_FUNCTION_ERROR;\n'
+                      '    }\n'
+                      '    if(libData->registerLibraryExpressionManager("Grid", manage_Grid)) {\n'
+                      '        libData->unregisterLibraryExpressionManager("Plan");\n'
+                      '        tables_free();\n'
+                      '        return LIBRARY_FUNCTION_ERROR;\n'
+                      '    }\n'
+                      '    return 0;\n', lib.to_cstr())
+
+    def test_filters(self):
+        functions = ['double alpha(double x);', 'double alpha_two(double x);',
+                     {'prototype': 'int beta(int n);', 'tags': ['fft']},
+                     {'name': 'gamma', 'return': 'void', 'args': [], 'tags': ['fft', 'slow']},
+                     'double broken(((x);']
+        with self.assertRaises(ValueError):
+            LibraryObject({'name': 'lib', 'functions': functions})
+
+        def names(**filters):
+            lib = LibraryObject(dict(filters, name='lib', functions=functions))
+            return [f.func_name for f in lib.functions]
+
+        self.assertEqual(names(include=['alpha*']), ['alpha', 'alpha_two'])
+        self.assertEqual(names(include=['alpha*'], exclude=['*_two']), ['alpha'])
+        self.assertEqual(names(include=['tag:fft']), ['beta', 'gamma'])
+        self.assertEqual(names(include=['tag:fft', 'alpha'], exclude=['tag:slow']), ['alpha', 'beta'])
+        self.assertEqual(names(exclude=['broken']), ['alpha', 'alpha_two', 'beta', 'gamma'])
+
+        lib = LibraryObject({'name': 'lib', 'include': ['beta'], 'functions': functions})
+        self.assertNotIn('alpha', lib.to_cstr())
+        self.assertNotIn('alpha', lib.to_mathstr('lib.so'))
+
+    def test_from_file_filters(self):
+        lib = LibraryObject.from_file(self.file2, exclude=['foo'])
+        self.assertEqual(lib.functions, [])
+        self.assertEqual(LibraryObject.from_file(self.file2), self.lib2)
+        self.assertEqual(LibraryObject.from_file(self.file2, include=['f*']), self.lib2)
+
+    def test_to_cstr_shards(self):
+        lib = LibraryObject({'name': 'lib', 'objects': [{'name': 'Plan', 'destructor': 'plan_free'}],
+                             'functions': ['double f%d(double x);' % i for i in range(4)] +
+                                          ['double plan_run(managed Plan p, double x);']})
+        shards = lib.to_cstr_shards(3)
+        self.assertEqual(len(shards), 3)
+        self.assertEqual(lib.to_cstr_shards(1), [lib.to_cstr()])
+        self.assertEqual(len(lib.to_cstr_shards(10)), 5)
+        # the managed objects and their users stay in the first shard
+        self.assertIn(lib.objects[0].prelude_cstr(), shards[0])
+        self.assertIn('math_plan_runGen', shards[0])
+        for shard in shards[1:]:
+            self.assertTrue(shard.startswith('#include <stdlib.h>\n'))
+            self.assertNotIn('WolframLibrary_initialize', shard)
+            self.assertNotIn('managed_', shard)
+        for func in lib.functions:
+            self.assertEqual(sum(shard.count(func.func_str('    ', 'Gen')) for shard in shards), 1)
+
+    def test_share_wrappers(self):
+        functions = ['double f(double x, int n);', 'double g(double x, int n);',
+                     'double h(double y, int n);', 'void a(int n, double v[n]);',
+                     'void b(int n, double v[n]);', 'void c(int n, double v[n]);']
+        lib = LibraryObject({'name': 'lib', 'functions': functions, 'share_wrappers': True})
+        plain = LibraryObject({'name': 'lib', 'functions': functions})
+        f, g, h, a, b, c = lib.functions
+
+        shards = lib.to_cstr_shards(2)
+        self.assertEqual(shards[0].count(f.routine_cstr('mathbind_wrapper0', '    ', 'Gen')), 1)
+        self.assertIn(f.dispatch_cstr('mathbind_wrapper0', '    ', 'Gen'), shards[0])
+        self.assertIn(g.dispatch_cstr('mathbind_wrapper0', '    ', 'Gen'), shards[0])
+        # the names of the arguments don't matter
+        self.assertIn(h.dispatch_cstr('mathbind_wrapper0', '    ', 'Gen'), shards[0])
+        self.assertNotIn('mathbind_wrapper1', shards[0])
+        # the routines are static, so they are defined in each shard calling them
+        self.assertIn(a.routine_cstr('mathbind_wrapper1', '    ', 'Gen'), shards[1])
+        self.assertNotIn('mathbind_wrapper0', shards[1])
+        self.assertLess(len(lib.to_cstr()), len(plain.to_cstr()))
+
+        code = lib.to_mathstr('lib.so')
+        self.assertIn(f.math_routine('libWrapper0', '    ', 'Gen'), code)
+        self.assertIn(c.math_str('lib.so', '    ', 'Gen', 'libWrapper1'), code)
+        self.assertIn(h.math_str('lib.so', '    ', 'Gen', 'libWrapper0'), code)
+        self.assertEqual(plain.to_mathstr('lib.so'), 'Needs["Developer`"];\n' + ''.join(
+            func.math_str('lib.so', '    ', 'Gen') for func in plain.functions))
+
+    def test_share_wrappers_names(self):
+        functions = ['double f(double x);', 'double g(double y);',
+                     'void a(int n, const double v[n]);', 'void b(const double w[m], int m);',
+                     'void c(int m, const double w[m]);']
+        lib = LibraryObject({'name': 'lib', 'functions': functions, 'share_wrappers': True})
+        f, g, a, b, c = lib.functions
+        self.assertEqual(f.normalized().args, g.normalized().args)
+        self.assertEqual(a.normalized().args, [BasicValueType('int'), ArrayType.from_str('const double [a0]')])
+        code = lib.to_cstr()
+        self.assertIn(g.dispatch_cstr('mathbind_wrapper0', '    ', 'Gen'), code)
+        # the sizes are renamed along with the arguments they are tied to
+        self.assertIn(c.dispatch_cstr('mathbind_wrapper1', '    ', 'Gen'), code)
+        self.assertIn(b.func_str('    ', 'Gen'), code)
+        self.assertNotIn('mathbind_wrapper2', code)
+        self.assertIn(g.math_str('lib.so', '    ', 'Gen', 'libWrapper0'), lib.to_mathstr('lib.so'))
+
+    def test_share_wrappers_packages(self):
+        # two packages loaded together must not redefine each other's routines
+        first = LibraryObject({'name': 'first_lib', 'share_wrappers': True,
+                               'functions': ['double f(double x);', 'double g(double x);']})
+        second = LibraryObject({'name': 'second', 'share_wrappers': True,
+                                'functions': ['double p(double x);', 'double q(double x);']})
+        first_code, second_code = first.to_mathstr('first.so'), second.to_mathstr('second.so')
+        self.assertIn('firstlibWrapper0[', first_code)
+        self.assertIn('secondWrapper0[', second_code)
+        defined = [set(re.findall(r'^(\w+)(?:\[[^\n]*\])? :?= ', code, re.M))
+                   for code in (first_code, second_code)]
+        self.assertEqual(defined[0] & defined[1], set())
+
+    def test_multiplex(self):
+        functions = ['double f(double x, int n);', 'void a(int n, double v[n]);',
+                     'double g(double y, int k);', 'double h(double x);',
+                     {'prototype': 'double t(double x);', 'asynchronous': True}]
+        lib = LibraryObject({'name': 'lib', 'functions': functions, 'multiplex': True})
+        f, a, g, h, t = lib.functions
+        self.assertEqual(LibraryObject({'name': 'lib', 'functions': functions}).dispatchers(), [])
+        self.assertEqual(lib.dispatchers(), [('Real, Integer', 'Real', [f, g]),
+                                             ('{Real, 1, "Shared"}', '"Void"', [a]),
+                                             ('Real', 'Real', [h])])
+
+        shards = lib.to_cstr_shards(2)
+        # only the dispatchers and the asynchronous function are exported
+        self.assertIn(f.func_str('    ', 'Gen', export=False), shards[0])
+        self.assertIn(h.func_str('    ', 'Gen', export=False), shards[1])
+        self.assertIn(t.func_str('    ', 'Gen'), shards[1])
+        self.assertIn('int math_hGen(WolframLibraryData, mint, MArgument *, MArgument);\n', shards[0])
+        self.assertIn('    return lib_dispatch0_functionsGen[idGen]'
+                      '(libDataGen, ArgcGen - 1, ArgsGen + 1, ResGen);\n', shards[0])
+        self.assertIn('    math_fGen,\n    math_gGen,\n};\n', shards[0])
+        self.assertIn('if(idGen < 0 || idGen >= 2) return LIBRARY_FUNCTION_ERROR;', shards[0])
+        self.assertNotIn('lib_dispatch', shards[1])
+
+        code = lib.to_mathstr('lib.so')
+        self.assertEqual(code.count('LibraryFunctionLoad'), 4)
+        self.assertIn('libDispatch1Gen = LibraryFunctionLoad["lib.so", "lib_dispatch1Gen", '
+                      '{Integer, {Real, 1, "Shared"}}, "Void"];\n', code)
+        self.assertIn(g.math_str('lib.so', '    ', 'Gen', dispatch=('libDispatch0Gen', 1)), code)
+        self.assertIn('gGen = libDispatch0Gen[1, ##] &;\n', code)
+        self.assertIn(t.math_load('lib.so', 'Gen'), code)
+
+    def test_multiplex_packages(self):
+        # two packages loaded together must not reload each other's dispatchers
+        first = LibraryObject({'name': 'first_lib', 'multiplex': True,
+                               'functions': ['double f(double x);', 'double g(double x);']})
+        second = LibraryObject({'name': 'second', 'multiplex': True,
+                                'functions': ['double p(double x);', 'double q(double x);']})
+        first_code, second_code = first.to_mathstr('first.so'), second.to_mathstr('second.so')
+        self.assertIn('firstlibDispatch0Gen = LibraryFunctionLoad["first.so", "first_lib_dispatch0Gen", ',
+                      first_code)
+        self.assertIn('pGen = secondDispatch0Gen[0, ##] &;\n', second_code)
+        defined = [set(re.findall(r'^(\w+)(?:\[[^\n]*\])? :?= ', code, re.M))
+                   for code in (first_code, second_code)]
+        self.assertEqual(defined[0] & defined[1], set())
+        self.assertIn('DLLEXPORT int second_dispatch0Gen(', second.to_cstr())
+
+    def test_exported_symbols(self):
+        functions = ['double f(double x);', 'double g(double x);', 'void a(int n, double v[n]);',
+                     {'prototype': 'double m(double x);', 'memoize': True}]
+        hooks = ['WolframLibrary_getVersion', 'WolframLibrary_initialize', 'WolframLibrary_uninitialize']
+        lib = LibraryObject({'name': 'lib', 'functions': functions})
+        self.assertEqual(lib.exported_symbols(), hooks + ['math_fGen', 'math_gGen', 'math_aGen', 'math_mGen',
+                                                         'math_m_memo_statsGen'])
+        lib = LibraryObject({'name': 'lib', 'functions': functions, 'multiplex': True})
+        self.assertEqual(lib.exported_symbols(), hooks + ['math_m_memo_statsGen', 'lib_dispatch0Gen',
+                                                         'lib_dispatch1Gen'])
+        code = lib.to_cstr()
+        for symbol in lib.exported_symbols():
+            self.assertIn('DLLEXPORT ', code.partition(symbol + '(')[0].rpartition('\n')[2])
+        self.assertEqual(lib.to_version_script(),
+                         '{\n'
+                         '    global:\n' +
+                         ''.join('        %s;\n' % symbol for symbol in lib.exported_symbols()) +
+                         '    local: *;\n'
+                         '};\n')
+
+    def test_fortran(self):
+        lib = LibraryObject({'name': 'lib', 'language': 'fortran',
+                             'functions': ['double corner(const double a[m][n], int m, int n);',
+                                           'void scale(int n, double x[n], double k);']})
+        self.assertEqual(lib.to_f90str(), '\n'.join(FortranBinding(f).to_f90str('    ')
+                                                   for f in lib.functions))
+        # the C wrappers call the glue under the name of the routines
+        self.assertIn('corner(a, m, n);\n', lib.to_cstr())
+        self.assertEqual(self.lib1.to_f90str(), '')
+        self.assertNotEqual(lib, LibraryObject({'name': 'lib', 'functions': lib.functions}))
 
+        with self.assertRaises(ValueError):
+            LibraryObject({'name': 'lib', 'language': 'fortran', 'functions': ['double * f(int n);']})
+        with self.assertRaises(ValueError):
+            LibraryObject({'name': 'lib', 'language': 'cobol', 'functions': []})
 
     def test_to_mathstr(self):
         s1 = 'Needs["Developer`"];\n'
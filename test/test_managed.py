@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+import unittest
+from mathbind.managed import ManagedObject
+
+
+class TestManagedObject(unittest.TestCase):
+    def setUp(self):
+        self.obj = ManagedObject.from_dict({'name': 'Plan', 'destructor': 'plan_free'})
+
+    def test_from_dict(self):
+        self.assertEqual(self.obj, ManagedObject('Plan', 'plan_free'))
+        self.assertNotEqual(self.obj, ManagedObject('Plan', 'plan_destroy'))
+
+    def test_prelude_cstr(self):
+        code = self.obj.prelude_cstr('  ')
+        self.assertTrue(code.startswith('typedef struct Plan Plan;\n'
+                                        'void plan_free(Plan * object);\n'))
+        self.assertIn('static void manage_Plan(WolframLibraryData libData, mbool mode, mint id) {\n', code)
+        self.assertIn('  plan_free(object);\n', code)
+
+    def test_register_cstr(self):
+        self.assertEqual(self.obj.register_cstr('  '),
+                         '  if(libData->registerLibraryExpressionManager("Plan", manage_Plan))\n'
+                         '    return LIBRARY_FUNCTION_ERROR;\n')
+        self.assertTrue(self.obj.unregister_cstr('  ').startswith(
+            '  libData->unregisterLibraryExpressionManager("Plan");\n'))
+        self.assertEqual(self.obj.register_cstr('  ', '    undo();\n'),
+                         '  if(libData->registerLibraryExpressionManager("Plan", manage_Plan)) {\n'
+                         '    undo();\n'
+                         '    return LIBRARY_FUNCTION_ERROR;\n'
+                         '  }\n')
+        self.assertEqual(self.obj.unregister_cstr('  ', objects=False),
+                         '  libData->unregisterLibraryExpressionManager("Plan");\n')
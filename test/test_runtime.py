@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+
+import ctypes
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from path import Path
+from mathbind.library import LibraryObject
+
+RUNTIME = Path(__file__).abspath().parent.joinpath('runtime')
+
+
+@unittest.skipIf(shutil.which('gcc') is None, 'gcc is needed to build the wrappers')
+class TestRuntime(unittest.TestCase):
+    """
+    Builds the generated wrappers against the stand-in LibraryLink runtime in
+    test/runtime and calls them as Mathematica would.
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, functions, source, source_name='source.c', build_options=None, **info):
+        with open(self.path.joinpath(source_name), 'w') as fp:
+            fp.write(source)
+        info.update({'name': 'runtime', 'path': self.path, 'functions': functions,
+                     'files': [source_name, RUNTIME.joinpath('runtime.c')],
+                     'include_paths': [RUNTIME]})
+        LibraryObject(info).build_c_library('lib{name}.so', **(build_options or {}))
+        dll = ctypes.CDLL(str(self.path.joinpath('libruntime.so')))
+        dll.runtime_library_data.restype = ctypes.c_void_p
+        dll.runtime_tensor.restype = ctypes.c_void_p
+        dll.runtime_tensor.argtypes = [ctypes.c_int64, ctypes.c_int64, ctypes.c_void_p]
+        dll.runtime_tensor_data.restype = ctypes.c_void_p
+        dll.runtime_tensor_data.argtypes = [ctypes.c_void_p]
+        return dll
+
+    def tensor(self, dll, values, dims):
+        """
+        Returns a real MTensor with the given flat values and dimensions.
+        """
+        tensor = dll.runtime_tensor(3, len(dims), (ctypes.c_int64 * len(dims))(*dims))
+        data = (ctypes.c_double * len(values)).from_address(dll.runtime_tensor_data(tensor))
+        data[:] = values
+        return ctypes.c_void_p(tensor), data
+
+    def call(self, dll, func_name, *args, result_type=ctypes.c_int64, prefix='math_'):
+        """
+        Calls the library function with the arguments, given as ctypes values,
+        returning (error code, result).
+        """
+        storage = list(args)
+        margs = (ctypes.c_void_p * len(args))(*[ctypes.addressof(arg) for arg in storage])
+        result = result_type(0)
+        func = getattr(dll, prefix + func_name + 'Gen')
+        func.restype = ctypes.c_int
+        func.argtypes = [ctypes.c_void_p, ctypes.c_int64, ctypes.c_void_p, ctypes.c_void_p]
+        error = func(dll.runtime_library_data(), len(args), margs, ctypes.addressof(result))
+        return error, result.value
+
+    @unittest.skipIf(sys.maxsize < 2 ** 32, 'needs a 64-bit address space')
+    def test_mapped_over_int_range(self):
+        length = 2 ** 31 + 16
+        data = self.path.joinpath('data.bin')
+        try:
+            with open(data, 'wb') as fp:
+                # sparse, so nothing but the last page is written
+                fp.truncate(length)
+                fp.seek(length - 1)
+                fp.write(b'\x07')
+        except OSError:
+            self.skipTest('no room for a sparse file')
+
+        dll = self.build(['long long last(const mapped char x[n], long long n);',
+                          'int narrow(const mapped char x[n], int n);'],
+                         'long long last(const char * x, long long n) {\n'
+                         '    return n * 256 + x[n - 1];\n'
+                         '}\n'
+                         'int narrow(const char * x, int n) {\n'
+                         '    return n;\n'
+                         '}\n')
+        path = ctypes.c_char_p(os.fsencode(data))
+        self.assertEqual(self.call(dll, 'last', path, ctypes.c_int64(0), ctypes.c_int64(-1)),
+                         (0, length * 256 + 7))
+        self.assertEqual(self.call(dll, 'last', path, ctypes.c_int64(length - 2), ctypes.c_int64(-1)),
+                         (0, 2 * 256 + 7))
+        # LIBRARY_DIMENSION_ERROR, the length doesn't fit in the int argument
+        self.assertEqual(self.call(dll, 'narrow', path, ctypes.c_int64(0), ctypes.c_int64(-1))[0], 4)
+        self.assertEqual(self.call(dll, 'narrow', path, ctypes.c_int64(0), ctypes.c_int64(10)), (0, 10))
+
+    def test_mapped_bounds(self):
+        first, second = self.path.joinpath('first.bin'), self.path.joinpath('second.bin')
+        for name in (first, second):
+            with open(name, 'wb') as fp:
+                fp.write(bytes(range(16)))
+
+        dll = self.build(['int pick(const mapped char x[], const mapped char y[], int i);'],
+                         'int pick(const char * x, const char * y, int i) {\n'
+                         '    return x[i] * 256 + y[i];\n'
+                         '}\n')
+        x, y = ctypes.c_char_p(os.fsencode(first)), ctypes.c_char_p(os.fsencode(second))
+        whole = (ctypes.c_int64(0), ctypes.c_int64(-1))
+        self.assertEqual(self.call(dll, 'pick', x, *whole, y, *whole, ctypes.c_int64(15)), (0, 15 * 256 + 15))
+        self.assertEqual(self.call(dll, 'pick', x, ctypes.c_int64(4), ctypes.c_int64(12), y, *whole,
+                                   ctypes.c_int64(2)), (0, 6 * 256 + 2))
+        # LIBRARY_DIMENSION_ERROR instead of a fault past the end of the file
+        self.assertEqual(self.call(dll, 'pick', x, ctypes.c_int64(4), ctypes.c_int64(13), y, *whole,
+                                   ctypes.c_int64(0))[0], 4)
+        self.assertEqual(self.call(dll, 'pick', x, *whole, y, ctypes.c_int64(0), ctypes.c_int64(1 << 20),
+                                   ctypes.c_int64(0))[0], 4)
+        # LIBRARY_FUNCTION_ERROR for an offset outside the file
+        for offset in (-1, 17):
+            self.assertEqual(self.call(dll, 'pick', x, ctypes.c_int64(offset), ctypes.c_int64(-1), y, *whole,
+                                       ctypes.c_int64(0))[0], 1)
+        # the first file is unmapped when the second can not be
+        if os.path.exists('/proc/self/maps'):
+            with open('/proc/self/maps') as fp:
+                self.assertNotIn(str(first), fp.read())
+
+    def test_mapped_error_after_mapping(self):
+        data = self.path.joinpath('data.bin')
+        with open(data, 'wb') as fp:
+            fp.write(ctypes.string_at((ctypes.c_double * 4)(1, 2, 3, 4), 32))
+
+        dll = self.build(['double [n] twice(const mapped double x[n], int n);'],
+                         '#include <stdlib.h>\n'
+                         'double * twice(const double * x, int n) {\n'
+                         '    static double result[4];\n'
+                         '    if(x[0] < 0)\n'
+                         '        return NULL;\n'
+                         '    for(int i = 0; i < n; ++i)\n'
+                         '        result[i] = 2 * x[i];\n'
+                         '    return result;\n'
+                         '}\n')
+        path = ctypes.c_char_p(os.fsencode(data))
+        self.assertEqual(self.call(dll, 'twice', path, ctypes.c_int64(0), ctypes.c_int64(-1))[0], 0)
+        with open(data, 'r+b') as fp:
+            fp.write(ctypes.string_at((ctypes.c_double * 1)(-1), 8))
+        # LIBRARY_FUNCTION_ERROR for the NULL result, and the file is unmapped
+        self.assertEqual(self.call(dll, 'twice', path, ctypes.c_int64(0), ctypes.c_int64(-1))[0], 1)
+        if os.path.exists('/proc/self/maps'):
+            with open('/proc/self/maps') as fp:
+                self.assertNotIn(str(data), fp.read())
+
+    def test_shared_derived_size(self):
+        dll = self.build(['void axpy(const double x[n], double y[n], int n, double a);'],
+                         'void axpy(const double * x, double * y, int n, double a) {\n'
+                         '    for(int i = 0; i < n; ++i)\n'
+                         '        y[i] += a * x[i];\n'
+                         '}\n')
+        x, _ = self.tensor(dll, [1, 2, 3], [3])
+        y, data = self.tensor(dll, [1, 1, 1], [3])
+        self.assertEqual(self.call(dll, 'axpy', x, y, ctypes.c_double(2.0))[0], 0)
+        self.assertEqual(list(data), [3.0, 5.0, 7.0])
+        # LIBRARY_DIMENSION_ERROR, y is shorter than x and is left untouched
+        x, _ = self.tensor(dll, [1.0] * 100000, [100000])
+        y, data = self.tensor(dll, [1, 1], [2])
+        self.assertEqual(self.call(dll, 'axpy', x, y, ctypes.c_double(2.0))[0], 4)
+        self.assertEqual(list(data), [1.0, 1.0])
+
+    def test_converted_arrays(self):
+        # int, short and float elements are copied from and back to the tensors
+        dll = self.build(['void twice(int n, int x[n], const float w[n], out short y[n]);'],
+                         'void twice(int n, int * x, const float * w, short * y) {\n'
+                         '    for(int i = 0; i < n; ++i) {\n'
+                         '        y[i] = 2 * x[i] + (short) w[i];\n'
+                         '        x[i] += 1;\n'
+                         '    }\n'
+                         '}\n')
+        x = dll.runtime_tensor(2, 1, (ctypes.c_int64 * 1)(3))
+        x_data = (ctypes.c_int64 * 3).from_address(dll.runtime_tensor_data(x))
+        x_data[:] = [1, -2, 40000]
+        w, _ = self.tensor(dll, [0.5, 10.0, 2.0], [3])
+        error, y = self.call(dll, 'twice', ctypes.c_void_p(x), w, result_type=ctypes.c_void_p)
+        self.assertEqual(error, 0)
+        self.assertEqual(list(x_data), [2, -1, 40001])
+        y_data = (ctypes.c_int64 * 3).from_address(dll.runtime_tensor_data(y))
+        self.assertEqual(list(y_data), [2, 6, ctypes.c_short(80002).value])
+
+    def check_sharded(self, **build_options):
+        functions = ['double f%d(double x);' % i for i in range(5)]
+        source = ''.join('double f%d(double x) { return x + %d; }\n' % (i, i) for i in range(5))
+        dll = self.build(functions, source, build_options=dict(shards=3, **build_options))
+        self.assertTrue(self.path.joinpath('runtimeGen2.c').exists())
+        for i in range(5):
+            self.assertEqual(self.call(dll, 'f%d' % i, ctypes.c_double(0.5), result_type=ctypes.c_double),
+                             (0, i + 0.5))
+
+    def test_sharded(self):
+        self.check_sharded()
+
+    def test_shared_wrappers(self):
+        functions = ['double f%d(double x, int n);' % i for i in range(4)] + ['double g(double y, int n);']
+        source = (''.join('double f%d(double x, int n) { return x * n + %d; }\n' % (i, i) for i in range(4)) +
+                  'double g(double y, int n) { return y - n; }\n')
+        dll = self.build(functions, source, build_options={'shards': 2}, share_wrappers=True)
+        for i in range(2):
+            with open(self.path.joinpath('runtimeGen%d.c' % i)) as fp:
+                self.assertEqual(fp.read().count('static int mathbind_wrapper0('), 1)
+        for i in range(4):
+            self.assertEqual(self.call(dll, 'f%d' % i, ctypes.c_double(0.5), ctypes.c_int64(4),
+                                       result_type=ctypes.c_double), (0, i + 2.0))
+        self.assertEqual(self.call(dll, 'g', ctypes.c_double(0.5), ctypes.c_int64(4),
+                                   result_type=ctypes.c_double), (0, -3.5))
+
+    def test_multiplex(self):
+        functions = ['double f%d(double x, int n);' % i for i in range(3)] + ['int g(int n);']
+        source = (''.join('double f%d(double x, int n) { return x * n + %d; }\n' % (i, i) for i in range(3)) +
+                  'int g(int n) { return -n; }\n')
+        dll = self.build(functions, source, build_options={'shards': 2}, multiplex=True)
+        for i in range(3):
+            self.assertEqual(self.call(dll, 'dispatch0', ctypes.c_int64(i), ctypes.c_double(0.5),
+                                       ctypes.c_int64(4), result_type=ctypes.c_double, prefix='runtime_'),
+                             (0, i + 2.0))
+        self.assertEqual(self.call(dll, 'dispatch1', ctypes.c_int64(0), ctypes.c_int64(4),
+                                   prefix='runtime_'), (0, -4))
+        # LIBRARY_FUNCTION_ERROR, no function with that id
+        self.assertEqual(self.call(dll, 'dispatch1', ctypes.c_int64(1), ctypes.c_int64(4),
+                                   prefix='runtime_')[0], 1)
+
+    def test_hidden_symbols(self):
+        source = ('double helper(double x) { return 2 * x; }\n'
+                  'double f(double x) { return helper(x) + 1; }\n'
+                  'double g(double x) { return x; }\n')
+        dll = self.build(['double f(double x);', 'double g(double x);'], source)
+        self.assertEqual(self.call(dll, 'f', ctypes.c_double(0.5), result_type=ctypes.c_double), (0, 2.0))
+        self.assertFalse(hasattr(dll, 'helper'))
+        self.assertTrue(hasattr(dll, 'WolframLibrary_initialize'))
+
+    def test_version_script(self):
+        with open(self.path.joinpath('source.c'), 'w') as fp:
+            fp.write('double helper(double x) { return 2 * x; }\n'
+                     'double f(double x) { return helper(x) + 1; }\n')
+        lib = LibraryObject({'name': 'runtime', 'path': self.path, 'functions': ['double f(double x);'],
+                             'files': ['source.c', RUNTIME.joinpath('runtime.c')],
+                             'include_paths': [RUNTIME], 'multiplex': True})
+        lib.build_c_library('lib{name}.so', version_script=True, gc_sections=True, visibility=None)
+        self.assertTrue(self.path.joinpath('runtime.map').exists())
+        # only the exported symbols of the library are left, even with the default visibility
+        dll = ctypes.CDLL(str(self.path.joinpath('libruntime.so')))
+        self.assertTrue(hasattr(dll, 'runtime_dispatch0Gen'))
+        self.assertTrue(hasattr(dll, 'WolframLibrary_getVersion'))
+        for symbol in ('helper', 'math_fGen', 'runtime_library_data'):
+            self.assertFalse(hasattr(dll, symbol))
+
+    def test_features(self):
+        with mock.patch.dict(os.environ, {'MATHBIND_CACHE_DIR': self.path.joinpath('cache')}):
+            self.check_sharded(features=['lto', 'native'])
+        self.assertTrue(self.path.joinpath('cache', 'capabilities').listdir())
+
+    @unittest.skipIf(shutil.which('clang') is None, 'clang is needed to build with ThinLTO')
+    def test_clang_thin_lto(self):
+        self.check_sharded(compiler='clang', lto='thin', jobs=2)
+
+    @unittest.skipIf(shutil.which('gfortran') is None, 'gfortran is needed to build Fortran libraries')
+    def test_fortran(self):
+        dll = self.build(['double corner(const double a[m][n], int m, int n);',
+                          'void scale(int n, double x[n], double k);'],
+                         'double precision function corner(a, m, n)\n'
+                         '    integer :: m, n\n'
+                         '    double precision :: a(n, m)\n'
+                         '    corner = a(n, 1) * 10 + a(1, m)\n'
+                         'end function corner\n'
+                         'subroutine scale(n, x, k)\n'
+                         '    integer :: n\n'
+                         '    double precision :: x(n), k\n'
+                         '    x = x * k\n'
+                         'end subroutine scale\n',
+                         'source.f90', language='fortran')
+        # {{1, 2, 3}, {4, 5, 6}} is seen from Fortran as its transpose
+        a, _ = self.tensor(dll, [1, 2, 3, 4, 5, 6], [2, 3])
+        self.assertEqual(self.call(dll, 'corner', a, result_type=ctypes.c_double), (0, 34.0))
+
+        x, data = self.tensor(dll, [1, 2, 3], [3])
+        self.assertEqual(self.call(dll, 'scale', x, ctypes.c_double(2.5))[0], 0)
+        self.assertEqual(list(data), [2.5, 5.0, 7.5])
+
+    @unittest.skipIf(shutil.which('gfortran') is None, 'gfortran is needed to build Fortran libraries')
+    def test_fortran_long_lines(self):
+        name = 'compute_the_weighted_moving_average_window'
+        dll = self.build(['double %s(int number_of_samples, int window_size, '
+                          'const double samples[number_of_samples], double weights[window_size]);' % name],
+                         'double precision function %s(number_of_samples, window_size, samples, weights)\n'
+                         '    integer :: number_of_samples, window_size\n'
+                         '    double precision :: samples(number_of_samples), weights(window_size)\n'
+                         '    %s = sum(samples(1:window_size) * weights)\n'
+                         'end function %s\n' % (name, name, name),
+                         'source.f90', language='fortran')
+        samples, _ = self.tensor(dll, [1, 2, 3], [3])
+        weights, _ = self.tensor(dll, [0.5, 0.25], [2])
+        self.assertEqual(self.call(dll, name, samples, weights, result_type=ctypes.c_double), (0, 1.0))
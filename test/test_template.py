@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+import unittest
+from mathbind.template import Template
+
+
+class TestTemplate(unittest.TestCase):
+    def test_render(self):
+        t = Template('{tab}int {argname} = {{0}};\n')
+        self.assertEqual(t.render(tab='  ', argname='x'), '  int x = {0};\n')
+        self.assertEqual(t.fields, {'tab', 'argname'})
+
+    def test_bind(self):
+        t = Template('{tab}{c_name} {argname}{suffix} = Get{math_name}({{{index}}});\n')
+        bound = t.bind(c_name='double', math_name='Real')
+        self.assertEqual(bound.fields, {'tab', 'argname', 'suffix', 'index'})
+        self.assertEqual(bound.render(tab='', argname='x', suffix='Gen', index=2),
+                         t.render(tab='', argname='x', suffix='Gen', index=2,
+                                  c_name='double', math_name='Real'))
+        self.assertEqual(bound.render(tab='', argname='x', suffix='Gen', index=2),
+                         'double xGen = GetReal({2});\n')
+
+    def test_bind_braces_in_values(self):
+        t = Template('{a}{b}').bind(a='{x}')
+        self.assertEqual(t.render(b='}'), '{x}}')
+
+    def test_bind_conversion(self):
+        t = Template('{a!r} {b:>3}').bind(a='s', b=7)
+        self.assertEqual(t.fields, set())
+        self.assertEqual(t.render(), "'s'   7")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -81,11 +81,10 @@ class TestArrayType(unittest.TestCase):
         int_t = ArrayType.from_str('int [3]')
         s = (
             ' /* Converting triple */\n'
-            ' int * triple = (int *) data_tripleGen;\n'
-            ' if(sizeof(mint) != sizeof(int)) {\n'
-            '     triple = malloc(sizeof(int) * 3);\n'
-            '     for(int iGen = 0; iGen < 3; ++iGen)\n'
-            '         triple[iGen] = data_tripleGen[iGen];\n'
+            ' int * triple = NULL;\n'
+            ' if(mathbind_get_int(data_tripleGen, 3, 1, &triple)) {\n'
+            '     errorGen = LIBRARY_MEMORY_ERROR;\n'
+            '     goto cleanup_tripleGen;\n'
             ' }\n'
         )
         self.assertEqual(int_t.before_cstr('triple', ' ', 'Gen'), s)
@@ -93,11 +92,10 @@ class TestArrayType(unittest.TestCase):
         float_t = ArrayType.from_str('float [3]')
         s = (
             ' /* Converting triple */\n'
-            ' float * triple = (float *) data_tripleGen2;\n'
-            ' if(sizeof(mreal) != sizeof(float)) {\n'
-            '     triple = malloc(sizeof(float) * 3);\n'
-            '     for(int iGen2 = 0; iGen2 < 3; ++iGen2)\n'
-            '         triple[iGen2] = data_tripleGen[iGen2];\n'
+            ' float * triple = NULL;\n'
+            ' if(mathbind_get_float(data_tripleGen2, 3, 1, &triple)) {\n'
+            '     errorGen2 = LIBRARY_MEMORY_ERROR;\n'
+            '     goto cleanup_tripleGen2;\n'
             ' }\n'
         )
         self.assertEqual(float_t.before_cstr('triple', ' ', 'Gen2'), s)
@@ -105,11 +103,21 @@ class TestArrayType(unittest.TestCase):
         long_t = ArrayType.from_str('long [length]')
         s = (
             ' /* Converting triple */\n'
-            ' long * triple = (long *) data_tripleGen;\n'
-            ' if(sizeof(mint) != sizeof(long)) {\n'
-            '     triple = malloc(sizeof(long) * length);\n'
-            '     for(int iGen = 0; iGen < length; ++iGen)\n'
-            '         triple[iGen] = data_tripleGen[iGen];\n'
+            ' long * triple = NULL;\n'
+            ' if(mathbind_get_long(data_tripleGen, length_tripleGen, 1, &triple)) {\n'
+            '     errorGen = LIBRARY_MEMORY_ERROR;\n'
+            '     goto cleanup_tripleGen;\n'
+            ' }\n'
+        )
+        self.assertEqual(long_t.before_cstr('triple', ' ', 'Gen'), s)
+
+        long_t = ArrayType.from_str('unsigned long [length]')
+        s = (
+            ' /* Converting triple */\n'
+            ' unsigned long * triple = NULL;\n'
+            ' if(mathbind_get_unsigned_long(data_tripleGen, length_tripleGen, 1, &triple)) {\n'
+            '     errorGen = LIBRARY_MEMORY_ERROR;\n'
+            '     goto cleanup_tripleGen;\n'
             ' }\n'
         )
         self.assertEqual(long_t.before_cstr('triple', ' ', 'Gen'), s)
@@ -118,11 +126,7 @@ class TestArrayType(unittest.TestCase):
         int_t = ArrayType.from_str('int [3]')
         s = (
             ' /* Copying and releasing triple */\n'
-            ' if(sizeof(mint) != sizeof(int)) {\n'
-            '     for(int iGen = 0; iGen < 3; ++iGen)\n'
-            '         data_tripleGen[iGen] = triple[iGen];\n'
-            '     free(triple);\n'
-            ' }\n'
+            ' mathbind_release_int(data_tripleGen, triple, 3);\n'
             ' libDataGen->MTensor_disownAll(mtensor_tripleGen);\n'
         )
         self.assertEqual(int_t.after_cstr('triple', ' ', 'Gen'), s)
@@ -130,15 +134,53 @@ class TestArrayType(unittest.TestCase):
         double_t = ArrayType.from_str('double [3]')
         s = (
             ' /* Copying and releasing triple */\n'
-            ' if(sizeof(mreal) != sizeof(double)) {\n'
-            '     for(int iGeni = 0; iGeni < 3; ++iGeni)\n'
-            '         data_tripleGen[iGeni] = triple[iGeni];\n'
-            '     free(triple);\n'
-            ' }\n'
+            ' mathbind_release_double(data_tripleGeni, triple, 3);\n'
+            ' libDataGeni->MTensor_disownAll(mtensor_tripleGeni);\n'
+        )
+        self.assertEqual(double_t.after_cstr('triple', ' ', 'Geni'), s)
+
+        double_t = ArrayType.from_str('double [n]')
+        s = (
+            ' /* Copying and releasing triple */\n'
+            ' mathbind_release_double(data_tripleGeni, triple, length_tripleGeni);\n'
             ' libDataGeni->MTensor_disownAll(mtensor_tripleGeni);\n'
         )
         self.assertEqual(double_t.after_cstr('triple', ' ', 'Geni'), s)
 
+    def test_helpers(self):
+        int_t = ArrayType.from_str('int [3]')
+        self.assertEqual(int_t.helpers, (
+            'static int mathbind_get_int(mint * data, mint size, int copy, int ** result) {\n'
+            '    if(sizeof(mint) == sizeof(int)) {\n'
+            '        *result = (int *) data;\n'
+            '        return 0;\n'
+            '    }\n'
+            '    int * array = ((size_t) size <= (size_t) -1 / sizeof(int) ? malloc(sizeof(int) * (size_t) size) : NULL);\n'
+            '    if(array == NULL && size > 0)\n'
+            '        return LIBRARY_MEMORY_ERROR;\n'
+            '    if(copy)\n'
+            '        for(mint i = 0; i < size; ++i)\n'
+            '            array[i] = data[i];\n'
+            '    *result = array;\n'
+            '    return 0;\n'
+            '}\n',
+            'static void mathbind_put_int(mint * data, const int * array, mint size) {\n'
+            '    for(mint i = 0; i < size; ++i)\n'
+            '        data[i] = array[i];\n'
+            '}\n',
+            'static void mathbind_release_int(mint * data, int * array, mint size) {\n'
+            '    if(sizeof(mint) != sizeof(int) && array != NULL) {\n'
+            '        mathbind_put_int(data, array, size);\n'
+            '        free(array);\n'
+            '    }\n'
+            '}\n',
+        ))
+        self.assertEqual(int_t.return_helpers, int_t.helpers[1:2])
+        # shared by all the arrays of the same elements
+        for typename in ('const int [n]', 'out int [n]', 'int []'):
+            self.assertEqual(ArrayType.from_str(typename).helpers, int_t.helpers)
+        self.assertNotEqual(ArrayType.from_str('unsigned int [3]').helpers, int_t.helpers)
+
     def test_retrieve_cstr(self):
         double_t = ArrayType.from_str('double [3]')
         before = double_t.before_cstr('ironman', ' ', 'Ant')
@@ -147,6 +189,20 @@ class TestArrayType(unittest.TestCase):
             ' mreal * data_ironmanAnt = libDataAnt->MTensor_getRealData(mtensor_ironmanAnt);\n')
         self.assertEqual(double_t.retrieve_cstr('ironman', 2, ' ', 'Ant'), s + before)
 
+        int_t = ArrayType.from_str('int [n]')
+        before = int_t.before_cstr('ironman', ' ', 'Ant')
+        s = (
+            ' MTensor mtensor_ironmanAnt = MArgument_getMTensor(ArgsAnt[0]);\n'
+            ' mint * data_ironmanAnt = libDataAnt->MTensor_getIntegerData(mtensor_ironmanAnt);\n'
+            ' mint length_ironmanAnt = libDataAnt->MTensor_getFlattenedLength(mtensor_ironmanAnt);\n')
+        self.assertEqual(int_t.retrieve_cstr('ironman', 0, ' ', 'Ant'), s + before)
+
+    def test_length_cstr(self):
+        self.assertEqual(ArrayType.from_str('int [3]').length_cstr('x', 'Gen'), '3')
+        self.assertEqual(ArrayType.from_str('int [n]').length_cstr('x', 'Gen'), 'length_xGen')
+        self.assertEqual(ArrayType.from_str('int []').length_cstr('x', 'Gen'), 'length_xGen')
+        self.assertEqual(ArrayType.from_str('out int [n]').length_cstr('x', 'Gen'), 'n')
+
     def test_const_array_before_mathstr(self):
         double_t = ArrayType.from_str('const double [3]')
         s = (
@@ -155,9 +211,129 @@ class TestArrayType(unittest.TestCase):
         )
         self.assertEqual(double_t.before_mathstr('var', ' ', 'Gen'), s)
 
+        double_t = ArrayType.from_str('const double [n]')
+        s = (
+            ' varGen = var;\n'
+            ' varGen = Developer`ToPackedArray[Map[N, varGen]];\n'
+        )
+        self.assertEqual(double_t.before_mathstr('var', ' ', 'Gen'), s)
+
         int_t = ArrayType.from_str('int [length]')
         s = (
             '   fooGeni = foo;\n'
             '   fooGeni = Developer`ToPackedArray[Map[IntegerPart, fooGeni]];\n'
         )
-        self.assertEqual(int_t.before_mathstr('foo', '   ', 'Geni'), s)
\ No newline at end of file
+        self.assertEqual(int_t.before_mathstr('foo', '   ', 'Geni'), s)
+
+    def test_chunk_mathstr(self):
+        self.assertEqual(ArrayType.from_str('const double [n]').chunk_mathstr('x', 'startGen', 'endGen', '\t', 'Gen'),
+                         '\txGen = Developer`ToPackedArray[Map[N, x[[startGen ;; endGen]]]];\n')
+        self.assertEqual(ArrayType.from_str('int []').chunk_mathstr('y', 1, 10, '', 'Gen'),
+                         'yGen = Developer`ToPackedArray[Map[IntegerPart, y[[1 ;; 10]]]];\n')
+
+    def test_from_str_out(self):
+        out_t = ArrayType.from_str('out double [n]')
+        self.assertEqual(out_t, ArrayType(BasicValueType('double'), 'variable', 'n', False, True))
+        self.assertEqual(out_t.is_input, False)
+        self.assertEqual(out_t.should_return, False)
+        self.assertEqual(out_t.math_return_name, '{Real, 1}')
+        self.assertEqual(ArrayType.from_str(out_t.typename), out_t)
+        self.assertEqual(ArrayType.from_str('const int [3]').is_input, True)
+
+        with self.assertRaises(ValueError): ArrayType.from_str('out double []')
+        with self.assertRaises(ValueError): ArrayType.from_str('out const double [3]')
+
+    def test_out_retrieve_cstr(self):
+        out_t = ArrayType.from_str('out int [n]')
+        s = (
+            ' /* Allocating res */\n'
+            ' MTensor mtensor_resGen;\n'
+            ' mint dims_resGen[1] = {n};\n'
+            ' int error_resGen = libDataGen->MTensor_new(MType_Integer, 1, dims_resGen, &mtensor_resGen);\n'
+            ' if(error_resGen) {\n'
+            '     errorGen = error_resGen;\n'
+            '     goto cleanupGen;\n'
+            ' }\n'
+            ' mint * data_resGen = libDataGen->MTensor_getIntegerData(mtensor_resGen);\n'
+            ' int * res = NULL;\n'
+            ' if(mathbind_get_int(data_resGen, n, 0, &res)) {\n'
+            '     errorGen = LIBRARY_MEMORY_ERROR;\n'
+            '     goto cleanup_resGen;\n'
+            ' }\n'
+        )
+        self.assertEqual(out_t.retrieve_cstr('res', None, ' ', 'Gen'), s)
+        # an allocation failure releases the arguments retrieved before
+        self.assertIn(' goto cleanup_xGen;\n', out_t.retrieve_cstr('res', None, ' ', 'Gen', 'cleanup_xGen'))
+        self.assertEqual(out_t.before_mathstr('res', ' ', 'Gen'), '')
+
+    def test_out_after_cstr(self):
+        out_t = ArrayType.from_str('out double [4]')
+        s = (
+            ' /* Copying and returning res */\n'
+            ' mathbind_release_double(data_resGen, res, 4);\n'
+            ' if(errorGen == LIBRARY_NO_ERROR)\n'
+            '     MArgument_setMTensor(ResGen, mtensor_resGen);\n'
+            ' else\n'
+            '     libDataGen->MTensor_free(mtensor_resGen);\n'
+        )
+        self.assertEqual(out_t.after_cstr('res', ' ', 'Gen'), s)
+
+    def test_return_cstr(self):
+        int_t = ArrayType.from_str('int [n]')
+        s = (
+            ' int * return_valueGen = make(n);\n'
+            ' if(return_valueGen == NULL && n > 0) {\n'
+            '     errorGen = LIBRARY_FUNCTION_ERROR;\n'
+            '     goto cleanupGen;\n'
+            ' }\n'
+            ' MTensor return_mtensorGen;\n'
+            ' mint return_dimsGen[1] = {n};\n'
+            ' errorGen = libDataGen->MTensor_new(MType_Integer, 1, return_dimsGen, &return_mtensorGen);\n'
+            ' if(errorGen) {\n'
+            '     goto cleanupGen;\n'
+            ' }\n'
+            ' mint * return_dataGen = libDataGen->MTensor_getIntegerData(return_mtensorGen);\n'
+            ' mathbind_put_int(return_dataGen, return_valueGen, n);\n'
+            ' MArgument_setMTensor(ResGen, return_mtensorGen);\n'
+        )
+        self.assertEqual(int_t.return_cstr('make(n)', ' ', 'Gen'), s)
+
+        adopt_s = (s.replace(' if(errorGen) {\n', ' if(errorGen) {\n     free(return_valueGen);\n')
+                    .replace(' MArgument_setMTensor', ' free(return_valueGen);\n MArgument_setMTensor'))
+        self.assertEqual(int_t.with_ownership('adopt').return_cstr('make(n)', ' ', 'Gen'), adopt_s)
+
+        self.assertEqual(int_t.return_cstr('make(n)', ' ', 'Gen', 'cleanup_xGen'),
+                         s.replace('goto cleanupGen;', 'goto cleanup_xGen;'))
+
+        with self.assertRaises(ValueError): int_t.with_ownership('steal')
+        with self.assertRaises(ValueError): ArrayType.from_str('int []').return_cstr('make()')
+
+    def test_prototype_return_cstr(self):
+        self.assertEqual(ArrayType.from_str('double [3]').prototype_return_cstr(), 'double *')
+        self.assertEqual(ArrayType.from_str('const int [n]').prototype_return_cstr(), 'const int *')
+
+    def test_complex(self):
+        t = ArrayType.from_str('double complex [n]')
+        self.assertEqual(t.math_name, '{Complex, 1, "Shared"}')
+        self.assertEqual(t.includes, ('<complex.h>',))
+        self.assertEqual(t.before_cstr('z', '', 'Gen'),
+                         '/* Converting z */\n'
+                         'double complex * z = NULL;\n'
+                         'if(mathbind_get_double_complex(data_zGen, length_zGen, 1, &z)) {\n'
+                         '    errorGen = LIBRARY_MEMORY_ERROR;\n'
+                         '    goto cleanup_zGen;\n'
+                         '}\n')
+        helpers = ''.join(t.helpers)
+        self.assertIn('static int mathbind_get_double_complex(mcomplex * data, mint size, int copy, '
+                      'double complex ** result) {\n', helpers)
+        self.assertIn('            array[i] = (double complex) (mcreal(data[i]) + I * mcimag(data[i]));\n', helpers)
+        self.assertIn('        { mcreal(data[i]) = creal(array[i]); mcimag(data[i]) = cimag(array[i]); }\n', helpers)
+
+        out_t = ArrayType.from_str('out float complex [4]')
+        self.assertIn('MType_Complex', out_t.retrieve_cstr('z', None, '', 'Gen'))
+        self.assertIn('mathbind_release_float_complex(data_zGen, z, 4);\n', out_t.after_cstr('z', '', 'Gen'))
+
+        ret_t = ArrayType.from_str('float complex [3]')
+        self.assertIn('mathbind_put_float_complex(return_dataGen, return_valueGen, 3);\n',
+                      ret_t.return_cstr('f()', '', 'Gen'))
+        self.assertEqual(ArrayType.from_str('double [3]').includes, ())
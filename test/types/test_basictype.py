@@ -1 +1,46 @@
 #!/usr/bin/env python3
+
+import pickle
+import unittest
+from mathbind.types import BasicType, BasicValueType, VoidType, PointerType, ArrayType
+
+
+class TestBasicType(unittest.TestCase):
+    def test_interned(self):
+        self.assertIs(BasicValueType('double'), BasicValueType('double'))
+        self.assertIs(BasicType.from_str('double'), BasicValueType.from_str(' double '))
+        self.assertIs(VoidType.from_str('void'), VoidType('void'))
+        self.assertIs(PointerType.from_str('const int *'),
+                      PointerType(BasicValueType('int'), True))
+        self.assertIs(ArrayType.from_str('double [3]').basetype, BasicValueType('double'))
+        self.assertIsNot(BasicValueType('int'), BasicValueType('long'))
+
+    def test_immutable(self):
+        double_t = BasicValueType('double')
+        with self.assertRaises(AttributeError): double_t.typename = 'int'
+        with self.assertRaises(AttributeError): double_t.extra = 0
+        with self.assertRaises(AttributeError): del double_t.c_name
+        with self.assertRaises(AttributeError): ArrayType.from_str('int []').const = True
+
+    def test_hash(self):
+        types = {BasicValueType('int'), BasicValueType('int'),
+                 PointerType.from_str('int *'), ArrayType.from_str('int [n]')}
+        self.assertEqual(len(types), 3)
+        self.assertIn(PointerType(BasicValueType('int'), False), types)
+
+    def test_eq_other_types(self):
+        self.assertNotEqual(BasicValueType('int'), VoidType('void'))
+        self.assertNotEqual(ArrayType.from_str('int []'), PointerType.from_str('int *'))
+
+    def test_cleanup_label(self):
+        self.assertEqual(BasicType.cleanup_label('x', 'Gen'), 'cleanup_xGen')
+        self.assertEqual(BasicType.cleanup_label(suffix='Gen'), 'cleanupGen')
+        self.assertEqual(BasicType.cleanup_label('x'), 'cleanup_x' + BasicType.default_suffix)
+
+    def test_pickle(self):
+        array_t = ArrayType.from_str('const double [length]')
+        self.assertIs(pickle.loads(pickle.dumps(array_t)), array_t)
+
+
+if __name__ == '__main__':
+    unittest.main()
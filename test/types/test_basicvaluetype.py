@@ -45,6 +45,16 @@ class TestBasicValueType(unittest.TestCase):
         self.assertEqual(BasicValueType.from_str('long     long '), BasicValueType('long long'))
         with self.assertRaises(ValueError):
             BasicValueType.from_str('int *')
+        with self.assertRaises(ValueError):
+            BasicValueType.from_str('numeric float')
+        with self.assertRaises(ValueError):
+            BasicValueType.from_str('const sparse double')
+
+        # qualified floating types are still plain values
+        self.assertEqual(BasicValueType.from_str('const double').math_name, 'Real')
+        self.assertEqual(BasicValueType.from_str('volatile double').math_name, 'Real')
+        self.assertEqual(BasicValueType.from_str('const float').c_math_name, 'mreal')
+        self.assertEqual(BasicValueType.from_str('const double complex').math_name, 'Complex')
 
         self.assertEqual(BasicValueType.from_str('int'),
                          BasicValueType.from_str('int    '))
@@ -123,4 +133,25 @@ class TestBasicValueType(unittest.TestCase):
         self.assertEqual(BasicValueType.from_str('double').math_convert_f,
                          'N')
         self.assertEqual(BasicValueType.from_str('float').math_convert_f,
-                         'N')
\ No newline at end of file
+                         'N')
+
+    def test_complex(self):
+        for typename in ('double complex', 'float complex', 'complex double', 'long double _Complex'):
+            t = BasicValueType(typename)
+            self.assertEqual((t.c_math_name, t.math_name), ('mcomplex', 'Complex'))
+            self.assertEqual(t.includes, ('<complex.h>',))
+            self.assertEqual(t.math_convert_f, 'N')
+        with self.assertRaises(ValueError): BasicValueType('complex')
+        with self.assertRaises(ValueError): BasicValueType('int complex')
+        self.assertEqual(BasicValueType('double').includes, ())
+
+        t = BasicValueType('double complex')
+        self.assertEqual(t.retrieve_cstr('z', 1, '  ', 'Gen'),
+                         '  mcomplex math_zGen = MArgument_getComplex(ArgsGen[1]);\n'
+                         '  double complex z = (double complex) (mcreal(math_zGen) + I * mcimag(math_zGen));\n')
+        self.assertEqual(t.return_cstr('f(z)', '', 'Gen'),
+                         'double complex return_valueGen = f(z);\n'
+                         'mcomplex return_mathGen;\n'
+                         'mcreal(return_mathGen) = creal(return_valueGen);\n'
+                         'mcimag(return_mathGen) = cimag(return_valueGen);\n'
+                         'MArgument_setComplex(ResGen, return_mathGen);\n')
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+import unittest
+from mathbind.types import BasicType, HandleType
+
+
+class TestHandleType(unittest.TestCase):
+    def test_from_str(self):
+        self.assertEqual(HandleType.from_str(' managed  Plan '), HandleType('Plan'))
+        self.assertIs(HandleType.from_str('managed Plan'), HandleType('Plan'))
+
+        with self.assertRaises(ValueError): HandleType.from_str('Plan')
+        with self.assertRaises(ValueError): HandleType.from_str('managed Plan *')
+        with self.assertRaises(ValueError): HandleType.from_str('managed struct Plan')
+
+    def test_dispatch(self):
+        self.assertEqual(BasicType.from_prototype_cstr('managed Solver s'),
+                         (HandleType('Solver'), 's'))
+        self.assertEqual(BasicType.from_str('managed Solver'), HandleType('Solver'))
+
+    def test_math_name(self):
+        self.assertEqual(HandleType('Plan').math_name, 'Integer')
+        self.assertEqual(HandleType('Plan').math_return_name, '"Void"')
+        self.assertFalse(HandleType('Plan').should_return)
+
+    def test_retrieve_cstr(self):
+        self.assertEqual(HandleType('Plan').retrieve_cstr('p', 2, '\t', 'Gen'),
+                         '\tPlan * p = managed_get_Plan(MArgument_getInteger(ArgsGen[2]));\n'
+                         '\tif(p == NULL) {\n'
+                         '\t    errorGen = LIBRARY_FUNCTION_ERROR;\n'
+                         '\t    goto cleanupGen;\n'
+                         '\t}\n')
+        self.assertIn('goto cleanup_xGen;', HandleType('Plan').retrieve_cstr('p', 2, '\t', 'Gen', 'cleanup_xGen'))
+
+    def test_before_mathstr(self):
+        self.assertEqual(HandleType('Plan').before_mathstr('p', '\t', 'Gen'),
+                         '\tpGen = ManagedLibraryExpressionID[p, "Plan"];\n')
+
+    def test_return_cstr(self):
+        self.assertEqual(HandleType('Plan').return_cstr('plan_new(n)', '', 'Gen'),
+                         'mint return_idGen = MArgument_getInteger(ArgsGen[ArgcGen - 1]);\n'
+                         'if(return_idGen < 0 || return_idGen >= managed_Plan_size) {\n'
+                         '    errorGen = LIBRARY_FUNCTION_ERROR;\n'
+                         '    goto cleanupGen;\n'
+                         '}\n'
+                         'if(managed_Plan[return_idGen] != NULL) managed_free_Plan(managed_Plan[return_idGen]);\n'
+                         'managed_Plan[return_idGen] = plan_new(n);\n'
+                         'if(managed_Plan[return_idGen] == NULL) {\n'
+                         '    errorGen = LIBRARY_FUNCTION_ERROR;\n'
+                         '    goto cleanupGen;\n'
+                         '}\n')
+
+    def test_prototype(self):
+        self.assertEqual(HandleType('Plan').prototype_cstr('p'), 'Plan * p')
+        self.assertEqual(HandleType('Plan').prototype_return_cstr(), 'Plan *')
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+import unittest
+from mathbind.types import ArrayType, BasicType, BasicValueType, MappedArrayType
+
+
+class TestMappedArrayType(unittest.TestCase):
+    def setUp(self):
+        self.double = BasicValueType.from_str('double')
+        self.float = BasicValueType.from_str('float')
+
+    def test_from_str(self):
+        self.assertEqual(MappedArrayType.from_str('mapped double []'),
+                         MappedArrayType(self.double, 'infinite'))
+        self.assertEqual(MappedArrayType.from_str('const mapped float [ n ]'),
+                         MappedArrayType(self.float, 'variable', 'n', True))
+
+        with self.assertRaises(ValueError): MappedArrayType.from_str('double []')
+        with self.assertRaises(ValueError): MappedArrayType.from_str('mapped double [3]')
+        with self.assertRaises(ValueError): MappedArrayType.from_str('mapped double *')
+
+    def test_dispatch(self):
+        self.assertIsInstance(BasicType.from_str('mapped int []'), MappedArrayType)
+        self.assertIsInstance(BasicType.from_str('int []'), ArrayType)
+        self.assertEqual(BasicType.from_prototype_cstr('const mapped double x[n]'),
+                         (MappedArrayType(self.double, 'variable', 'n', True), 'x'))
+
+    def test_math_name(self):
+        t = MappedArrayType(self.double, 'infinite')
+        self.assertEqual(t.arg_count, 3)
+        self.assertEqual(t.math_name, '"UTF8String", Integer, Integer')
+        self.assertEqual(t.call_mathstr('x', 'Gen'), 'Sequence @@ xGen')
+
+    def test_retrieve_cstr(self):
+        s = MappedArrayType(self.double, 'infinite', None, True).retrieve_cstr('x', 2, '  ', 'Gen')
+        self.assertTrue(s.startswith(
+            '  /* Mapping x */\n'
+            '  char * path_xGen = MArgument_getUTF8String(ArgsGen[2]);\n'
+            '  mint offset_xGen = MArgument_getInteger(ArgsGen[3]);\n'
+            '  mint length_xGen = MArgument_getInteger(ArgsGen[4]);\n'
+            '  int fd_xGen = open(path_xGen, O_RDONLY);\n'
+        ))
+        self.assertIn(', PROT_READ, MAP_SHARED, ', s)
+        self.assertTrue(s.endswith('  double * x = (double *) (map_xGen + skip_xGen);\n'))
+
+        s = MappedArrayType(self.float, 'infinite').retrieve_cstr('y', 0, '', 'Gen')
+        self.assertIn('open(path_yGen, O_RDWR);\n', s)
+        self.assertIn(', PROT_READ | PROT_WRITE, MAP_SHARED, ', s)
+        self.assertIn('sizeof(float) * (size_t) length_yGen', s)
+
+        # the offset and a given length must fit in the file
+        self.assertIn('if(fstat(fd_yGen, &stat_yGen) != 0 || offset_yGen < 0 || '
+                      'stat_yGen.st_size < offset_yGen) {\n', s)
+        self.assertIn('if(length_yGen > available_yGen) {\n'
+                      '    close(fd_yGen);\n'
+                      '    errorGen = LIBRARY_DIMENSION_ERROR;\n'
+                      '    goto cleanupGen;\n', s)
+
+    def test_retrieve_cleanup(self):
+        # nothing is mapped yet on errors, so they go to the arguments before
+        s = MappedArrayType(self.float, 'infinite').retrieve_cstr('y', 0, '', 'Gen', 'cleanup_xGen')
+        self.assertIn('if(fd_yGen < 0) {\n'
+                      '    errorGen = LIBRARY_FUNCTION_ERROR;\n'
+                      '    goto cleanup_xGen;\n', s)
+        self.assertIn('if(map_yGen == MAP_FAILED) {\n'
+                      '    errorGen = LIBRARY_FUNCTION_ERROR;\n'
+                      '    goto cleanup_xGen;\n', s)
+        self.assertNotIn('return ', s)
+        self.assertNotIn('cleanup_yGen', s)
+
+    def test_length_cstr(self):
+        self.assertEqual(MappedArrayType(self.double, 'variable', 'n').length_cstr('x', 'Gen'),
+                         'length_xGen')
+
+    def test_after_cstr(self):
+        self.assertEqual(MappedArrayType(self.double, 'infinite').after_cstr('x', '\t', 'Gen'),
+                         '\tmunmap(map_xGen, size_xGen ? size_xGen : 1);\n')
+
+    def test_before_mathstr(self):
+        self.assertEqual(
+            MappedArrayType(self.double, 'infinite').before_mathstr('x', '\t', 'Gen'),
+            '\txGen = Flatten[{x}];\n'
+            '\txGen = Join[{ExpandFileName[First[xGen]]}, Rest[xGen], {0, -1}[[Length[xGen] ;;]]];\n'
+        )
+
+    def test_prototype(self):
+        self.assertEqual(MappedArrayType(self.float, 'infinite').prototype_cstr('x'), 'float * x')
+        self.assertEqual(MappedArrayType(self.float, 'infinite', None, True).prototype_cstr('x'),
+                         'const float * x')
+        self.assertFalse(MappedArrayType(self.float, 'infinite').should_return)
+        with self.assertRaises(ValueError):
+            MappedArrayType(self.float, 'infinite').return_cstr('f()')
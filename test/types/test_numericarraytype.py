@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import unittest
+from mathbind.types import ArrayType, BasicType, NumericArrayType
+
+
+class TestNumericArrayType(unittest.TestCase):
+    def test_from_str(self):
+        self.assertEqual(NumericArrayType.from_str('numeric float []'),
+                         NumericArrayType('float', 'infinite'))
+        self.assertEqual(NumericArrayType.from_str('const numeric uint8_t [ 16 ]'),
+                         NumericArrayType('uint8_t', 'fixed', 16, True))
+        self.assertEqual(NumericArrayType.from_str('numeric unsigned   short [n]'),
+                         NumericArrayType('unsigned short', 'variable', 'n'))
+
+        with self.assertRaises(ValueError): NumericArrayType.from_str('float []')
+        with self.assertRaises(ValueError): NumericArrayType.from_str('numeric float *')
+        with self.assertRaises(ValueError): NumericArrayType.from_str('numeric long []')
+        with self.assertRaises(ValueError): NumericArrayType.from_str('numeric bool [3]')
+
+    def test_dispatch(self):
+        self.assertIsInstance(BasicType.from_str('numeric int16_t []'), NumericArrayType)
+        self.assertIsInstance(BasicType.from_str('int []'), ArrayType)
+        self.assertEqual(BasicType.from_prototype_cstr('const numeric float signal[length]'),
+                         (NumericArrayType('float', 'variable', 'length', True), 'signal'))
+
+    def test_math_name(self):
+        self.assertEqual(NumericArrayType('float', 'infinite').math_name,
+                         '{LibraryDataType[NumericArray, "Real32", 1], "Shared"}')
+        self.assertEqual(NumericArrayType('unsigned', 'fixed', 3).math_name,
+                         '{LibraryDataType[NumericArray, "UnsignedInteger32", 1], "Shared"}')
+
+    def test_retrieve_cstr(self):
+        self.assertEqual(
+            NumericArrayType('float', 'fixed', 4).retrieve_cstr('x', 2, '  ', 'Gen'),
+            '  MNumericArray numeric_xGen = MArgument_getMNumericArray(ArgsGen[2]);\n'
+            '  float * x = (float *) libDataGen->numericarrayLibraryFunctions->MNumericArray_getData(numeric_xGen);\n'
+        )
+        self.assertEqual(
+            NumericArrayType('int8_t', 'infinite').retrieve_cstr('x', 0, '', 'Gen'),
+            'MNumericArray numeric_xGen = MArgument_getMNumericArray(ArgsGen[0]);\n'
+            'int8_t * x = (int8_t *) libDataGen->numericarrayLibraryFunctions->MNumericArray_getData(numeric_xGen);\n'
+        )
+        # the length is only read when a size is tied to it
+        self.assertEqual(
+            NumericArrayType('int8_t', 'variable', 'n').retrieve_cstr('x', 0, '', 'Gen'),
+            'MNumericArray numeric_xGen = MArgument_getMNumericArray(ArgsGen[0]);\n'
+            'int8_t * x = (int8_t *) libDataGen->numericarrayLibraryFunctions->MNumericArray_getData(numeric_xGen);\n'
+            'mint length_xGen = libDataGen->numericarrayLibraryFunctions->MNumericArray_getFlattenedLength(numeric_xGen);\n'
+        )
+
+    def test_length_cstr(self):
+        self.assertEqual(NumericArrayType('float', 'fixed', 4).length_cstr('x', 'Gen'), '4')
+        self.assertEqual(NumericArrayType('float', 'variable', 'n').length_cstr('x', 'Gen'), 'length_xGen')
+
+    def test_after_cstr(self):
+        self.assertEqual(
+            NumericArrayType('short', 'infinite').after_cstr('x', '\t', 'Gen'),
+            '\tlibDataGen->numericarrayLibraryFunctions->MNumericArray_disownAll(numeric_xGen);\n'
+        )
+
+    def test_before_mathstr(self):
+        self.assertEqual(
+            NumericArrayType('uint16_t', 'infinite').before_mathstr('x', '\t', 'Gen'),
+            '\txGen = NumericArray[x, "UnsignedInteger16", "ClipAndRound"];\n'
+        )
+
+    def test_prototype(self):
+        self.assertEqual(NumericArrayType('float', 'infinite').prototype_cstr('x'), 'float * x')
+        self.assertEqual(NumericArrayType('float', 'infinite', None, True).prototype_cstr('x'),
+                         'const float * x')
+        with self.assertRaises(ValueError):
+            NumericArrayType('float', 'fixed', 3).return_cstr('f()')
+
+    def test_should_return(self):
+        self.assertTrue(NumericArrayType('float', 'infinite').should_return)
+        self.assertFalse(NumericArrayType('float', 'infinite', None, True).should_return)
+
+    def test_complex(self):
+        t = NumericArrayType.from_str('numeric double complex []')
+        self.assertEqual(t.numeric_name, 'ComplexReal64')
+        self.assertIn('<complex.h>', t.includes)
+        self.assertNotIn('<complex.h>', NumericArrayType('float', 'infinite').includes)
@@ -122,4 +122,17 @@ class TestPointerType(unittest.TestCase):
         self.assertEqual(bool_t.pass_cstr('num'), '&num')
 
         long_t = PointerType.from_str('long *')
-        self.assertEqual(long_t.pass_cstr('num'), '&num')
\ No newline at end of file
+        self.assertEqual(long_t.pass_cstr('num'), '&num')
+
+    def test_complex(self):
+        t = PointerType.from_str('float complex *')
+        self.assertEqual(t.math_name, '{Complex, 1, "Shared"}')
+        self.assertEqual(t.includes, ('<complex.h>',))
+        self.assertEqual(t.retrieve_cstr('z', 0, '', 'Gen'),
+                         'MTensor mtensor_zGen = MArgument_getMTensor(ArgsGen[0]);\n'
+                         'mcomplex * data_zGen = libDataGen->MTensor_getComplexData(mtensor_zGen);\n'
+                         'float complex z = (float complex) (mcreal(*data_zGen) + I * mcimag(*data_zGen));\n')
+
+        const_t = PointerType.from_str('const double complex *')
+        self.assertEqual(const_t.retrieve_cstr('z', 0, '', 'Gen'),
+                         const_t.basetype.retrieve_cstr('z', 0, '', 'Gen'))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import unittest
+from mathbind.types import BasicType, BasicValueType, SparseArrayType
+
+
+class TestSparseArrayType(unittest.TestCase):
+    def test_from_str(self):
+        self.assertEqual(SparseArrayType.from_str('sparse double'),
+                         SparseArrayType(BasicValueType('double')))
+        self.assertEqual(SparseArrayType.from_str(' const  sparse long long '),
+                         SparseArrayType(BasicValueType('long long'), True))
+
+        with self.assertRaises(ValueError): SparseArrayType.from_str('double')
+        with self.assertRaises(ValueError): SparseArrayType.from_str('sparse double *')
+        with self.assertRaises(ValueError): SparseArrayType.from_str('sparse double [3]')
+        with self.assertRaises(ValueError): SparseArrayType.from_str('sparse bool')
+        with self.assertRaises(ValueError): SparseArrayType.from_str('sparse double complex')
+
+    def test_dispatch(self):
+        self.assertEqual(BasicType.from_prototype_cstr('const sparse double A'),
+                         (SparseArrayType(BasicValueType('double'), True), 'A'))
+        self.assertEqual(BasicType.from_prototype_cstr('double A'),
+                         (BasicValueType('double'), 'A'))
+
+    def test_math_name(self):
+        self.assertEqual(SparseArrayType.from_str('sparse double').math_name,
+                         '{LibraryDataType[SparseArray, Real, 2], "Shared"}')
+        self.assertEqual(SparseArrayType.from_str('const sparse int').math_name,
+                         '{LibraryDataType[SparseArray, Integer, 2], "Constant"}')
+
+    def test_retrieve_cstr(self):
+        self.assertEqual(
+            SparseArrayType.from_str('sparse double').retrieve_cstr('A', 1, '', 'Gen'),
+            'MSparseArray sparse_AGen = MArgument_getMSparseArray(ArgsGen[1]);\n'
+            'MTensor * implicit_AGen = libDataGen->sparseLibraryFunctions->MSparseArray_getImplicitValue(sparse_AGen);\n'
+            'if(implicit_AGen && *implicit_AGen && libDataGen->MTensor_getRealData(*implicit_AGen)[0] != 0) {\n'
+            '    errorGen = LIBRARY_TYPE_ERROR;\n'
+            '    goto cleanup_AGen;\n'
+            '}\n'
+            'const mint * dims_AGen = libDataGen->sparseLibraryFunctions->MSparseArray_getDimensions(sparse_AGen);\n'
+            'MTensor * rows_AGen = libDataGen->sparseLibraryFunctions->MSparseArray_getRowPointers(sparse_AGen);\n'
+            'MTensor * columns_AGen = libDataGen->sparseLibraryFunctions->MSparseArray_getColumnIndices(sparse_AGen);\n'
+            'MTensor * values_AGen = libDataGen->sparseLibraryFunctions->MSparseArray_getExplicitValues(sparse_AGen);\n'
+            'mint A_rows = dims_AGen[0];\n'
+            'mint A_cols = dims_AGen[1];\n'
+            'mint * A_row_pointers = libDataGen->MTensor_getIntegerData(*rows_AGen);\n'
+            'mint * A_column_indices = (columns_AGen && *columns_AGen) ? '
+            'libDataGen->MTensor_getIntegerData(*columns_AGen) : NULL;\n'
+            'mreal * A_values = (values_AGen && *values_AGen) ? '
+            'libDataGen->MTensor_getRealData(*values_AGen) : NULL;\n'
+        )
+        # the constant arrays have nothing to release
+        s = SparseArrayType.from_str('const sparse int').retrieve_cstr('A', 1, '', 'Gen', 'cleanup_xGen')
+        self.assertIn('if(implicit_AGen && *implicit_AGen && libDataGen->MTensor_getIntegerData(*implicit_AGen)[0] != 0) {\n'
+                      '    errorGen = LIBRARY_TYPE_ERROR;\n'
+                      '    goto cleanup_xGen;\n', s)
+
+    def test_after_cstr(self):
+        self.assertEqual(SparseArrayType.from_str('sparse int').after_cstr('A', '\t', 'Gen'),
+                         '\tlibDataGen->sparseLibraryFunctions->MSparseArray_disownAll(sparse_AGen);\n')
+        self.assertEqual(SparseArrayType.from_str('const sparse int').after_cstr('A', '\t', 'Gen'), '')
+
+    def test_before_mathstr(self):
+        self.assertEqual(SparseArrayType.from_str('sparse float').before_mathstr('A', '\t', 'Gen'),
+                         '\tAGen = SparseArray[N[A], Dimensions[A], 0];\n')
+
+    def test_prototype(self):
+        t = SparseArrayType.from_str('const sparse double')
+        self.assertEqual(t.prototype_cstr('A'),
+                         'mint A_rows, mint A_cols, const mint * A_row_pointers, '
+                         'const mint * A_column_indices, const mreal * A_values')
+        self.assertEqual(t.pass_cstr('A'), 'A_rows, A_cols, A_row_pointers, A_column_indices, A_values')
+        with self.assertRaises(ValueError):
+            t.return_cstr('f()')
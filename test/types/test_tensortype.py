@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+import unittest
+from mathbind.types import ArrayType, BasicType, BasicValueType, TensorType
+
+
+class TestTensorType(unittest.TestCase):
+    def setUp(self):
+        self.double = BasicValueType('double')
+
+    def test_from_str(self):
+        self.assertEqual(TensorType.from_str('double [m][n]'),
+                         TensorType(self.double, ('m', 'n')))
+        self.assertEqual(TensorType.from_str('const int [ ] [3][k]'),
+                         TensorType(BasicValueType('int'), (None, 3, 'k'), True))
+        self.assertEqual(TensorType.from_str('double [m][n]').typename, 'double [m][n]')
+
+        with self.assertRaises(ValueError): TensorType.from_str('double [n]')
+        with self.assertRaises(ValueError): TensorType.from_str('double [m]n]')
+        with self.assertRaises(ValueError): TensorType.from_str('double [m][n')
+        with self.assertRaises(ValueError): TensorType.from_str('double *')
+
+    def test_dispatch(self):
+        self.assertIsInstance(BasicType.from_str('double [m][n]'), TensorType)
+        self.assertIsInstance(BasicType.from_str('double [n]'), ArrayType)
+        self.assertEqual(BasicType.from_prototype_cstr('const double a[][n]'),
+                         (TensorType(self.double, (None, 'n'), True), 'a'))
+
+    def test_math_name(self):
+        self.assertEqual(TensorType(self.double, ('m', 'n')).math_name, '{Real, 2, "Shared"}')
+        self.assertEqual(TensorType(BasicValueType('long'), (2, 2, 2)).math_name,
+                         '{Integer, 3, "Shared"}')
+
+    def test_retrieve_cstr(self):
+        t = TensorType(self.double, ('m', 3), True)
+        s = t.retrieve_cstr('a', 1, ' ', 'Gen')
+        self.assertTrue(s.startswith(
+            ' MTensor mtensor_aGen = MArgument_getMTensor(ArgsGen[1]);\n'
+            ' mreal * data_aGen = libDataGen->MTensor_getRealData(mtensor_aGen);\n'
+            ' mint length_aGen = libDataGen->MTensor_getFlattenedLength(mtensor_aGen);\n'
+            ' const mint * dims_aGen = libDataGen->MTensor_getDimensions(mtensor_aGen);\n'
+            ' /* Converting a */\n'
+        ))
+        # checked once converted, so its own cleanup releases the tensor
+        self.assertTrue(s.endswith(
+            ' if(dims_aGen[1] != 3) {\n'
+            '     errorGen = LIBRARY_DIMENSION_ERROR;\n'
+            '     goto cleanup_aGen;\n'
+            ' }\n'
+        ))
+        self.assertIn('mathbind_get_double(data_aGen, length_aGen, 1, &a)', s)
+        self.assertEqual(t.helpers, ArrayType.from_str('double []').helpers)
+
+    def test_dim_cstr(self):
+        t = TensorType(self.double, ('m', 'n'))
+        self.assertEqual(t.dim_cstr('a', 'm', 'Gen'), 'dims_aGen[0]')
+        self.assertEqual(t.dim_cstr('a', 'n', 'Gen'), 'dims_aGen[1]')
+        self.assertEqual(t.length_cstr('a', 'Gen'), 'length_aGen')
+
+    def test_before_mathstr(self):
+        self.assertEqual(TensorType(self.double, ('m', 'n')).before_mathstr('a', '\t', 'Gen'),
+                         '\taGen = a;\n'
+                         '\taGen = Developer`ToPackedArray[Map[N, aGen, {2}]];\n')
+
+    def test_after_cstr(self):
+        t = TensorType(self.double, ('m', 'n'))
+        self.assertEqual(t.after_cstr('a', ' ', 'Gen'),
+                         ArrayType(self.double, 'infinite').after_cstr('a', ' ', 'Gen'))
+
+    def test_prototype(self):
+        self.assertEqual(TensorType(self.double, ('m', 'n'), True).prototype_cstr('a'),
+                         'const double * a')
+        self.assertTrue(TensorType(self.double, ('m', 'n')).should_return)
+        self.assertFalse(TensorType(self.double, ('m', 'n'), True).should_return)
+        with self.assertRaises(ValueError):
+            TensorType(self.double, ('m', 'n')).return_cstr('f()')